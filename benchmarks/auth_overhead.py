@@ -0,0 +1,53 @@
+"""Per-request cost of get_current_user: reading the key from the environment
+and verifying the signature on every call, as it used to, against settings
+loaded once, with and without the verified-token cache.
+
+Run from the repository root:
+
+    python -m benchmarks.auth_overhead [iterations]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+from jose import jwt
+
+from src.config import get_algorithm, get_secret_key
+from src.routes.auth.operations import create_access_token, get_current_user
+from src.routes.auth.token_cache import token_cache
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+
+
+async def legacy_get_current_user(token: str):
+    payload = jwt.decode(token, get_secret_key(), algorithms=[get_algorithm()])
+    return payload.get("sub"), payload.get("role")
+
+
+async def measure(func, token: str, iterations: int) -> float:
+    for _ in range(min(iterations, 1000)):
+        await func(token)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await func(token)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+async def main(iterations: int):
+    token = create_access_token({"sub": "cashier", "role": "user"})
+    print(f"{'get_current_user':<28}{'us per call':>12}")
+    legacy = await measure(legacy_get_current_user, token, iterations)
+    print(f"{'env reads + decode':<28}{legacy:>12.2f}")
+    with patch.dict(os.environ, {"AUTH_TOKEN_CACHE_SIZE": "0"}):
+        uncached = await measure(get_current_user, token, iterations)
+    print(f"{'settings + decode':<28}{uncached:>12.2f}")
+    token_cache.clear()
+    cached = await measure(get_current_user, token, iterations)
+    print(f"{'verified-token cache':<28}{cached:>12.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
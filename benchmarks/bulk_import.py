@@ -0,0 +1,109 @@
+"""Product import throughput: one create_product call per row against
+POST /products/bulk's streaming importer.
+
+Run from the repository root:
+
+    python -m benchmarks.bulk_import [rows]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.database import tune_sqlite
+from src.migrations import migrate
+from src.routes.brands.models import Brand
+from src.routes.categories.models import Category
+from src.routes.products.models import ProductCreate
+from src.routes.products.operations import bulk_import_products, create_product
+from src.routes.providers.models import Provider
+
+# Each batch is one long executemany, keep the slow query log quiet
+os.environ.setdefault("DB_SLOW_QUERY_MS", "0")
+
+PER_ROW_SAMPLE = 2000
+CHUNK_SIZE = 64 * 1024
+
+
+def product_row(i: int) -> dict:
+    return {
+        "name": f"Product {i}",
+        "description": f"Imported product number {i}",
+        "stock": i % 50,
+        "price": 1.0 + i % 100,
+        "provider_name": f"Provider {i % 10}",
+        "category_name": f"Category {i % 20}",
+        "brand_name": f"Brand {i % 30}",
+    }
+
+
+async def chunked(body: bytes):
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start : start + CHUNK_SIZE]
+
+
+async def setup(directory: str, name: str):
+    db_url = f"sqlite:///{os.path.join(directory, name)}"
+    sync_engine = create_engine(db_url)
+    migrate(sync_engine)
+    sync_engine.dispose()
+    engine = tune_sqlite(
+        create_async_engine(db_url.replace("sqlite", "sqlite+aiosqlite"))
+    )
+    async with AsyncSession(engine) as session:
+        for i in range(30):
+            session.add(Brand(name=f"Brand {i}"))
+        for i in range(20):
+            session.add(Category(name=f"Category {i}"))
+        for i in range(10):
+            session.add(
+                Provider(
+                    ruc=i,
+                    name=f"Provider {i}",
+                    address="Street",
+                    phone="555",
+                    email="p@example.com",
+                )
+            )
+        await session.commit()
+    return engine
+
+
+async def main(rows: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = await setup(directory, "per_row.db")
+        start = time.perf_counter()
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            for i in range(PER_ROW_SAMPLE):
+                await create_product(ProductCreate(**product_row(i)), session)
+        per_row = (time.perf_counter() - start) / PER_ROW_SAMPLE
+        await engine.dispose()
+
+        engine = await setup(directory, "bulk.db")
+        body = "\n".join(json.dumps(product_row(i)) for i in range(rows)).encode()
+        print(f"{'importer':<28}{'rows/s':>12}{f'{rows} rows (s)':>18}")
+        print(
+            f"{'create_product per row':<28}{1 / per_row:>12.0f}{per_row * rows:>18.1f}"
+        )
+        for batch_size in (500, 1000, 5000):
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                start = time.perf_counter()
+                report = await bulk_import_products(
+                    chunked(body), "ndjson", batch_size, session
+                )
+                elapsed = time.perf_counter() - start
+            assert report.inserted == rows, report.failed
+            label = f"bulk, batch_size={batch_size}"
+            print(f"{label:<28}{rows / elapsed:>12.0f}{elapsed:>18.1f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,177 @@
+"""Parallel checkouts: the per-line read-check-decrement create_sale used to
+do against the batched conditional UPDATE it does now.
+
+Several worker processes share one SQLite file, like uvicorn workers do,
+each running concurrent checkouts of three random products until the
+deadline. Stock is set so demand outruns it and products sell out.
+"Oversold" counts units sold beyond the initial stock.
+
+Run from the repository root:
+
+    python -m benchmarks.checkout [seconds]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.exc import OperationalError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.database import get_async_engine
+from src.migrations import migrate
+from src.routes.customers.models import Customer
+from src.routes.products.models import Product
+from src.routes.sales.link_models import ProductSale
+from src.routes.sales.models import Sale, SaleCreate
+from src.routes.sales.operations import create_sale
+from src.versions import bump_version
+
+os.environ.setdefault("DB_SLOW_QUERY_MS", "0")
+
+PROCESSES = 4
+CHECKOUTS = 4
+PRODUCTS = 100
+STOCK = 8
+
+
+async def legacy_create_sale(sale_input: SaleCreate, session: AsyncSession):
+    """create_sale before stock reservation: one get per line, the stock
+    check in Python and the decrement through the ORM."""
+    total_amount = 0
+    if not (
+        await session.exec(
+            select(Customer).where(Customer.dni == sale_input.customer_dni)
+        )
+    ).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    for item in sale_input.products:
+        product = await session.get(Product, item.product_id)
+        if product.stock < item.quantity:
+            raise HTTPException(status_code=400, detail="Not enough stock")
+        product.stock -= item.quantity
+        total_amount += product.price * item.quantity
+    sale = Sale(customer_dni=sale_input.customer_dni, total=total_amount)
+    session.add(sale)
+    await session.flush()
+    for item in sale_input.products:
+        session.add(
+            ProductSale(
+                product_id=item.product_id, sale_id=sale.id, quantity=item.quantity
+            )
+        )
+    await bump_version(session, "product")
+    await session.commit()
+    return sale
+
+
+IMPLEMENTATIONS = {"per line": legacy_create_sale, "reservation": create_sale}
+
+
+def seed(db_url: str):
+    engine = create_engine(db_url)
+    migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Customer.__table__),
+            {"dni": 12345678, "name": "A", "last_name": "B", "email": "a@b.c"},
+        )
+        connection.execute(
+            insert(Product.__table__),
+            [
+                {"name": f"Product {i}", "description": "", "stock": STOCK, "price": 1}
+                for i in range(PRODUCTS)
+            ],
+        )
+    engine.dispose()
+
+
+async def checkout_loop(engine, implementation, deadline: float, counts: dict):
+    while time.perf_counter() < deadline:
+        product_ids = random.sample(range(1, PRODUCTS + 1), 3)
+        sale = SaleCreate(
+            customer_dni=12345678,
+            products=[{"product_id": i, "quantity": 1} for i in product_ids],
+        )
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                await implementation(sale, session)
+            counts["sales"] += 1
+        except HTTPException:
+            counts["rejected"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+
+
+async def worker(db_url: str, tuning: str, name: str, deadline: float) -> dict:
+    with patch.dict(os.environ, {"DB_URL": db_url, "SQLITE_TUNING": tuning}):
+        engine = get_async_engine.__wrapped__()
+    counts = {"sales": 0, "rejected": 0, "errors": 0}
+    await asyncio.gather(
+        *(
+            checkout_loop(engine, IMPLEMENTATIONS[name], deadline, counts)
+            for _ in range(CHECKOUTS)
+        )
+    )
+    await engine.dispose()
+    return counts
+
+
+def run_worker(args) -> dict:
+    return asyncio.run(worker(*args))
+
+
+def oversold(db_url: str) -> int:
+    engine = create_engine(db_url)
+    with engine.connect() as connection:
+        sold = connection.execute(
+            select(ProductSale.product_id, func.sum(ProductSale.quantity)).group_by(
+                ProductSale.product_id
+            )
+        ).all()
+    engine.dispose()
+    return sum(max(units - STOCK, 0) for _, units in sold)
+
+
+def run(directory: str, tuning: str, name: str, seconds: float) -> dict:
+    db_url = f"sqlite:///{os.path.join(directory, f'{tuning}-{name}.db')}"
+    seed(db_url)
+    deadline = time.perf_counter() + seconds
+    with multiprocessing.Pool(PROCESSES) as pool:
+        results = pool.map(run_worker, [(db_url, tuning, name, deadline)] * PROCESSES)
+    counts = {key: sum(result[key] for result in results) for key in results[0]}
+    counts["oversold"] = oversold(db_url)
+    return counts
+
+
+def main(seconds: float):
+    print(
+        f"{PROCESSES} processes x {CHECKOUTS} checkouts, {PRODUCTS} products with "
+        f"{STOCK} units each, {seconds:.0f}s per run"
+    )
+    print(
+        f"{'sqlite profile':<16}{'create_sale':<14}{'checkouts/s':>12}"
+        f"{'sold':>8}{'locked errors':>15}{'oversold':>10}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for profile, tuning in (("default", "false"), ("production", "true")):
+            for name in IMPLEMENTATIONS:
+                counts = run(directory, tuning, name, seconds)
+                checkouts = counts["sales"] + counts["rejected"]
+                print(
+                    f"{profile:<16}{name:<14}{checkouts / seconds:>12.0f}"
+                    f"{counts['sales']:>8}{counts['errors']:>15}"
+                    f"{counts['oversold']:>10}"
+                )
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 10)
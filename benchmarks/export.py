@@ -0,0 +1,95 @@
+"""Peak memory of a full product pull: loading every row with ``.all()`` and
+serializing one JSON array, as the list endpoint used to, against the
+streaming NDJSON/CSV export.
+
+Run from the repository root:
+
+    python -m benchmarks.export [rows]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.database import tune_sqlite
+from src.exports import stream_rows
+from src.migrations import migrate
+from src.routes.products.models import Product
+from src.routes.products.operations import export_products_statement
+
+os.environ.setdefault("DB_SLOW_QUERY_MS", "0")
+
+BATCH_SIZE = 1000
+
+
+def setup(db_url: str, rows: int):
+    engine = create_engine(db_url)
+    migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Product.__table__),
+            [
+                {
+                    "name": f"Product {i}",
+                    "description": f"Exported product number {i}",
+                    "stock": i % 50,
+                    "price": 1.0 + i % 100,
+                }
+                for i in range(rows)
+            ],
+        )
+    engine.dispose()
+
+
+async def load_all(engine) -> int:
+    async with AsyncSession(engine) as session:
+        products = (await session.exec(select(Product))).all()
+        body = json.dumps([product.model_dump(mode="json") for product in products])
+    return len(body)
+
+
+async def export(engine, format: str) -> int:
+    size = 0
+    async for chunk in stream_rows(
+        engine, export_products_statement(), format, BATCH_SIZE
+    ):
+        size += len(chunk)
+    return size
+
+
+async def measure(label: str, run):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = await run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24}{peak / 2**20:>14.1f}{elapsed:>10.2f}{size / 2**20:>12.1f}")
+
+
+async def main(rows: int):
+    with tempfile.TemporaryDirectory() as directory:
+        db_url = f"sqlite:///{os.path.join(directory, 'export.db')}"
+        setup(db_url, rows)
+        engine = tune_sqlite(
+            create_async_engine(db_url.replace("sqlite", "sqlite+aiosqlite"))
+        )
+        print(f"{rows} products")
+        print(f"{'':<24}{'peak (MiB)':>14}{'time (s)':>10}{'body (MiB)':>12}")
+        await measure(".all() + JSON array", lambda: load_all(engine))
+        await measure("export ndjson", lambda: export(engine, "ndjson"))
+        await measure("export csv", lambda: export(engine, "csv"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,126 @@
+"""bcrypt cost per BCRYPT_ROUNDS, and a login burst with verification on the
+shared threadpool, as authenticate_user used to do it, against the bounded
+process pool.
+
+During the burst one client keeps browsing ``GET /customers`` to show what
+the logins cost everyone else. Logins refused with 503 count as rejected.
+
+Run from the repository root:
+
+    python -m benchmarks.login [seconds] [concurrent logins]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine
+
+from src.app import create_app
+from src.migrations import migrate
+from src.bcrypt_worker import hash_with_rounds, pwd_context
+from src.routes.auth.passwords import password_pool
+
+os.environ.setdefault("DB_SLOW_QUERY_MS", "0")
+os.environ.setdefault("DB_QUERY_HEADERS", "false")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+# The burst is the point here, not what a single client is allowed
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+USER = {"username": "cashier", "password": "opening-time"}
+
+
+def cost_table():
+    print(f"{'BCRYPT_ROUNDS':<16}{'ms per hash':>12}")
+    for rounds in (4, 8, 10, 12, 13):
+        samples = []
+        for _ in range(3):
+            start = time.perf_counter()
+            hash_with_rounds(USER["password"], rounds)
+            samples.append(time.perf_counter() - start)
+        print(f"{rounds:<16}{min(samples) * 1000:>12.1f}")
+
+
+async def threadpool_verify(password: str, hashed_password: str) -> bool:
+    return await run_in_threadpool(pwd_context.verify, password, hashed_password)
+
+
+async def burst(client: httpx.AsyncClient, token: str, seconds: float, logins: int):
+    deadline = time.perf_counter() + seconds
+    counts = {"logins": 0, "rejected": 0}
+    browse_latencies = []
+
+    async def login_loop():
+        while time.perf_counter() < deadline:
+            response = await client.post("/auth/token", data=USER)
+            counts["logins" if response.status_code == 200 else "rejected"] += 1
+
+    async def browse_loop():
+        headers = {"Authorization": f"Bearer {token}"}
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await client.get("/customers", headers=headers)
+            browse_latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(login_loop() for _ in range(logins)), browse_loop())
+    browse_latencies.sort()
+    counts["browse_p50"] = statistics.median(browse_latencies) * 1000
+    counts["browse_p99"] = browse_latencies[int(len(browse_latencies) * 0.99)] * 1000
+    return counts
+
+
+async def run(seconds: float, logins: int):
+    app = create_app()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.post("/auth/register", json=USER)
+        token = (await client.post("/auth/token", data=USER)).json()["access_token"]
+        print(
+            f"{'verification':<14}{'logins/s':>10}{'rejected':>10}"
+            f"{'browse p50 ms':>15}{'browse p99 ms':>15}"
+        )
+        for label, verify in (
+            ("threadpool", threadpool_verify),
+            ("process pool", None),
+        ):
+            if verify is None:
+                counts = await burst(client, token, seconds, logins)
+            else:
+                with patch("src.routes.auth.operations.verify_password", verify):
+                    counts = await burst(client, token, seconds, logins)
+            print(
+                f"{label:<14}{counts['logins'] / seconds:>10.1f}"
+                f"{counts['rejected']:>10}{counts['browse_p50']:>15.1f}"
+                f"{counts['browse_p99']:>15.1f}"
+            )
+
+
+def main(seconds: float, logins: int):
+    rounds = os.environ.setdefault("BCRYPT_ROUNDS", "12")
+    cost_table()
+    print()
+    print(
+        f"{logins} concurrent logins for {seconds:.0f}s at BCRYPT_ROUNDS={rounds}, "
+        f"{os.cpu_count()} CPUs"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        db_url = f"sqlite:///{os.path.join(directory, 'login.db')}"
+        os.environ["DB_URL"] = db_url
+        engine = create_engine(db_url)
+        migrate(engine)
+        engine.dispose()
+        asyncio.run(run(seconds, logins))
+    password_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 10,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 64,
+    )
@@ -0,0 +1,76 @@
+"""Cost of a rate-limit check: one token bucket or two (IP and user), counted
+in process the way reads are, or in the SQLite files the workers share, and
+those files shared by several processes at once.
+
+Run from the repository root:
+
+    python -m benchmarks.rate_limit [iterations] [processes]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.config import RateLimit
+from src.rate_limit import LocalBuckets, ShardedBucketStore
+
+# Never empty, every check takes the allowing path and writes
+LIMIT = RateLimit(per_minute=10**9, burst=10**9)
+
+
+def measure(store, keys_per_check: int, iterations: int):
+    """Microseconds per check, and how many found the store locked past the
+    busy timeout (what the group's fail_open then decides)."""
+    busy = 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        keys = [f"write:ip:{i % 500}", f"write:user:{i % 50}"][:keys_per_check]
+        try:
+            store.take(keys, LIMIT, time.time())
+        except sqlite3.OperationalError:
+            busy += 1
+    return (time.perf_counter() - start) / iterations * 1_000_000, busy
+
+
+def worker(path: str, iterations: int) -> int:
+    store = ShardedBucketStore(path)
+    try:
+        return measure(store, 2, iterations)[1]
+    finally:
+        store.close()
+
+
+def main(iterations: int, processes: int):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rate-limit.db")
+        print(f"{'store':<24}{'buckets':>8}{'us per check':>14}")
+        for label, make_store in (
+            ("in process", LocalBuckets),
+            ("shared, memory", lambda: ShardedBucketStore(":memory:")),
+            ("shared, file", lambda: ShardedBucketStore(path)),
+        ):
+            store = make_store()
+            for keys_per_check in (1, 2):
+                cost, _ = measure(store, keys_per_check, iterations)
+                print(f"{label:<24}{keys_per_check:>8}{cost:>14.1f}")
+            if hasattr(store, "close"):
+                store.close()
+        with ProcessPoolExecutor(processes) as pool:
+            start = time.perf_counter()
+            busy = sum(pool.map(worker, [path] * processes, [iterations] * processes))
+            elapsed = time.perf_counter() - start
+        print(
+            f"{f'shared file, {processes} procs':<24}{2:>8}"
+            f"{elapsed / (iterations * processes) * 1_000_000:>14.1f}"
+            f"  (wall time per check, {busy} found the store busy)"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+    )
@@ -0,0 +1,139 @@
+"""Per-request session overhead before and after hoisting the sessionmaker,
+and how long a request keeps its pooled connection checked out.
+
+Run from the repository root:
+
+    python -m benchmarks.session_overhead [iterations]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.database import AsyncSessionLocal, UnitOfWorkRoute
+from src.routes.products.models import Product
+
+
+class ProductOut(BaseModel):
+    id: int
+    name: str
+    description: str
+    stock: int
+    price: float
+
+
+async def per_request_sessionmaker(engine, query: bool):
+    # What get_async_session did before: a new sessionmaker per request
+    factory = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with factory() as session:
+        if query:
+            await session.exec(text("SELECT 1"))
+
+
+async def module_level_factory(engine, query: bool):
+    async with AsyncSessionLocal(bind=engine) as session:
+        if query:
+            await session.exec(text("SELECT 1"))
+
+
+async def measure(func, engine, iterations: int, query: bool) -> float:
+    for _ in range(min(iterations, 200)):
+        await func(engine, query)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await func(engine, query)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def build_app(engine, route_class) -> FastAPI:
+    async def session_dependency():
+        async with AsyncSessionLocal(bind=engine) as session:
+            yield session
+
+    router = APIRouter(route_class=route_class)
+
+    @router.get("/products", response_model=list[ProductOut])
+    async def list_products(session: AsyncSession = Depends(session_dependency)):
+        return (await session.exec(select(Product))).all()
+
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+async def measure_hold_time(engine, route_class, requests: int) -> tuple[float, float]:
+    held = []
+    checked_out_at = {}
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out_at[id(connection_record)] = time.perf_counter()
+
+    def on_checkin(dbapi_connection, connection_record):
+        start = checked_out_at.pop(id(connection_record), None)
+        if start is not None:
+            held.append(time.perf_counter() - start)
+
+    pool = engine.sync_engine.pool
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+    transport = httpx.ASGITransport(app=build_app(engine, route_class))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        start = time.perf_counter()
+        for _ in range(requests):
+            (await c.get("/products")).raise_for_status()
+        elapsed = time.perf_counter() - start
+    event.remove(pool, "checkout", on_checkout)
+    event.remove(pool, "checkin", on_checkin)
+    return sum(held) / len(held) * 1000, elapsed / requests * 1000
+
+
+async def main(iterations: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+        )
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+            await connection.execute(
+                Product.__table__.insert(),
+                [
+                    {"name": f"Product {i}", "description": "bench", "stock": i}
+                    for i in range(2000)
+                ],
+            )
+
+        print(f"{'session overhead':<34}{'before (us)':>14}{'after (us)':>14}")
+        for label, query in (("no statement", False), ("SELECT 1", True)):
+            before = await measure(per_request_sessionmaker, engine, iterations, query)
+            after = await measure(module_level_factory, engine, iterations, query)
+            print(f"{label:<34}{before:>14.1f}{after:>14.1f}")
+
+        requests = max(iterations // 100, 20)
+        print()
+        print(f"{'GET /products (2000 rows)':<34}{'before (ms)':>14}{'after (ms)':>14}")
+        before_hold, before_latency = await measure_hold_time(
+            engine, APIRoute, requests
+        )
+        after_hold, after_latency = await measure_hold_time(
+            engine, UnitOfWorkRoute, requests
+        )
+        print(f"{'connection held':<34}{before_hold:>14.2f}{after_hold:>14.2f}")
+        print(f"{'request latency':<34}{before_latency:>14.2f}{after_latency:>14.2f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,144 @@
+"""Concurrent read/write throughput on SQLite with the driver defaults and
+with the production profile (WAL, pragmas, serialized writer).
+
+Several worker processes share one database file, like uvicorn workers do.
+In each one, writers run a create_sale-shaped transaction (read a product,
+lower its stock, insert a sale) while readers list products. "Lost updates"
+counts stock decrements that were overwritten by a concurrent writer.
+
+Run from the repository root:
+
+    python -m benchmarks.sqlite_profile [seconds]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.database import get_async_engine, get_async_read_engine
+from src.routes.products.models import Product
+from src.routes.sales.models import Sale
+
+PROCESSES = 4
+WRITERS = 2
+READERS = 2
+
+
+async def writer(engine, deadline: float, counts: dict):
+    while time.perf_counter() < deadline:
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                product = await session.get(Product, 1 + counts["writes"] % 100)
+                product.stock -= 1
+                session.add(product)
+                session.add(Sale(customer_dni=1, total=product.price))
+                await session.commit()
+            counts["writes"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+
+
+async def reader(engine, deadline: float, counts: dict):
+    while time.perf_counter() < deadline:
+        try:
+            async with AsyncSession(engine) as session:
+                (await session.exec(select(Product).limit(50))).all()
+            counts["reads"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+
+
+def engines_for(db_path: str, tuned: bool):
+    env = {"DB_URL": f"sqlite:///{db_path}", "SQLITE_TUNING": str(tuned).lower()}
+    with patch.dict(os.environ, env):
+        write_engine = get_async_engine.__wrapped__()
+        read_engine = get_async_read_engine.__wrapped__() if tuned else write_engine
+    return write_engine, read_engine
+
+
+async def seed(db_path: str, tuned: bool):
+    write_engine, read_engine = engines_for(db_path, tuned)
+    async with write_engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+        await connection.execute(
+            Product.__table__.insert(),
+            [
+                {
+                    "name": f"Product {i}",
+                    "description": "bench",
+                    "stock": 10**6,
+                    "price": 1.0,
+                }
+                for i in range(100)
+            ],
+        )
+    for engine in {write_engine, read_engine}:
+        await engine.dispose()
+
+
+async def lost_updates(db_path: str, tuned: bool, writes: int) -> int:
+    write_engine, read_engine = engines_for(db_path, tuned)
+    async with AsyncSession(write_engine) as session:
+        stock = sum((await session.exec(select(Product.stock))).all())
+    for engine in {write_engine, read_engine}:
+        await engine.dispose()
+    return stock - (100 * 10**6 - writes)
+
+
+async def worker(db_path: str, tuned: bool, deadline: float) -> dict:
+    write_engine, read_engine = engines_for(db_path, tuned)
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    await asyncio.gather(
+        *(writer(write_engine, deadline, counts) for _ in range(WRITERS)),
+        *(reader(read_engine, deadline, counts) for _ in range(READERS)),
+    )
+    for engine in {write_engine, read_engine}:
+        await engine.dispose()
+    return counts
+
+
+def run_worker(args) -> dict:
+    return asyncio.run(worker(*args))
+
+
+def run(directory: str, tuned: bool, seconds: float) -> dict:
+    db_path = os.path.join(directory, f"bench-{tuned}.db")
+    asyncio.run(seed(db_path, tuned))
+    # perf_counter is system-wide on Linux, so the deadline holds across processes
+    deadline = time.perf_counter() + seconds
+    with multiprocessing.Pool(PROCESSES) as pool:
+        results = pool.map(run_worker, [(db_path, tuned, deadline)] * PROCESSES)
+    counts = {key: sum(result[key] for result in results) for key in results[0]}
+    counts["lost"] = asyncio.run(lost_updates(db_path, tuned, counts["writes"]))
+    return counts
+
+
+def main(seconds: float):
+    print(
+        f"{PROCESSES} processes x ({WRITERS} writers + {READERS} readers), "
+        f"{seconds:.0f}s each"
+    )
+    print(
+        f"{'profile':<12}{'writes/s':>10}{'reads/s':>10}"
+        f"{'locked errors':>15}{'lost updates':>14}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for label, tuned in (("default", False), ("production", True)):
+            counts = run(directory, tuned, seconds)
+            print(
+                f"{label:<12}{counts['writes'] / seconds:>10.0f}"
+                f"{counts['reads'] / seconds:>10.0f}"
+                f"{counts['errors']:>15}{counts['lost']:>14}"
+            )
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,51 @@
+"""Schema work done by each worker at startup: create_all against migrate on
+a database that is already current.
+
+Run from the repository root:
+
+    python -m benchmarks.startup [iterations]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, create_engine
+
+from src.migrations import migrate
+
+
+def measure(engine, func, iterations: int) -> tuple[float, int]:
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(engine)
+    elapsed = (time.perf_counter() - start) / iterations * 1000
+    event.remove(engine, "before_cursor_execute", count)
+    return elapsed, len(statements) // iterations
+
+
+def main(iterations: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        migrate(engine)
+
+        print(f"{'startup schema step':<24}{'ms':>10}{'statements':>12}")
+        for label, func in (
+            ("create_all", SQLModel.metadata.create_all),
+            ("migrate (current)", migrate),
+        ):
+            elapsed, statements = measure(engine, func, iterations)
+            print(f"{label:<24}{elapsed:>10.2f}{statements:>12}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -1,5 +1,19 @@
-from fastapi import FastAPI
-from src.database import init_db
+from fastapi import FastAPI, Request
+from src.database import get_engine, warm_pools, dispose_engines, pin_to_primary
+from src.migrations import migrate
+from src.instrumentation import (
+    QUERY_COUNT_HEADER,
+    QUERY_TIME_HEADER,
+    start_query_stats,
+    report_query_stats,
+)
+from src.slow_queries import slow_query_log
+from src.pagination import NEXT_CURSOR_HEADER
+from src.idempotency import REPLAYED_HEADER
+from src.rate_limit import rate_limiter, too_many_requests
+from src.routes.auth.operations import token_username
+from src.routes.auth.passwords import password_pool
+from src.routes.auth.revocation import revocation_list
 from contextlib import asynccontextmanager
 from src.routes import root_router
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,18 +23,58 @@ from src.config import get_allowed_origins
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    # One read of schema_version when the database is already current
+    migrate(get_engine())
+    await warm_pools()
+    await password_pool.start()
+    await revocation_list.start()
+    await rate_limiter.start()
     yield
+    await rate_limiter.stop()
+    await revocation_list.stop()
+    password_pool.shutdown()
+    await dispose_engines()
+    slow_query_log.stop()
 
 
 def create_app():
     app = FastAPI(lifespan=lifespan)
     app.include_router(root_router)
+
+    @app.middleware("http")
+    async def read_your_writes(request: Request, call_next):
+        response = await call_next(request)
+        pin_to_primary(request, response)
+        return response
+
+    @app.middleware("http")
+    async def query_stats(request: Request, call_next):
+        stats = start_query_stats(request)
+        response = await call_next(request)
+        report_query_stats(request, response, stats)
+        return response
+
+    # Added last so it runs first: a limited request never reaches a session
+    @app.middleware("http")
+    async def rate_limit(request: Request, call_next):
+        retry_after = await rate_limiter.check(request, token_username)
+        if retry_after:
+            return too_many_requests(retry_after)
+        return await call_next(request)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=get_allowed_origins(),
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[
+            QUERY_COUNT_HEADER,
+            QUERY_TIME_HEADER,
+            NEXT_CURSOR_HEADER,
+            "ETag",
+            REPLAYED_HEADER,
+            "Retry-After",
+        ],
     )
     return app
@@ -0,0 +1,21 @@
+"""What the password pool's worker processes run.
+
+A spawned worker imports the module of the function it is sent. This one
+only needs passlib, so a worker starts without importing the app.
+"""
+
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_with_rounds(password: str, rounds: int) -> str:
+    return pwd_context.handler("bcrypt").using(rounds=rounds).hash(password)
+
+
+def verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+def load_backend() -> None:
+    pwd_context.handler("bcrypt").get_backend()
@@ -0,0 +1,109 @@
+"""In-process cache for the small catalog tables.
+
+Entries are kept in LRU order with a TTL and are tagged with the tables they
+were read from. ``invalidate`` drops every entry built from a table and bumps
+its generation, so a load that started before the invalidation cannot store
+its (possibly stale) result afterwards.
+
+This module only keeps the entries; ``src.versions`` decides when a table
+changed, from local commits and from the shared ``table_version`` rows that
+other workers bump.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from src.config import get_catalog_cache_size, get_catalog_cache_ttl_seconds
+
+MISSING = object()
+
+
+@dataclass
+class CacheEntry:
+    value: object
+    tables: tuple[str, ...]
+    expires_at: float
+
+
+class CatalogCache:
+    def __init__(self):
+        self._entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        # table_version values last seen in the database
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.polled_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generations(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        return tuple(self._generations.get(table, 0) for table in tables)
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    def put(self, key: tuple, value, tables: tuple[str, ...], generations: tuple):
+        """Store ``value`` unless one of ``tables`` was invalidated since
+        ``generations`` was taken, before the value was loaded."""
+        maxsize = get_catalog_cache_size()
+        with self._lock:
+            if maxsize <= 0 or self.generations(tables) != generations:
+                return
+            self._entries[key] = CacheEntry(
+                value, tables, time.monotonic() + get_catalog_cache_ttl_seconds()
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, table: str):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [
+                key for key, entry in self._entries.items() if table in entry.tables
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def observe(self, versions: dict[str, int]):
+        """Invalidate the tables whose shared version moved since last seen."""
+        for table, version in versions.items():
+            if self._versions.get(table) != version:
+                self.invalidate(table)
+                self._versions[table] = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._versions.clear()
+            self.polled_at = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": get_catalog_cache_size(),
+            "ttl_seconds": get_catalog_cache_ttl_seconds(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+catalog_cache = CatalogCache()
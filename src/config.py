@@ -1,4 +1,7 @@
 import os
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
 
 
 def get_secret_key() -> str:
@@ -35,6 +38,240 @@ def get_db_url() -> str:
     return os.getenv("DB_URL", "sqlite:///./app.db")
 
 
+def _get_int(name: str, default: int, minimum: int = 0) -> int:
+    raw_value = os.getenv(name, str(default))
+    try:
+        value = int(raw_value)
+    except (TypeError, ValueError):
+        return default
+    return value if value >= minimum else default
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    raw_value = os.getenv(name)
+    if raw_value is None or raw_value.strip() == "":
+        return default
+    return raw_value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_db_pool_size() -> int:
+    return _get_int("DB_POOL_SIZE", 5, minimum=1)
+
+
+def get_db_max_overflow() -> int:
+    return _get_int("DB_MAX_OVERFLOW", 10)
+
+
+def get_db_pool_timeout() -> int:
+    return _get_int("DB_POOL_TIMEOUT", 30, minimum=1)
+
+
+def get_db_pool_recycle() -> int:
+    # -1 disables recycling, which is SQLAlchemy's default
+    return _get_int("DB_POOL_RECYCLE", 1800, minimum=-1)
+
+
+def get_db_pool_pre_ping() -> bool:
+    return _get_bool("DB_POOL_PRE_PING", True)
+
+
+def get_db_pool_prewarm() -> int:
+    return _get_int("DB_POOL_PREWARM", get_db_pool_size())
+
+
+def get_db_replica_urls() -> list[str]:
+    raw_value = os.getenv("DB_REPLICA_URLS", "")
+    return [url.strip() for url in raw_value.split(",") if url.strip()]
+
+
+def get_read_your_writes_seconds() -> int:
+    return _get_int("DB_READ_YOUR_WRITES_SECONDS", 5)
+
+
+def get_sqlite_tuning() -> bool:
+    return _get_bool("SQLITE_TUNING", True)
+
+
+def get_sqlite_serialized_writes() -> bool:
+    return _get_bool("SQLITE_SERIALIZED_WRITES", True)
+
+
+def get_sqlite_pragmas() -> dict[str, str | int]:
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": _get_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+        # Negative values are KiB, so this is 64 MiB of page cache
+        "cache_size": -_get_int("SQLITE_CACHE_SIZE_KB", 64 * 1024),
+        "busy_timeout": _get_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "temp_store": "MEMORY",
+    }
+
+
+def get_query_stats_headers() -> bool:
+    # Off by default, the headers tell any client how long its queries took
+    return _get_bool("DB_QUERY_HEADERS", False)
+
+
+def get_n_plus_one_threshold() -> int:
+    # 0 turns the N+1 warning off
+    return _get_int("DB_N_PLUS_ONE_THRESHOLD", 5)
+
+
+def get_slow_query_threshold_ms() -> int:
+    # 0 turns the slow query log off
+    return _get_int("DB_SLOW_QUERY_MS", 200)
+
+
+def get_slow_query_explain() -> bool:
+    return _get_bool("DB_SLOW_QUERY_EXPLAIN", True)
+
+
+def get_bulk_import_batch_size() -> int:
+    return _get_int("BULK_IMPORT_BATCH_SIZE", 1000, minimum=1)
+
+
+def get_export_batch_size() -> int:
+    return _get_int("EXPORT_BATCH_SIZE", 1000, minimum=1)
+
+
+def get_catalog_cache_size() -> int:
+    # 0 turns the catalog cache off
+    return _get_int("CATALOG_CACHE_SIZE", 1024)
+
+
+def get_catalog_cache_ttl_seconds() -> int:
+    return _get_int("CATALOG_CACHE_TTL_SECONDS", 60, minimum=1)
+
+
+def get_catalog_cache_poll_ms() -> int:
+    return _get_int("CATALOG_CACHE_POLL_MS", 1000)
+
+
+def get_idempotency_ttl_seconds() -> int:
+    return _get_int("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60, minimum=1)
+
+
+def get_idempotency_cache_size() -> int:
+    # 0 turns the in-process cache of stored responses off
+    return _get_int("IDEMPOTENCY_CACHE_SIZE", 1024)
+
+
+def get_bcrypt_rounds() -> int:
+    # bcrypt's log2 cost; every step doubles the time of a hash
+    return min(_get_int("BCRYPT_ROUNDS", 12, minimum=4), 31)
+
+
+def get_bcrypt_workers() -> int:
+    return _get_int("BCRYPT_WORKERS", max(1, (os.cpu_count() or 2) // 2), minimum=1)
+
+
+def get_bcrypt_queue_depth() -> int:
+    return _get_int("BCRYPT_QUEUE_DEPTH", 32)
+
+
+def get_auth_token_cache_size() -> int:
+    # 0 turns the verified-token cache off
+    return _get_int("AUTH_TOKEN_CACHE_SIZE", 4096)
+
+
+def get_refresh_token_expire_days() -> int:
+    return _get_int("REFRESH_TOKEN_EXPIRE_DAYS", 7, minimum=1)
+
+
+def get_revocation_sync_ms() -> int:
+    # 0 turns the background sync off, revocations then only reach the
+    # worker that made them and workers started afterwards
+    return _get_int("REVOCATION_SYNC_MS", 1000)
+
+
+def get_username_cache_size() -> int:
+    # 0 turns the username lookup cache off
+    return _get_int("USERNAME_CACHE_SIZE", 10000)
+
+
+def get_username_cache_ttl_seconds() -> int:
+    return _get_int("USERNAME_CACHE_TTL_SECONDS", 5, minimum=1)
+
+
+def get_rate_limit_enabled() -> bool:
+    return _get_bool("RATE_LIMIT_ENABLED", True)
+
+
+def get_rate_limit_db() -> str:
+    # Every worker on the host opens the same file; ":memory:" keeps the
+    # buckets per process
+    return os.getenv("RATE_LIMIT_DB", "").strip() or os.path.join(
+        tempfile.gettempdir(), "real-backend-rate-limit.db"
+    )
+
+
+RATE_LIMIT_DEFAULTS = {
+    # group: (requests per minute, burst, allowed when the store is busy)
+    "auth": (10, 5, False),
+    "write": (120, 30, True),
+    "read": (600, 120, True),
+}
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    per_minute: int
+    burst: int
+    # Let requests through, uncharged, when the shared store cannot be used
+    fail_open: bool = True
+
+
+@dataclass(frozen=True)
+class RateLimitSettings:
+    enabled: bool
+    db_path: str
+    # How often buckets counted in process are settled with the shared store
+    sync_ms: int
+    limits: dict[str, RateLimit]
+
+
+@lru_cache
+def get_rate_limit_settings() -> RateLimitSettings:
+    """Limits per route group from ``RATE_LIMIT_<GROUP>_PER_MINUTE``,
+    ``RATE_LIMIT_<GROUP>_BURST`` and ``RATE_LIMIT_<GROUP>_FAIL_OPEN``, read
+    once per process; a rate of 0 leaves the group unlimited."""
+    limits = {}
+    for group, (per_minute, burst, fail_open) in RATE_LIMIT_DEFAULTS.items():
+        prefix = f"RATE_LIMIT_{group.upper()}"
+        limits[group] = RateLimit(
+            per_minute=_get_int(f"{prefix}_PER_MINUTE", per_minute),
+            burst=_get_int(f"{prefix}_BURST", burst, minimum=1),
+            fail_open=_get_bool(f"{prefix}_FAIL_OPEN", fail_open),
+        )
+    return RateLimitSettings(
+        enabled=get_rate_limit_enabled(),
+        db_path=get_rate_limit_db(),
+        sync_ms=_get_int("RATE_LIMIT_SYNC_MS", 1000),
+        limits=limits,
+    )
+
+
+@dataclass(frozen=True)
+class AuthSettings:
+    secret_key: str
+    algorithm: str
+    access_token_expire_minutes: int
+    refresh_token_expire_days: int = 7
+
+
+@lru_cache
+def get_auth_settings() -> AuthSettings:
+    """The token signing settings, read from the environment once per
+    process; clear the cache to pick up new values."""
+    return AuthSettings(
+        secret_key=get_secret_key(),
+        algorithm=get_algorithm(),
+        access_token_expire_minutes=get_access_token_expire_minutes(),
+        refresh_token_expire_days=get_refresh_token_expire_days(),
+    )
+
+
 # Backward-compatible constants (lazy for SECRET_KEY to avoid import-time errors).
 ALGORITHM = get_algorithm()
 ACCESS_TOKEN_EXPIRE_MINUTES = get_access_token_expire_minutes()
@@ -1,20 +1,367 @@
+import asyncio
+import functools
+import inspect
+import itertools
+import threading
+import time
 from functools import lru_cache
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import SQLModel, create_engine, Session
-from src.config import get_db_url
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.config import (
+    get_db_url,
+    get_db_pool_size,
+    get_db_max_overflow,
+    get_db_pool_timeout,
+    get_db_pool_recycle,
+    get_db_pool_pre_ping,
+    get_db_pool_prewarm,
+    get_db_replica_urls,
+    get_read_your_writes_seconds,
+    get_sqlite_tuning,
+    get_sqlite_serialized_writes,
+    get_sqlite_pragmas,
+)
+
+READ_ONLY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+PRIMARY_PIN_COOKIE = "db_primary_until"
+
+_replica_counter = itertools.count()
+
+SessionLocal = sessionmaker(class_=Session, expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+
+class PoolWaitStats:
+    """Cumulative checkout wait times for one pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait_seconds": round(self.total_wait, 6),
+                "avg_wait_seconds": round(self.total_wait / self.checkouts, 6)
+                if self.checkouts
+                else 0.0,
+                "max_wait_seconds": round(self.max_wait, 6),
+            }
+
+
+class _TimedCheckoutMixin:
+    """Times how long callers wait for a connection to come out of the pool."""
+
+    @property
+    def wait_stats(self) -> PoolWaitStats:
+        stats = self.__dict__.get("_wait_stats")
+        if stats is None:
+            stats = self.__dict__.setdefault("_wait_stats", PoolWaitStats())
+        return stats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def get_async_db_url(db_url: str | None = None) -> str:
+    url = db_url or get_db_url()
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+psycopg:", 1)
+    if url.startswith("postgres:"):
+        return url.replace("postgres:", "postgresql+psycopg:", 1)
+    # postgresql+psycopg picks the async dialect on its own
+    return url
+
+
+def is_sqlite_file(db_url: str) -> bool:
+    url = make_url(db_url)
+    return url.get_backend_name() == "sqlite" and url.database not in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+def get_pool_options(db_url: str, poolclass) -> dict:
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite" and not is_sqlite_file(db_url):
+        # In-memory SQLite lives in a single connection, there is nothing to size
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": get_db_pool_size(),
+        "max_overflow": get_db_max_overflow(),
+        "pool_timeout": get_db_pool_timeout(),
+        "pool_recycle": get_db_pool_recycle(),
+        "pool_pre_ping": get_db_pool_pre_ping(),
+    }
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in get_sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _disable_driver_transactions(dbapi_connection, connection_record):
+    # Let SQLAlchemy emit BEGIN itself so it can be BEGIN IMMEDIATE
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(connection):
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def tune_sqlite(engine, writer: bool = False):
+    """Apply the SQLite production profile to ``engine``.
+
+    Every connection gets WAL and the other pragmas from config. A writer
+    engine also takes the write lock up front (BEGIN IMMEDIATE), so a
+    transaction that reads before it writes cannot fail halfway through
+    with "database is locked"."""
+    if not is_sqlite_file(engine.url.render_as_string()) or not get_sqlite_tuning():
+        return engine
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "connect", set_sqlite_pragmas)
+    if writer:
+        event.listen(sync_engine, "connect", _disable_driver_transactions)
+        event.listen(sync_engine, "begin", _begin_immediate)
+    return engine
+
+
+def serializes_writes(db_url: str) -> bool:
+    return (
+        is_sqlite_file(db_url)
+        and get_sqlite_tuning()
+        and get_sqlite_serialized_writes()
+    )
 
 
 @lru_cache
 def get_engine():
-    return create_engine(get_db_url())
+    db_url = get_db_url()
+    return tune_sqlite(
+        create_engine(db_url, **get_pool_options(db_url, TimedQueuePool))
+    )
+
+
+@lru_cache
+def get_async_engine():
+    """Engine for writes.
+
+    On SQLite it holds a single connection, so concurrent writers queue on
+    the pool (bounded by DB_POOL_TIMEOUT) instead of fighting over the file
+    lock."""
+    db_url = get_async_db_url()
+    options = get_pool_options(db_url, TimedAsyncQueuePool)
+    writer = serializes_writes(db_url)
+    if writer:
+        options.update(pool_size=1, max_overflow=0)
+    return tune_sqlite(create_async_engine(db_url, **options), writer=writer)
+
+
+@lru_cache
+def get_async_read_engine():
+    """Engine for reads against the primary database.
+
+    It is the write engine itself, except on SQLite with serialized writes,
+    where reads get their own pool. WAL lets those readers run alongside
+    the single writer."""
+    db_url = get_async_db_url()
+    if not serializes_writes(db_url):
+        return get_async_engine()
+    return tune_sqlite(
+        create_async_engine(db_url, **get_pool_options(db_url, TimedAsyncQueuePool))
+    )
+
+
+@lru_cache
+def get_replica_engines() -> tuple:
+    engines = []
+    for replica_url in get_db_replica_urls():
+        db_url = get_async_db_url(replica_url)
+        engines.append(
+            tune_sqlite(
+                create_async_engine(
+                    db_url, **get_pool_options(db_url, TimedAsyncQueuePool)
+                )
+            )
+        )
+    return tuple(engines)
+
+
+def get_async_engines() -> list:
+    engines = [get_async_engine()]
+    if get_async_read_engine() is not engines[0]:
+        engines.append(get_async_read_engine())
+    return engines + list(get_replica_engines())
+
+
+def is_pinned_to_primary(request: Request) -> bool:
+    raw_value = request.cookies.get(PRIMARY_PIN_COOKIE)
+    if not raw_value:
+        return False
+    try:
+        return float(raw_value) > time.time()
+    except ValueError:
+        return False
+
+
+def get_engine_for_request(request: Request | None = None):
+    """Pick the engine a request should read from.
+
+    Reads go to a replica (round-robin) unless the client wrote recently,
+    then to the primary's read pool. Everything else goes to the writer."""
+    if request is None or request.method not in READ_ONLY_METHODS:
+        return get_async_engine()
+    replicas = get_replica_engines()
+    if replicas and not is_pinned_to_primary(request):
+        return replicas[next(_replica_counter) % len(replicas)]
+    return get_async_read_engine()
+
+
+def pin_to_primary(request: Request, response: Response):
+    """Keep a client that just wrote on the primary long enough to read its
+    own writes."""
+    window = get_read_your_writes_seconds()
+    if request.method in READ_ONLY_METHODS or window <= 0 or not get_replica_engines():
+        return
+    response.set_cookie(
+        PRIMARY_PIN_COOKIE,
+        str(time.time() + window),
+        max_age=window,
+        httponly=True,
+        samesite="lax",
+    )
 
 
 def init_db():
     SQLModel.metadata.create_all(get_engine())
 
 
+async def warm_pools() -> int:
+    opened = 0
+    for engine in get_async_engines():
+        opened += await warm_pool(engine)
+    return opened
+
+
+async def dispose_engines():
+    for engine in get_async_engines():
+        await engine.dispose()
+
+
+async def warm_pool(engine=None, connections: int | None = None) -> int:
+    """Open up to ``connections`` pooled connections so the first requests
+    do not pay for the connect handshake."""
+    engine = engine or get_async_engine()
+    if connections is None:
+        connections = get_db_pool_prewarm()
+    pool_size = getattr(engine.pool, "size", lambda: 0)()
+    connections = min(connections, pool_size)
+    if connections <= 0:
+        return 0
+    opened = await asyncio.gather(*(engine.connect() for _ in range(connections)))
+    for connection in opened:
+        await connection.close()
+    return connections
+
+
+def get_pool_status(engine=None) -> dict:
+    engine = engine or get_async_engine()
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            }
+        )
+    if isinstance(pool, _TimedCheckoutMixin):
+        status["wait"] = pool.wait_stats.snapshot()
+    return status
+
+
 def get_session():
-    session = sessionmaker(bind=get_engine(), class_=Session, expire_on_commit=False)
+    with SessionLocal(bind=get_engine()) as session:
+        yield session
 
-    with session() as session:
+
+async def get_async_session(request: Request = None):
+    # The session only checks a connection out of the pool on its first
+    # statement, so requests that never reach the database never touch the pool
+    async with AsyncSessionLocal(bind=get_engine_for_request(request)) as session:
         yield session
+
+
+def _release_sessions_after(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            for value in kwargs.values():
+                if isinstance(value, AsyncSession):
+                    await value.close()
+
+    return wrapper
+
+
+class UnitOfWorkRoute(APIRoute):
+    """Route that hands the request's session back to the pool as soon as
+    the handler returns.
+
+    Without it the connection is held until FastAPI tears down the
+    dependency, which happens after the response has been serialized.
+    Handlers must return fully loaded objects, which they already do since
+    lazy loads are not available under AsyncSession."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _release_sessions_after(endpoint)
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,301 @@
+"""Idempotency keys for POST endpoints that must not run twice.
+
+A client that retries a request sends the same ``Idempotency-Key`` header as
+the first attempt. The response of the first attempt that succeeded is
+stored in ``idempotency_key``, in the same transaction as the writes that
+produced it, so a retry either finds it and gets it back byte for byte or
+finds nothing because nothing was committed.
+
+Keys belong to the user that sent them: the same key from two users names
+two different requests, and neither can replay or probe the other's.
+
+Requests with the same key are serialized. Before running, a request claims
+its key by committing an in-flight row, so the primary key lets only one
+request run however many workers see the key. In this process later
+requests wait on a per-key lock and replay the stored response; one that
+finds the key in flight on another worker gets ``409`` with
+``Retry-After``. A failed request deletes its claim, and a worker that dies
+holding one loses it after ``CLAIM_SECONDS``. A small LRU of recent
+responses saves the lookup for retries that land on the same worker.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Field, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import get_idempotency_cache_size, get_idempotency_ttl_seconds
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Expired rows are deleted at most this often per process
+PURGE_INTERVAL_SECONDS = 60
+# How long a claim holds its key if the request never answers
+CLAIM_SECONDS = 60
+# status_code of a claimed key whose request is still running
+IN_FLIGHT = 0
+
+
+class IdempotencyRecord(SQLModel, table=True):
+    __tablename__ = "idempotency_key"
+
+    username: str = Field(primary_key=True, max_length=255)
+    key: str = Field(primary_key=True, max_length=255)
+    # Hash of the request body, a key reused for another request is refused
+    fingerprint: str = Field(max_length=64)
+    status_code: int
+    body: str
+    # Naive UTC
+    expires_at: datetime.datetime = Field(index=True)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class ResponseCache:
+    """LRU of recently stored responses, by ``(username, key)``."""
+
+    def __init__(self):
+        self._entries: OrderedDict[tuple[str, str], IdempotencyRecord] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, str]) -> IdempotencyRecord | None:
+        with self._lock:
+            record = self._entries.get(key)
+            if record is None:
+                return None
+            if record.expires_at <= _utcnow():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return record
+
+    def put(self, record: IdempotencyRecord):
+        maxsize = get_idempotency_cache_size()
+        with self._lock:
+            if maxsize <= 0:
+                return
+            key = (record.username, record.key)
+            self._entries[key] = record
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+class KeyLocks:
+    """One asyncio lock per key in use, dropped when nobody holds or waits
+    for it."""
+
+    def __init__(self):
+        self._locks: dict[tuple[str, str], tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: tuple[str, str]):
+        lock, users = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+
+key_locks = KeyLocks()
+
+_last_purge = 0.0
+
+
+@dataclass
+class IdempotentRequest:
+    """The user, key and request a handler stores its response under."""
+
+    username: str
+    key: str
+    fingerprint: str
+    record: IdempotencyRecord | None = None
+
+    def _where(self):
+        return (
+            IdempotencyRecord.username == self.username,
+            IdempotencyRecord.key == self.key,
+        )
+
+    async def claim(self, session: AsyncSession) -> bool:
+        """Commit the key as in flight, so requests on other workers find it
+        taken while the handler runs. False if another request has it."""
+        claim = IdempotencyRecord(
+            username=self.username,
+            key=self.key,
+            fingerprint=self.fingerprint,
+            status_code=IN_FLIGHT,
+            body="",
+            expires_at=_utcnow() + datetime.timedelta(seconds=CLAIM_SECONDS),
+        )
+        session.add(claim)
+        try:
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return False
+        session.expunge(claim)
+        return True
+
+    async def release(self, session: AsyncSession):
+        """Delete the claim of a request that failed, so it can be retried."""
+        await session.rollback()
+        await session.exec(
+            delete(IdempotencyRecord).where(
+                *self._where(), IdempotencyRecord.status_code == IN_FLIGHT
+            )
+        )
+        await session.commit()
+
+    async def save(self, session: AsyncSession, status_code: int, body) -> None:
+        """Store the response on the claimed key; call it before the commit
+        that writes whatever the response describes."""
+        global _last_purge
+        now = _utcnow()
+        if time.monotonic() - _last_purge >= PURGE_INTERVAL_SECONDS:
+            _last_purge = time.monotonic()
+            await session.exec(
+                delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= now)
+            )
+        self.record = IdempotencyRecord(
+            username=self.username,
+            key=self.key,
+            fingerprint=self.fingerprint,
+            status_code=status_code,
+            # Rendered as JSONResponse.render does, so a replay is byte for
+            # byte what a request without a key gets
+            body=json.dumps(
+                body,
+                ensure_ascii=False,
+                allow_nan=False,
+                indent=None,
+                separators=(",", ":"),
+            ),
+            expires_at=now + datetime.timedelta(seconds=get_idempotency_ttl_seconds()),
+        )
+        await session.exec(
+            update(IdempotencyRecord)
+            .where(*self._where())
+            .values(
+                status_code=self.record.status_code,
+                body=self.record.body,
+                expires_at=self.record.expires_at,
+            )
+        )
+
+
+def request_fingerprint(payload: BaseModel) -> str:
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+async def _find(
+    session: AsyncSession, username: str, key: str
+) -> IdempotencyRecord | None:
+    record = response_cache.get((username, key))
+    if record is not None:
+        return record
+    record = await session.get(IdempotencyRecord, {"username": username, "key": key})
+    if record is None:
+        return None
+    if record.expires_at <= _utcnow():
+        # Free the key for this request, in its transaction
+        session.expunge(record)
+        await session.exec(
+            delete(IdempotencyRecord).where(
+                IdempotencyRecord.username == username, IdempotencyRecord.key == key
+            )
+        )
+        return None
+    if record.status_code != IN_FLIGHT:
+        response_cache.put(record)
+    return record
+
+
+def _in_progress() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"A request with this {IDEMPOTENCY_KEY_HEADER} is still in progress",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _response(record: IdempotencyRecord, fingerprint: str, replayed: bool) -> Response:
+    if record.fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} was already used for another request",
+        )
+    if record.status_code == IN_FLIGHT:
+        raise _in_progress()
+    headers = {REPLAYED_HEADER: "true"} if replayed else None
+    return Response(
+        content=record.body,
+        status_code=record.status_code,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+async def idempotent_response(
+    session: AsyncSession,
+    username: str,
+    key: str,
+    payload: BaseModel,
+    handler: Callable[[IdempotentRequest], Awaitable[object]],
+) -> Response:
+    """Replay the response ``username`` got for ``key``, or claim the key and
+    run ``handler``, which must call ``IdempotentRequest.save`` before
+    committing.
+
+    Only responses that were saved are replayed; a handler that raises
+    (a 404, out of stock) frees the key and the client may retry."""
+    fingerprint = request_fingerprint(payload)
+    async with key_locks.hold((username, key)):
+        record = await _find(session, username, key)
+        if record is not None:
+            return _response(record, fingerprint, replayed=True)
+        request = IdempotentRequest(username, key, fingerprint)
+        if not await request.claim(session):
+            # Another worker claimed the key since the lookup
+            record = await _find(session, username, key)
+            if record is None:
+                raise _in_progress()
+            return _response(record, fingerprint, replayed=True)
+        try:
+            await handler(request)
+        except Exception:
+            await request.release(session)
+            raise
+        response_cache.put(request.record)
+        return _response(request.record, fingerprint, replayed=False)
@@ -0,0 +1,127 @@
+"""Per-request SQL statement counting and N+1 detection.
+
+The listeners are registered on the ``Engine`` class, so they see every
+engine, sync or async, including the ones tests create. Statements are
+attributed to the request whose context issued them.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.config import get_query_stats_headers, get_n_plus_one_threshold
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-DB-Queries"
+QUERY_TIME_HEADER = "X-DB-Time"
+
+# "(?, ?, ?)" and "(?)" are the same query as far as N+1 goes
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_IN_LIST = re.compile(rf"\({_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\)")
+
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST.sub("(?)", " ".join(statement.split()))
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_time: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+    request: Request | None = None
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statement shapes that ran at least ``threshold`` times."""
+        if threshold <= 0:
+            return []
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+_request_stats: ContextVar[QueryStats | None] = ContextVar(
+    "request_query_stats", default=None
+)
+
+
+def start_query_stats(request: Request | None = None) -> QueryStats:
+    stats = QueryStats(request=request)
+    _request_stats.set(stats)
+    return stats
+
+
+def get_query_stats() -> QueryStats | None:
+    return _request_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    conn.info["query_elapsed"] = elapsed
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_timer(exception_context):
+    timers = exception_context.connection and exception_context.connection.info.get(
+        "query_start_time"
+    )
+    if timers:
+        timers.pop()
+
+
+@contextmanager
+def capture_queries():
+    """Collect every statement run on any engine, from any thread, while the
+    block runs. Meant for tests and benchmarks."""
+    stats = QueryStats()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        stats.record(statement, conn.info["query_elapsed"])
+
+    # Registered after _record_statement, which has already timed the statement
+    event.listen(Engine, "after_cursor_execute", record)
+    try:
+        yield stats
+    finally:
+        event.remove(Engine, "after_cursor_execute", record)
+
+
+def get_route_path(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", request.url.path)
+
+
+def report_query_stats(request: Request, response: Response, stats: QueryStats):
+    """Add the query headers to ``response`` and log N+1 suspects."""
+    if get_query_stats_headers():
+        response.headers[QUERY_COUNT_HEADER] = str(stats.count)
+        response.headers[QUERY_TIME_HEADER] = f"{stats.total_time * 1000:.2f}"
+    for shape, count in stats.repeated(get_n_plus_one_threshold()):
+        logger.warning(
+            "Possible N+1 on %s %s: ran %d times: %s",
+            request.method,
+            get_route_path(request),
+            count,
+            shape,
+        )
@@ -0,0 +1,463 @@
+"""Versioned schema migrations.
+
+Every migration is a function that receives a sync ``Connection`` inside the
+transaction that records it. Applied versions are stored in
+``schema_version`` together with a fingerprint of the models, so startup only
+has to read one row to know the database is current.
+
+To change the schema, edit the models and append a migration to
+``MIGRATIONS``. Migrations must be safe to run against a database created by
+an older ``create_all`` (use ``checkfirst=True`` or ``IF NOT EXISTS``).
+
+Run pending migrations by hand with ``python -m src.migrations``.
+"""
+
+import datetime
+import hashlib
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlmodel import SQLModel
+from sqlmodel.sql.sqltypes import AutoString
+
+# Register every table on SQLModel.metadata before it is fingerprinted
+import src.routes.auth.models  # noqa: F401
+import src.routes.brands.models  # noqa: F401
+import src.routes.categories.models  # noqa: F401
+import src.routes.customers.models  # noqa: F401
+import src.routes.products.models  # noqa: F401
+import src.routes.providers.models  # noqa: F401
+import src.routes.sales.models  # noqa: F401
+from src.idempotency import IdempotencyRecord
+from src.routes.auth.models import RevokedToken, User
+from src.routes.reports.models import DailyProductSales, DailySales
+from src.routes.reports.operations import (
+    rebuild_daily_product_sales,
+    rebuild_daily_sales,
+)
+from src.versions import TableVersion
+
+# Kept off SQLModel.metadata so it is not part of its own fingerprint
+version_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("fingerprint", String(64), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every worker
+MIGRATION_LOCK_KEY = 7_206_410_553
+# How long a worker booting next to a migrating one waits for the SQLite
+# write lock; long migrations (the sales rollup backfill) hold it that long
+MIGRATION_LOCK_TIMEOUT_MS = 10 * 60 * 1000
+
+# The tables as the first release created them. Frozen: later schema changes
+# are their own migrations, so migration 1 builds the same tables whatever
+# the models look like today.
+baseline_metadata = MetaData()
+
+for _name in ("brand", "category"):
+    Table(
+        _name,
+        baseline_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", AutoString, nullable=False, unique=True, index=True),
+    )
+
+Table(
+    "customer",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("dni", Integer, nullable=False, unique=True, index=True),
+    Column("name", AutoString, nullable=False),
+    Column("last_name", AutoString, nullable=False),
+    Column("email", AutoString, nullable=False),
+)
+
+Table(
+    "provider",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("ruc", Integer, nullable=False),
+    Column("name", AutoString, nullable=False, unique=True, index=True),
+    Column("address", AutoString, nullable=False),
+    Column("phone", AutoString, nullable=False),
+    Column("email", AutoString, nullable=False),
+)
+
+Table(
+    "user",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", AutoString, nullable=False),
+    Column("hashed_password", AutoString, nullable=False),
+    Column("role", AutoString, nullable=False),
+)
+
+Table(
+    "product",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", AutoString, nullable=False),
+    Column("description", AutoString, nullable=False),
+    Column("stock", Integer, nullable=False),
+    Column("price", Float, nullable=False),
+    Column("provider_name", AutoString, ForeignKey("provider.name")),
+    Column("category_name", AutoString, ForeignKey("category.name")),
+    Column("brand_name", AutoString, ForeignKey("brand.name")),
+    Column("created_at", DateTime, nullable=False),
+)
+
+Table(
+    "sale",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("total", Float, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("customer_dni", Integer, ForeignKey("customer.dni"), nullable=False),
+)
+
+Table(
+    "productsale",
+    baseline_metadata,
+    Column("product_id", Integer, ForeignKey("product.id"), primary_key=True),
+    Column("sale_id", Integer, ForeignKey("sale.id"), primary_key=True),
+    Column("quantity", Integer, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _0001_initial_schema(connection: Connection):
+    baseline_metadata.create_all(connection)
+
+
+def _create_index(
+    connection: Connection, name: str, table: str, *columns: str, unique: bool = False
+):
+    quote = connection.dialect.identifier_preparer.quote
+    connection.execute(
+        text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS "
+            f"{quote(name)} ON {quote(table)} "
+            f"({', '.join(quote(column) for column in columns)})"
+        )
+    )
+
+
+def _0002_hot_column_indexes(connection: Connection):
+    _create_index(connection, "ix_product_category_name", "product", "category_name")
+    _create_index(connection, "ix_product_brand_name", "product", "brand_name")
+    _create_index(connection, "ix_product_provider_name", "product", "provider_name")
+    _create_index(connection, "ix_sale_customer_dni", "sale", "customer_dni")
+    _create_index(connection, "ix_sale_created_at", "sale", "created_at")
+    _create_index(connection, "ix_productsale_sale_id", "productsale", "sale_id")
+    _create_index(connection, "ix_user_username", "user", "username")
+
+
+def _0003_product_keyset_indexes(connection: Connection):
+    _create_index(connection, "ix_product_price_id", "product", "price", "id")
+    _create_index(connection, "ix_product_created_at_id", "product", "created_at", "id")
+
+
+def _0004_product_search(connection: Connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            text(
+                "ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                "GENERATED ALWAYS AS ("
+                "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+                ") STORED"
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_product_search_vector "
+                "ON product USING GIN (search_vector)"
+            )
+        )
+        return
+    # External content table: the text lives in product, FTS5 only keeps the
+    # index. The triggers keep it in step with every write to product.
+    for statement in (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+        "name, description, content='product', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product "
+        "BEGIN INSERT INTO product_fts(rowid, name, description) "
+        "VALUES (new.id, new.name, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product "
+        "BEGIN INSERT INTO product_fts(product_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_update "
+        "AFTER UPDATE OF name, description ON product "
+        "BEGIN INSERT INTO product_fts(product_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO product_fts(rowid, name, description) "
+        "VALUES (new.id, new.name, new.description); END",
+        "INSERT INTO product_fts(product_fts) VALUES ('rebuild')",
+    ):
+        connection.execute(text(statement))
+
+
+def _0005_table_versions(connection: Connection):
+    table = TableVersion.__table__
+    table.create(connection, checkfirst=True)
+    existing = set(connection.execute(select(table.c.name)).scalars())
+    tables = ("product", "category", "brand", "provider")
+    missing = [name for name in tables if name not in existing]
+    if missing:
+        connection.execute(
+            insert(table), [{"name": name, "version": 0} for name in missing]
+        )
+
+
+def _0006_sale_keyset_indexes(connection: Connection):
+    _create_index(connection, "ix_sale_created_at_id", "sale", "created_at", "id")
+    _create_index(
+        connection,
+        "ix_sale_customer_dni_created_at_id",
+        "sale",
+        "customer_dni",
+        "created_at",
+        "id",
+    )
+    # Prefixes of the indexes above
+    quote = connection.dialect.identifier_preparer.quote
+    for name in ("ix_sale_created_at", "ix_sale_customer_dni"):
+        connection.execute(text(f"DROP INDEX IF EXISTS {quote(name)}"))
+
+
+def _0007_daily_product_sales(connection: Connection):
+    DailyProductSales.__table__.create(connection, checkfirst=True)
+    rebuild_daily_product_sales(connection)
+
+
+def _0008_idempotency_keys(connection: Connection):
+    # As first released, keyed by the key alone; migration 11 replaces it
+    table = Table(
+        "idempotency_key",
+        MetaData(),
+        Column("key", String(255), primary_key=True),
+        Column("fingerprint", String(64), nullable=False),
+        Column("status_code", Integer, nullable=False),
+        Column("body", AutoString, nullable=False),
+        Column("expires_at", DateTime, nullable=False, index=True),
+    )
+    table.create(connection, checkfirst=True)
+
+
+def _0009_revoked_tokens(connection: Connection):
+    RevokedToken.__table__.create(connection, checkfirst=True)
+
+
+def _0010_unique_usernames(connection: Connection):
+    user = User.__table__
+    duplicates = (
+        connection.execute(
+            select(user.c.username).group_by(user.c.username).having(func.count() > 1)
+        )
+        .scalars()
+        .all()
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Usernames registered more than once, resolve them before "
+            f"migrating: {', '.join(duplicates)}"
+        )
+    quote = connection.dialect.identifier_preparer.quote
+    connection.execute(text(f"DROP INDEX IF EXISTS {quote('ix_user_username')}"))
+    _create_index(connection, "ix_user_username", "user", "username", unique=True)
+
+
+def _0011_idempotency_keys_per_user(connection: Connection):
+    # The stored responses are not attributed to a user and cannot be kept:
+    # a retry of a request sent before the upgrade runs it again
+    quote = connection.dialect.identifier_preparer.quote
+    connection.execute(text(f"DROP TABLE IF EXISTS {quote('idempotency_key')}"))
+    IdempotencyRecord.__table__.create(connection)
+
+
+def _0012_stock_version(connection: Connection):
+    table = TableVersion.__table__
+    if (
+        connection.execute(select(table.c.name).where(table.c.name == "stock")).first()
+        is None
+    ):
+        connection.execute(insert(table).values(name="stock", version=0))
+
+
+def _0013_daily_sales(connection: Connection):
+    DailySales.__table__.create(connection, checkfirst=True)
+    rebuild_daily_sales(connection)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "initial schema", _0001_initial_schema),
+    Migration(
+        2, "indexes on hot foreign key and filter columns", _0002_hot_column_indexes
+    ),
+    Migration(3, "keyset indexes for product sorts", _0003_product_keyset_indexes),
+    Migration(4, "full-text search index on products", _0004_product_search),
+    Migration(5, "version counters for catalog tables", _0005_table_versions),
+    Migration(6, "keyset indexes for sale listings", _0006_sale_keyset_indexes),
+    Migration(7, "daily sales rollup per product", _0007_daily_product_sales),
+    Migration(8, "stored responses for idempotency keys", _0008_idempotency_keys),
+    Migration(9, "revoked login sessions", _0009_revoked_tokens),
+    Migration(10, "unique usernames", _0010_unique_usernames),
+    Migration(11, "idempotency keys per user", _0011_idempotency_keys_per_user),
+    Migration(12, "version counter for product stock", _0012_stock_version),
+    Migration(13, "daily sales rollup", _0013_daily_sales),
+]
+
+
+def head_version() -> int:
+    return MIGRATIONS[-1].version
+
+
+def schema_fingerprint(metadata: MetaData = SQLModel.metadata) -> str:
+    """Hash of the tables, columns, indexes and foreign keys in ``metadata``."""
+    parts = []
+    for table in sorted(metadata.tables.values(), key=lambda table: table.name):
+        parts.append(f"table {table.name}")
+        for column in table.columns:
+            # Type name and length, repr() of every type is measurably slower
+            column_type = type(column.type).__name__
+            length = getattr(column.type, "length", None)
+            parts.append(
+                f"column {column.name} {column_type}({length}) "
+                f"nullable={column.nullable} pk={column.primary_key}"
+            )
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            columns = ",".join(column.name for column in index.columns)
+            parts.append(f"index {index.name} ({columns}) unique={index.unique}")
+        for key in sorted(
+            table.foreign_keys, key=lambda key: (key.parent.name, key.target_fullname)
+        ):
+            parts.append(f"fk {key.parent.name} -> {key.target_fullname}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def get_schema_state(engine: Engine) -> tuple[int, str | None]:
+    """Return the stored ``(version, fingerprint)``, ``(0, None)`` if the
+    database has never been migrated."""
+    statement = (
+        select(schema_version.c.version, schema_version.c.fingerprint)
+        .order_by(schema_version.c.version.desc())
+        .limit(1)
+    )
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(statement).first()
+    except (OperationalError, ProgrammingError):
+        # schema_version does not exist yet
+        return 0, None
+    return (row.version, row.fingerprint) if row else (0, None)
+
+
+def _lock_sqlite(connection: Connection):
+    """Take the database write lock for the rest of the transaction.
+
+    pysqlite only opens a transaction before DML, so without this the DDL of
+    two workers booting together interleaves. An engine that already begins
+    with BEGIN IMMEDIATE holds the lock by now."""
+    driver_connection = connection.connection.driver_connection
+    if driver_connection.in_transaction:
+        return
+    connection.exec_driver_sql(f"PRAGMA busy_timeout = {MIGRATION_LOCK_TIMEOUT_MS}")
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _apply_pending(engine: Engine, fingerprint: str) -> int:
+    with engine.connect() as connection:
+        busy_timeout = None
+        if connection.dialect.name == "sqlite":
+            # Put back after the migrations, the connection returns to the pool
+            busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            connection.commit()
+        try:
+            with connection.begin():
+                return _apply_locked(connection, fingerprint)
+        finally:
+            if busy_timeout is not None:
+                connection.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+                connection.commit()
+
+
+def _apply_locked(connection: Connection, fingerprint: str) -> int:
+    # Workers booting together wait here instead of racing the DDL, then
+    # find the migrations applied when they read schema_version below
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+        )
+    elif connection.dialect.name == "sqlite":
+        _lock_sqlite(connection)
+    version_metadata.create_all(connection)
+    current = connection.execute(
+        select(schema_version.c.version)
+        .order_by(schema_version.c.version.desc())
+        .limit(1)
+    ).scalar()
+    current = current or 0
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        migration.upgrade(connection)
+        connection.execute(
+            insert(schema_version).values(
+                version=migration.version,
+                fingerprint=fingerprint,
+                applied_at=datetime.datetime.now(datetime.timezone.utc),
+            )
+        )
+        current = migration.version
+    return current
+
+
+def migrate(engine: Engine) -> int:
+    """Bring the database up to the latest migration and return its version.
+
+    When the database is already current this is a single indexed read."""
+    fingerprint = schema_fingerprint()
+    version, stored_fingerprint = get_schema_state(engine)
+    if version < head_version():
+        version = _apply_pending(engine, fingerprint)
+        stored_fingerprint = fingerprint
+    if version == head_version() and stored_fingerprint != fingerprint:
+        raise RuntimeError(
+            "The models no longer match the schema recorded by migration "
+            f"{version}. Add a migration to src/migrations.py for the change."
+        )
+    return version
+
+
+if __name__ == "__main__":
+    from src.database import get_engine
+
+    print(f"Database at migration {migrate(get_engine())}")
@@ -0,0 +1,69 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row of a page, base64-encoded JSON, so
+the next page is a range scan on an index instead of an OFFSET.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort: str, values: tuple) -> str:
+    payload = json.dumps([sort, [_encode_value(value) for value in values]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, size: int) -> tuple:
+    """Return the key stored in ``cursor``; 400 if it is malformed or was
+    issued for a different sort."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(padded))
+        values = tuple(_decode_value(value) for value in values)
+    except (ValueError, TypeError, binascii.Error):
+        values, cursor_sort = (), None
+    if cursor_sort != sort or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    return values
+
+
+def paginate(statement, columns: tuple, descending: bool, cursor_values, limit: int):
+    """Order ``statement`` by ``columns`` and start it after ``cursor_values``.
+
+    One extra row is fetched so the caller can tell whether there is a next
+    page without a COUNT."""
+    if cursor_values is not None:
+        key, after = tuple_(*columns), tuple_(*cursor_values)
+        statement = statement.where(key < after if descending else key > after)
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return statement.order_by(*order).limit(limit + 1)
+
+
+def split_page(rows: list, limit: int, sort: str, key) -> tuple[list, str | None]:
+    """Trim the extra row fetched by ``paginate`` and build the next cursor
+    from the last row kept, using ``key(row)`` for its sort key."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort, key(rows[-1]))
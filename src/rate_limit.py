@@ -0,0 +1,472 @@
+"""Token-bucket rate limiting per client IP and per user, checked before a
+request reaches a route.
+
+Requests fall into route groups (``auth`` for logins and registrations,
+``write`` for the other non-GET requests, ``read`` for GETs), each with its
+own rate and burst. A request takes one token from its group's bucket for
+the client IP and, when it carries a valid access token, one from the
+bucket for the user; if either is empty it is answered ``429`` with
+``Retry-After`` before any session is opened or any password hashed, and
+neither bucket is charged.
+
+Reads are most of the traffic and the cheapest to serve, so their buckets
+are counted in process, on the event loop, without a lock or a query. Every
+``RATE_LIMIT_SYNC_MS`` the tokens each worker took are settled in one batch
+with the store the workers share, and the shared levels come back, so the
+read limits hold across workers to within a sync interval.
+
+``auth`` and ``write`` checks go to the shared store directly. It is a few
+small SQLite files outside the application database that every worker on
+the host opens, with each bucket key in one of ``SHARDS`` files, each with
+its own lock and connection, so checks for different keys do not wait for
+each other. A check is a short ``BEGIN IMMEDIATE`` transaction per file it
+touches, run in the threadpool: it usually takes microseconds, but while
+another worker holds a file it waits up to ``BUSY_TIMEOUT_SECONDS``.
+
+A check that still finds its file locked, or cannot use the store at all,
+is counted in ``errors`` and follows its group's ``fail_open``: the request
+is let through uncharged, or refused with ``429`` and
+``Retry-After: 1``. Logins fail closed by default, since a password-guessing
+burst is exactly what keeps the store busy; reads and writes fail open.
+"""
+
+import asyncio
+import contextlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from collections.abc import Callable
+
+from fastapi import Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from src.config import RateLimit, get_rate_limit_settings
+
+logger = logging.getLogger(__name__)
+
+BUSY_TIMEOUT_SECONDS = 0.05
+# Retry-After for a request refused because the store was busy
+BUSY_RETRY_SECONDS = 1.0
+# Buckets that have refilled are deleted every this many checks
+PRUNE_EVERY = 1000
+# Files the shared buckets are spread over, by key
+SHARDS = 8
+# Groups counted in process and settled with the shared store in batches
+LOCAL_GROUPS = frozenset({"read"})
+
+AUTH_PATHS = frozenset({"/auth/token", "/auth/register"})
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+
+def route_group(method: str, path: str) -> str | None:
+    """The limit group of a request, None for requests never limited."""
+    if method == "OPTIONS":
+        # CORS preflights carry no credentials and do no work
+        return None
+    if method == "POST" and path.rstrip("/") in AUTH_PATHS:
+        return "auth"
+    return "read" if method in READ_METHODS else "write"
+
+
+def _bearer_token(request: Request) -> str | None:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token
+
+
+def _wait(levels: dict, limit: RateLimit) -> float:
+    """Seconds until every bucket in ``levels`` has a token, <= 0 if now."""
+    return max((1 - tokens) / (limit.per_minute / 60) for tokens in levels.values())
+
+
+class BucketStore:
+    """Token buckets in a SQLite database shared by every process that opens
+    the same path."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        if path != ":memory:":
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        # Losing the last few buckets in a power cut is harmless
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS bucket ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+            "updated REAL NOT NULL, full_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_bucket_full_at ON bucket (full_at)"
+        )
+        self._lock = threading.Lock()
+        self._checks = 0
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Hold this file's lock and write lock; commit on exit."""
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+                self._checks += 1
+                if self._checks % PRUNE_EVERY == 0:
+                    connection.execute(
+                        "DELETE FROM bucket WHERE full_at <= ?", (time.time(),)
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def levels(connection, keys: list[str], limit: RateLimit, now: float) -> dict:
+        """The tokens in each of ``keys`` at ``now``, refilled."""
+        stored = {
+            key: (tokens, updated)
+            for key, tokens, updated in connection.execute(
+                "SELECT key, tokens, updated FROM bucket WHERE key IN "
+                f"({', '.join('?' * len(keys))})",
+                keys,
+            )
+        }
+        rate = limit.per_minute / 60
+        levels = {}
+        for key in keys:
+            tokens, updated = stored.get(key, (limit.burst, now))
+            levels[key] = min(limit.burst, tokens + max(0.0, now - updated) * rate)
+        return levels
+
+    @staticmethod
+    def store(connection, levels: dict, limit: RateLimit, now: float):
+        """Write ``levels`` (key -> tokens) as of ``now``."""
+        rate = limit.per_minute / 60
+        connection.executemany(
+            "INSERT INTO bucket (key, tokens, updated, full_at) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "tokens = excluded.tokens, updated = excluded.updated, "
+            "full_at = excluded.full_at",
+            [
+                (key, tokens, now, now + (limit.burst - tokens) / rate)
+                for key, tokens in levels.items()
+            ],
+        )
+
+    def take(self, keys: list[str], limit: RateLimit, now: float) -> float:
+        """Take a token from every bucket in ``keys``. Returns 0, or the
+        seconds until all of them have one again, in which case nothing is
+        taken."""
+        with self.transaction() as connection:
+            levels = self.levels(connection, keys, limit, now)
+            wait = _wait(levels, limit)
+            if wait <= 0:
+                self.store(
+                    connection,
+                    {key: tokens - 1 for key, tokens in levels.items()},
+                    limit,
+                    now,
+                )
+        return max(0.0, wait)
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM bucket")
+
+    def close(self):
+        self._connection.close()
+
+
+def _shard_path(path: str, shard: int) -> str:
+    if path == ":memory:":
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}-{shard}{extension}"
+
+
+class ShardedBucketStore:
+    """Buckets spread over ``SHARDS`` stores by key, so that checks for
+    different keys take different locks."""
+
+    def __init__(self, path: str, shards: int = SHARDS):
+        self.path = path
+        self.shards = [BucketStore(_shard_path(path, i)) for i in range(shards)]
+
+    def _by_shard(self, keys) -> dict[int, list[str]]:
+        by_shard: dict[int, list[str]] = {}
+        for key in keys:
+            shard = zlib.crc32(key.encode()) % len(self.shards)
+            by_shard.setdefault(shard, []).append(key)
+        # Always locked in the same order, so two checks never deadlock
+        return dict(sorted(by_shard.items()))
+
+    def take(self, keys: list[str], limit: RateLimit, now: float) -> float:
+        """As ``BucketStore.take``, across the shards ``keys`` fall in."""
+        by_shard = self._by_shard(keys)
+        with contextlib.ExitStack() as stack:
+            connections = {
+                shard: stack.enter_context(self.shards[shard].transaction())
+                for shard in by_shard
+            }
+            levels = {
+                shard: BucketStore.levels(connections[shard], shard_keys, limit, now)
+                for shard, shard_keys in by_shard.items()
+            }
+            wait = max(_wait(shard_levels, limit) for shard_levels in levels.values())
+            if wait <= 0:
+                for shard, shard_levels in levels.items():
+                    BucketStore.store(
+                        connections[shard],
+                        {key: tokens - 1 for key, tokens in shard_levels.items()},
+                        limit,
+                        now,
+                    )
+        return max(0.0, wait)
+
+    def settle(self, taken: dict[str, tuple[RateLimit, int]], now: float) -> dict:
+        """Charge the tokens each bucket in ``taken`` (key -> (limit,
+        tokens)) lost in a worker since the last settle. Returns the shared
+        level of each, which is below zero when the workers together went
+        over the limit."""
+        levels = {}
+        for shard, keys in self._by_shard(taken).items():
+            with self.shards[shard].transaction() as connection:
+                for key in keys:
+                    limit, count = taken[key]
+                    (level,) = BucketStore.levels(
+                        connection, [key], limit, now
+                    ).values()
+                    levels[key] = level - count
+                    if count:
+                        BucketStore.store(connection, {key: levels[key]}, limit, now)
+        return levels
+
+    def clear(self):
+        for store in self.shards:
+            store.clear()
+
+    def close(self):
+        for store in self.shards:
+            store.close()
+
+
+class LocalBuckets:
+    """Buckets counted in this process, only touched from the event loop."""
+
+    def __init__(self):
+        # key -> [limit, tokens, updated, tokens taken since the last settle]
+        self._buckets: dict[str, list] = {}
+        self._checks = 0
+
+    def _level(self, key: str, limit: RateLimit, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return limit.burst
+        _, tokens, updated, _ = bucket
+        return min(limit.burst, tokens + (now - updated) * limit.per_minute / 60)
+
+    def take(self, keys: list[str], limit: RateLimit, now: float) -> float:
+        """As ``BucketStore.take``."""
+        levels = {key: self._level(key, limit, now) for key in keys}
+        wait = _wait(levels, limit)
+        if wait <= 0:
+            for key, tokens in levels.items():
+                taken = self._buckets[key][3] if key in self._buckets else 0
+                self._buckets[key] = [limit, tokens - 1, now, taken + 1]
+        self._checks += 1
+        if self._checks % PRUNE_EVERY == 0:
+            self._prune(now)
+        return max(0.0, wait)
+
+    def _prune(self, now: float):
+        # A bucket that has refilled is the same as no bucket; what it took
+        # and was not settled yet is at most one idle client's burst
+        for key in [
+            key
+            for key, (limit, *_) in self._buckets.items()
+            if self._level(key, limit, now) >= limit.burst
+        ]:
+            del self._buckets[key]
+
+    def drain(self) -> dict[str, tuple[RateLimit, int]]:
+        """The tokens taken from each bucket since the last drain, 0 for the
+        ones only other workers may have used since."""
+        taken = {}
+        for key, bucket in self._buckets.items():
+            taken[key] = (bucket[0], bucket[3])
+            bucket[3] = 0
+        return taken
+
+    def restore(self, taken: dict[str, tuple[RateLimit, int]]):
+        """Put back what ``drain`` returned, after the settle failed."""
+        for key, (_, count) in taken.items():
+            if key in self._buckets:
+                self._buckets[key][3] += count
+
+    def apply(self, levels: dict[str, float], now: float):
+        """Adopt the shared levels from a settle at ``now``, less what was
+        taken here since, and forget the buckets that have refilled."""
+        for key, level in levels.items():
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[1], bucket[2] = level - bucket[3], now
+        self._prune(now)
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class RateLimiter:
+    def __init__(self):
+        self._store: ShardedBucketStore | None = None
+        self._store_lock = threading.Lock()
+        self._local = LocalBuckets()
+        self._task: asyncio.Task | None = None
+        self.limited: Counter[str] = Counter()
+        self.errors = 0
+
+    def _bucket_store(self, path: str) -> ShardedBucketStore:
+        store = self._store
+        if store is None or store.path != path:
+            with self._store_lock:
+                if self._store is None or self._store.path != path:
+                    if self._store is not None:
+                        self._store.close()
+                    self._store = ShardedBucketStore(path)
+                store = self._store
+        return store
+
+    def _take(self, path: str, keys: list[str], limit: RateLimit) -> float:
+        return self._bucket_store(path).take(keys, limit, time.time())
+
+    def _settle(self, path: str, taken: dict, now: float) -> dict:
+        return self._bucket_store(path).settle(taken, now)
+
+    async def check(
+        self, request: Request, username_of: Callable[[str], str | None]
+    ) -> float:
+        """Charge ``request`` to its buckets. Returns 0 if it may go ahead,
+        otherwise the seconds the client should wait. ``username_of`` maps a
+        bearer token to its user, None if the token is not valid."""
+        settings = get_rate_limit_settings()
+        if not settings.enabled:
+            return 0.0
+        group = route_group(request.method, request.url.path)
+        if group is None:
+            return 0.0
+        limit = settings.limits[group]
+        if limit.per_minute <= 0:
+            return 0.0
+        host = request.client.host if request.client else "unknown"
+        keys = [f"{group}:ip:{host}"]
+        token = _bearer_token(request)
+        username = username_of(token) if token is not None else None
+        if username is not None:
+            keys.append(f"{group}:user:{username}")
+        if group in LOCAL_GROUPS:
+            wait = self._local.take(keys, limit, time.time())
+        else:
+            try:
+                wait = await run_in_threadpool(
+                    self._take, settings.db_path, keys, limit
+                )
+            except sqlite3.Error:
+                # Locked past the busy timeout or broken
+                self.errors += 1
+                if limit.fail_open:
+                    logger.warning("Rate limit store unavailable, letting through")
+                    return 0.0
+                logger.warning("Rate limit store unavailable, refusing %s", group)
+                return BUSY_RETRY_SECONDS
+        if wait:
+            self.limited[group] += 1
+        return wait
+
+    async def sync(self):
+        """Settle the buckets counted in process with the shared store."""
+        taken = self._local.drain()
+        if not taken:
+            return
+        now = time.time()
+        try:
+            levels = await run_in_threadpool(
+                self._settle, get_rate_limit_settings().db_path, taken, now
+            )
+        except sqlite3.Error:
+            self.errors += 1
+            self._local.restore(taken)
+            logger.warning("Rate limit store unavailable, settling later")
+            return
+        self._local.apply(levels, now)
+
+    async def _sync_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Could not settle rate limit buckets")
+
+    async def start(self):
+        """Keep settling the in-process buckets in the background."""
+        settings = get_rate_limit_settings()
+        interval = settings.sync_ms / 1000
+        if not settings.enabled or interval <= 0:
+            return
+        self._task = asyncio.create_task(self._sync_forever(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+            # What this worker took since the last sync still counts
+            await self.sync()
+
+    def clear(self):
+        if self._store is not None:
+            self._store.clear()
+        self._local.clear()
+        self.limited.clear()
+        self.errors = 0
+
+    def stats(self) -> dict:
+        settings = get_rate_limit_settings()
+        return {
+            "enabled": settings.enabled,
+            "store": settings.db_path,
+            "sync_ms": settings.sync_ms,
+            "limits": {
+                group: {
+                    "per_minute": limit.per_minute,
+                    "burst": limit.burst,
+                    "fail_open": limit.fail_open,
+                }
+                for group, limit in settings.limits.items()
+            },
+            "limited": dict(self.limited),
+            "errors": self.errors,
+        }
+
+
+rate_limiter = RateLimiter()
+
+
+def too_many_requests(retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "Too many requests"},
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
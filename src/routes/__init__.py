@@ -6,6 +6,8 @@ from src.routes.brands.views import router as brands_router
 from src.routes.customers.views import router as customers_router
 from src.routes.sales.views import router as sales_router
 from src.routes.auth.views import router as auth_router
+from src.routes.metrics.views import router as metrics_router
+from src.routes.reports.views import router as reports_router
 from src.routes.auth.operations import get_current_user
 
 root_router = APIRouter()
@@ -48,4 +50,16 @@ root_router.include_router(
     tags=["sales"],
     dependencies=crud_dependencies,
 )
+root_router.include_router(
+    reports_router,
+    prefix="/reports",
+    tags=["reports"],
+    dependencies=crud_dependencies,
+)
 root_router.include_router(auth_router, prefix="/auth", tags=["auth"])
+root_router.include_router(
+    metrics_router,
+    prefix="/metrics",
+    tags=["metrics"],
+    dependencies=crud_dependencies,
+)
@@ -1,13 +1,35 @@
+import datetime
+from typing import Optional
+
 from sqlmodel import SQLModel, Field
 
 
 class User(SQLModel, table=True):
     id: int = Field(primary_key=True, index=True)
-    username: str
+    username: str = Field(index=True, unique=True)
     hashed_password: str
     role: str = Field(default="user")
 
 
 class UserLogin(SQLModel):
-    username: str
+    username: str = Field(index=True)
     password: str
+
+
+class RevokedToken(SQLModel, table=True):
+    """A login session whose refresh and access tokens are no longer
+    accepted."""
+
+    __tablename__ = "revoked_token"
+    # Ids only grow, so the revocation list can fetch what it has not seen
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: str = Field(unique=True, max_length=32)
+    # When the session's refresh token expires, the row is useless after it
+    # Naive UTC
+    expires_at: datetime.datetime = Field(index=True)
+
+
+class RefreshRequest(SQLModel):
+    refresh_token: str
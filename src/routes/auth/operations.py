@@ -2,58 +2,106 @@ from src.routes.auth.models import UserLogin, User
 
 import datetime
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
-from src.database import get_session
+from src.database import get_async_session
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 from fastapi import Depends, HTTPException, status
-from src.config import get_secret_key, get_algorithm
+from src.config import get_auth_settings
+from src.routes.auth.passwords import hash_password, verify_password
+from src.routes.auth.revocation import revocation_list
+from src.routes.auth.token_cache import TokenClaims, token_cache
+from src.routes.auth.user_cache import MISSING, username_cache
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
-def create_user(user: UserLogin, session=Depends(get_session)):
-    _hashed_password = pwd_context.hash(user.password)
+def _username_taken() -> HTTPException:
+    return HTTPException(status_code=400, detail="Username already registered")
+
+
+async def create_user(user: UserLogin, session=Depends(get_async_session)):
+    # Only a name known to exist skips the hash; a cached miss may be stale,
+    # the unique index has the final say
+    if username_cache.get(user.username) not in (MISSING, None):
+        raise _username_taken()
+    _hashed_password = await hash_password(user.password)
     db_user = User(username=user.username, hashed_password=_hashed_password)
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        # Taken after all, a cached miss for it is wrong
+        username_cache.evict(user.username)
+        raise _username_taken()
+    # Overwrites a cached miss, the user can log in at once
+    username_cache.put(db_user.username, db_user)
     return "complete"
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, get_secret_key(), algorithms=[get_algorithm()])
-        username: str = payload.get("sub")
-        role: str = payload.get("role")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return username, role
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+def _invalid_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
 
-def get_user_by_username(username: str, session=Depends(get_session)):
-    user = session.exec(select(User).where(User.username == username)).first()
+def _decode_claims(token: str) -> TokenClaims:
+    settings = get_auth_settings()
+    try:
+        payload = jwt.decode(
+            token, settings.secret_key, algorithms=[settings.algorithm]
+        )
+    except JWTError:
+        raise _invalid_token()
+    username: str = payload.get("sub")
+    # A refresh token only buys new access tokens at /auth/refresh
+    if username is None or payload.get("type") == "refresh":
+        raise _invalid_token()
+    claims = TokenClaims(username, payload.get("role"), payload.get("sid"))
+    token_cache.put(token, claims, payload.get("exp"))
+    return claims
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    claims = token_cache.get(token) or _decode_claims(token)
+    if claims.session_id is not None and revocation_list.is_revoked(claims.session_id):
+        raise _invalid_token()
+    return claims.username, claims.role
+
+
+def token_username(token: str) -> str | None:
+    """The user a valid access token was issued to, or None. Shares the
+    verified-token cache with ``get_current_user``."""
+    try:
+        claims = token_cache.get(token) or _decode_claims(token)
+    except HTTPException:
+        return None
+    return claims.username
+
+
+async def get_user_by_username(username: str, session=Depends(get_async_session)):
+    user = username_cache.get(username)
+    if user is not MISSING:
+        return user
+    user = (await session.exec(select(User).where(User.username == username))).first()
+    username_cache.put(username, user)
     return user
 
 
-def authenticate_user(username: str, password: str, session=Depends(get_session)):
-    user = get_user_by_username(username, session)
+async def authenticate_user(
+    username: str, password: str, session=Depends(get_async_session)
+):
+    user = await get_user_by_username(username, session)
     if not user:
         return False
-    if not pwd_context.verify(password, user.hashed_password):
+    # Hand the connection back to the pool while bcrypt runs
+    await session.commit()
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
@@ -67,15 +115,55 @@ def create_access_token(data: dict, expires_delta: datetime.timedelta | None = N
             minutes=15
         )
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, get_secret_key(), algorithm=get_algorithm())
+    settings = get_auth_settings()
+    encoded_jwt = jwt.encode(
+        to_encode, settings.secret_key, algorithm=settings.algorithm
+    )
     return encoded_jwt
 
 
+def create_refresh_token(data: dict) -> str:
+    settings = get_auth_settings()
+    expire = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        days=settings.refresh_token_expire_days
+    )
+    return jwt.encode(
+        {**data, "type": "refresh", "exp": expire},
+        settings.secret_key,
+        algorithm=settings.algorithm,
+    )
+
+
+def decode_refresh_token(token: str) -> dict:
+    """Claims of a valid, unrevoked refresh token, or 401."""
+    settings = get_auth_settings()
+    try:
+        payload = jwt.decode(
+            token, settings.secret_key, algorithms=[settings.algorithm]
+        )
+    except JWTError:
+        raise _invalid_token()
+    if (
+        payload.get("type") != "refresh"
+        or payload.get("sub") is None
+        or payload.get("sid") is None
+        or revocation_list.is_revoked(payload["sid"])
+    ):
+        raise _invalid_token()
+    return payload
+
+
 def verify_token(token: str = Depends(oauth2_scheme)):
+    settings = get_auth_settings()
     try:
-        payload = jwt.decode(token, get_secret_key(), algorithms=[get_algorithm()])
+        payload = jwt.decode(
+            token, settings.secret_key, algorithms=[settings.algorithm]
+        )
         username: str = payload.get("sub")
-        if username is None:
+        session_id = payload.get("sid")
+        if username is None or (
+            session_id is not None and revocation_list.is_revoked(session_id)
+        ):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token",
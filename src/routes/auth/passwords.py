@@ -0,0 +1,113 @@
+"""Password hashing off the event loop and off the shared threadpool.
+
+bcrypt is meant to be slow, so hashes and verifications run in a small
+process pool of ``BCRYPT_WORKERS`` processes instead of the threadpool the
+rest of the app relies on. At most ``BCRYPT_QUEUE_DEPTH`` jobs wait for a
+worker; past that the request fails at once with a 503 rather than queueing
+behind a login burst.
+
+The app starts the pool and spawns its workers at startup, so the first
+logins do not wait for a worker to start, and shuts it down on exit. Code
+running outside the app gets a pool started on first use.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+
+from src.bcrypt_worker import hash_with_rounds, load_backend, verify
+from src.config import get_bcrypt_queue_depth, get_bcrypt_rounds, get_bcrypt_workers
+
+
+class PasswordPool:
+    def __init__(self):
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that runs an event loop and
+                # threads is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=get_bcrypt_workers(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    async def start(self):
+        """Spawn every worker and load bcrypt in it."""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        # Workers are spawned as jobs arrive, one job per worker spawns them all
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, load_backend)
+                for _ in range(get_bcrypt_workers())
+            )
+        )
+
+    async def run(self, function, *args):
+        """Run ``function(*args)`` in a worker, or raise 503 if the pool is
+        busy and its queue full."""
+        limit = get_bcrypt_workers() + get_bcrypt_queue_depth()
+        with self._lock:
+            if self.in_flight >= limit:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many password checks in progress, try again",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), function, *args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - start
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": get_bcrypt_workers(),
+                "queue_depth": get_bcrypt_queue_depth(),
+                "rounds": get_bcrypt_rounds(),
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                # Queueing included, this is what a login waits for
+                "avg_seconds": round(self.total_seconds / self.completed, 6)
+                if self.completed
+                else 0.0,
+            }
+
+
+password_pool = PasswordPool()
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(hash_with_rounds, password, get_bcrypt_rounds())
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    # The cost is read from the hash, so changing BCRYPT_ROUNDS only
+    # affects passwords hashed afterwards
+    return await password_pool.run(verify, password, hashed_password)
@@ -0,0 +1,166 @@
+"""Revoked login sessions, checked on every authenticated request without a
+database query.
+
+Each login gets a session id that its access and refresh tokens carry as
+``sid``. Revoking the session adds a ``revoked_token`` row; every worker
+keeps the revoked ids in memory, behind a Bloom filter that answers the
+common case (the session is not revoked) from a few bit tests. The set
+settles the filter's false positives.
+
+The worker that revokes a session sees it at once. The others pick it up
+from a background task that reads the new rows every
+``REVOCATION_SYNC_MS`` through the read engine, so the poll never waits on
+or holds up the SQLite writer, and reload the whole table every
+``FULL_SYNC_EVERY`` syncs, which also forgets expired sessions and catches
+rows committed out of id order.
+"""
+
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import logging
+import math
+
+from sqlalchemy import delete
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import get_revocation_sync_ms
+from src.database import AsyncSessionLocal, get_async_read_engine
+from src.routes.auth.models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+FULL_SYNC_EVERY = 60
+MIN_CAPACITY = 1024
+FALSE_POSITIVE_RATE = 0.01
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.capacity = capacity
+        self.size = math.ceil(
+            -capacity * math.log(false_positive_rate) / math.log(2) ** 2
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RevocationList:
+    def __init__(self):
+        self._revoked: set[str] = set()
+        self._filter = BloomFilter(MIN_CAPACITY, FALSE_POSITIVE_RATE)
+        self._last_id = 0
+        self._syncs = 0
+        self._task: asyncio.Task | None = None
+
+    def is_revoked(self, session_id: str) -> bool:
+        return session_id in self._filter and session_id in self._revoked
+
+    def add(self, session_id: str):
+        self._revoked.add(session_id)
+        if len(self._revoked) > self._filter.capacity:
+            self._rebuild()
+        else:
+            self._filter.add(session_id)
+
+    def _rebuild(self):
+        bloom = BloomFilter(
+            max(MIN_CAPACITY, 2 * len(self._revoked)), FALSE_POSITIVE_RATE
+        )
+        for session_id in self._revoked:
+            bloom.add(session_id)
+        self._filter = bloom
+
+    async def sync(self, session: AsyncSession, full: bool = False):
+        """Read the revocations committed since the last sync, or all of
+        the unexpired ones."""
+        statement = select(RevokedToken.id, RevokedToken.session_id)
+        if full:
+            statement = statement.where(RevokedToken.expires_at > _utcnow())
+        else:
+            statement = statement.where(RevokedToken.id > self._last_id)
+        rows = (await session.exec(statement)).all()
+        if full:
+            self._revoked = {session_id for _, session_id in rows}
+            self._rebuild()
+        else:
+            for _, session_id in rows:
+                self.add(session_id)
+        self._last_id = max([self._last_id, *(row_id for row_id, _ in rows)])
+
+    async def _sync_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self._syncs += 1
+            try:
+                async with AsyncSessionLocal(bind=get_async_read_engine()) as session:
+                    await self.sync(session, full=self._syncs % FULL_SYNC_EVERY == 0)
+            except Exception:
+                logger.exception("Could not sync revoked sessions")
+
+    async def start(self):
+        """Load the revoked sessions and keep syncing them in the background."""
+        interval = get_revocation_sync_ms() / 1000
+        if interval <= 0:
+            return
+        async with AsyncSessionLocal(bind=get_async_read_engine()) as session:
+            await self.sync(session, full=True)
+        self._task = asyncio.create_task(self._sync_forever(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def clear(self):
+        self._revoked = set()
+        self._filter = BloomFilter(MIN_CAPACITY, FALSE_POSITIVE_RATE)
+        self._last_id = 0
+
+
+revocation_list = RevocationList()
+
+
+async def revoke_session(
+    session: AsyncSession, session_id: str, expires_at: datetime.datetime
+):
+    """Revoke ``session_id`` until ``expires_at`` (naive UTC)."""
+    if revocation_list.is_revoked(session_id):
+        return
+    # Revocations are rare, clearing out the expired ones here keeps the
+    # table at the size of the live sessions
+    await session.exec(delete(RevokedToken).where(RevokedToken.expires_at <= _utcnow()))
+    existing = (
+        await session.exec(
+            select(RevokedToken.id).where(RevokedToken.session_id == session_id)
+        )
+    ).first()
+    if existing is None:
+        session.add(RevokedToken(session_id=session_id, expires_at=expires_at))
+    await session.commit()
+    revocation_list.add(session_id)
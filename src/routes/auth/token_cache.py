@@ -0,0 +1,77 @@
+"""Access tokens that already passed signature verification.
+
+``get_current_user`` runs on every CRUD request, and most of them carry a
+token it has verified before. Entries are keyed by the SHA-256 digest of the
+token, so the cache never holds a usable credential, and expire with the
+token's own ``exp``: a token is never accepted from here after it would have
+been refused by ``jwt.decode``. Revocation is checked by the caller on every
+hit.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from src.config import get_auth_token_cache_size
+
+
+class TokenClaims(NamedTuple):
+    username: str
+    role: str | None
+    # The login session, None for tokens issued before sessions existed
+    session_id: str | None
+
+
+class VerifiedTokenCache:
+    def __init__(self):
+        # digest -> (claims, exp)
+        self._entries: OrderedDict[bytes, tuple[TokenClaims, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> TokenClaims | None:
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[digest]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, claims: TokenClaims, exp: float | None):
+        maxsize = get_auth_token_cache_size()
+        # A token without exp never expires, it is not worth pinning
+        if maxsize <= 0 or exp is None:
+            return
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (claims, float(exp))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": get_auth_token_cache_size(),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_cache = VerifiedTokenCache()
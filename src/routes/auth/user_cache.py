@@ -0,0 +1,85 @@
+"""Short-lived cache of username lookups, found or not.
+
+A credential-stuffing burst tries the same usernames over and over, most of
+them unknown. Both outcomes are kept for ``USERNAME_CACHE_TTL_SECONDS`` so a
+repeat costs no query.
+
+Entries are per worker. A user registered on another worker can be reported
+missing here until the TTL runs out, which is why registration relies on
+the unique index and only uses positive entries to fail early. On this
+worker, a registration that creates the user overwrites the entry for its
+name with the new user, and one that finds the name taken evicts the entry,
+so a cached miss never outlives either.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from src.config import get_username_cache_size, get_username_cache_ttl_seconds
+from src.routes.auth.models import User
+
+MISSING = object()
+
+
+class UsernameCache:
+    def __init__(self):
+        # username -> (detached User or None, expires_at)
+        self._entries: OrderedDict[str, tuple[User | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str):
+        """The cached ``User``, ``None`` if the name is known not to exist,
+        or ``MISSING``."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[username]
+            self.misses += 1
+            return MISSING
+
+    def put(self, username: str, user: User | None):
+        maxsize = get_username_cache_size()
+        if maxsize <= 0:
+            return
+        # A copy outside any session, callers of get() must not share rows
+        # with the session that loaded them
+        if user is not None:
+            user = User(
+                id=user.id,
+                username=user.username,
+                hashed_password=user.hashed_password,
+                role=user.role,
+            )
+        expires_at = time.monotonic() + get_username_cache_ttl_seconds()
+        with self._lock:
+            self._entries[username] = (user, expires_at)
+            self._entries.move_to_end(username)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def evict(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": get_username_cache_size(),
+            "ttl_seconds": get_username_cache_ttl_seconds(),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+username_cache = UsernameCache()
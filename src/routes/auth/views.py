@@ -1,58 +1,91 @@
-from src.routes.auth.models import UserLogin, User
+from src.routes.auth.models import RefreshRequest, UserLogin, User
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
-from src.database import get_session
-from sqlmodel import Session
-from datetime import timedelta
+from src.database import get_async_session, UnitOfWorkRoute
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 
 from src.routes.auth.operations import (
-    get_user_by_username,
     create_user,
     authenticate_user,
     create_access_token,
+    create_refresh_token,
+    decode_refresh_token,
     verify_token,
     get_current_user,
 )
-from src.config import get_access_token_expire_minutes
+from src.config import get_auth_settings
+from src.routes.auth.revocation import revoke_session
 from fastapi.security import OAuth2PasswordRequestForm
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.post("/register")
-def register_user(user: UserLogin, session: Session = Depends(get_session)):
-    db_user = get_user_by_username(user.username, session)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    return create_user(user, session)
+async def register_user(
+    user: UserLogin, session: AsyncSession = Depends(get_async_session)
+):
+    return await create_user(user, session)
 
 
 @router.post("/token")
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    db_user = authenticate_user(form_data.username, form_data.password, session)
+    db_user = await authenticate_user(form_data.username, form_data.password, session)
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=get_access_token_expire_minutes())
+    # One id per login, shared by its access and refresh tokens so
+    # revoking it ends the whole session
+    claims = {"sub": db_user.username, "role": db_user.role, "sid": uuid4().hex}
+    access_token_expires = timedelta(
+        minutes=get_auth_settings().access_token_expire_minutes
+    )
     access_token = create_access_token(
-        data={"sub": db_user.username, "role": db_user.role},
+        data=claims,
         expires_delta=access_token_expires,
     )
+    return {
+        "access_token": access_token,
+        "refresh_token": create_refresh_token(claims),
+        "token_type": "bearer",
+    }
+
+
+@router.post("/refresh")
+async def refresh_access_token(body: RefreshRequest):
+    payload = decode_refresh_token(body.refresh_token)
+    access_token = create_access_token(
+        data={key: payload.get(key) for key in ("sub", "role", "sid")},
+        expires_delta=timedelta(
+            minutes=get_auth_settings().access_token_expire_minutes
+        ),
+    )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post("/revoke")
+async def revoke_refresh_token(
+    body: RefreshRequest, session: AsyncSession = Depends(get_async_session)
+):
+    payload = decode_refresh_token(body.refresh_token)
+    expires_at = datetime.fromtimestamp(payload["exp"], timezone.utc)
+    await revoke_session(session, payload["sid"], expires_at.replace(tzinfo=None))
+    return {"message": "Session revoked"}
+
+
 @router.get("/verify_token/{token}")
-def verify_token_route(token: str):
+async def verify_token_route(token: str):
     verify_token(token)
     return {"message": "Token is valid"}
 
 
 @router.get("/test")
-def test(current_user: Annotated[User, Depends(get_current_user)]):
+async def test(current_user: Annotated[User, Depends(get_current_user)]):
     return current_user
@@ -1,17 +1,22 @@
-from src.routes.brands.models import Brand, BrandCreate, BrandUpdate
+from src.routes.brands.models import BrandRead, Brand, BrandCreate, BrandUpdate
 from fastapi import Depends, HTTPException, status
-from src.database import get_session
-from sqlmodel import Session, select
+from src.database import get_async_session
+from src.versions import bump_version, cached
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
-def create_brand(new_brand: BrandCreate, session: Session = Depends(get_session)):
+async def create_brand(
+    new_brand: BrandCreate, session: AsyncSession = Depends(get_async_session)
+):
     if new_brand.name is None or new_brand.name.strip() == "":
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Brand name cannot be empty",
         )
-    existing_brand = session.exec(
-        select(Brand).where(Brand.name == new_brand.name)
+    existing_brand = (
+        await session.exec(select(Brand).where(Brand.name == new_brand.name))
     ).first()
     if existing_brand:
         raise HTTPException(
@@ -19,77 +24,117 @@ def create_brand(new_brand: BrandCreate, session: Session = Depends(get_session)
         )
     brand = Brand.model_validate(new_brand)
     session.add(brand)
-    session.commit()
-    session.refresh(brand)
+    await bump_version(session, "brand")
+    await session.commit()
+    await session.refresh(brand)
     return brand
 
 
-def get_brands(session: Session = Depends(get_session)):
-    brands = session.exec(select(Brand)).all()
-    return brands
+async def _load_brands(session: AsyncSession) -> list[BrandRead]:
+    brands = (
+        await session.exec(select(Brand).options(selectinload(Brand.products)))
+    ).all()
+    # The result is cached and shared between requests, keep read models
+    # instead of instances tied to this session
+    return [BrandRead.model_validate(brand, from_attributes=True) for brand in brands]
+
+
+async def get_brands(session: AsyncSession = Depends(get_async_session)):
+    return await cached(
+        session, ("brands",), ("brand", "product"), lambda: _load_brands(session)
+    )
 
 
-def get_brand_by_id(brand_id: int, session: Session = Depends(get_session)):
-    brand = session.get(Brand, brand_id)
+async def get_brand_by_id(
+    brand_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    brand = await session.get(Brand, brand_id, options=[selectinload(Brand.products)])
     return brand
 
 
-def get_brand_by_name(brand_name: str, session: Session = Depends(get_session)):
-    brand = session.exec(select(Brand).where(Brand.name == brand_name)).first()
-    if brand is None:
+async def _load_brand_by_name(brand_name: str, session: AsyncSession) -> dict | None:
+    brand = (await session.exec(select(Brand).where(Brand.name == brand_name))).first()
+    return None if brand is None else brand.model_dump()
+
+
+async def get_brand_by_name(
+    brand_name: str, session: AsyncSession = Depends(get_async_session)
+):
+    data = await cached(
+        session,
+        ("brand", brand_name),
+        ("brand",),
+        lambda: _load_brand_by_name(brand_name, session),
+    )
+    if data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Brand not found"
         )
-    return brand
+    # A fresh instance per call, the cached row is never handed out
+    return Brand.model_validate(data)
 
 
-def update_brand(
-    brand_id: int, brand: BrandUpdate, session: Session = Depends(get_session)
+async def update_brand(
+    brand_id: int,
+    brand: BrandUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    db_brand = session.get(Brand, brand_id)
+    db_brand = await session.get(Brand, brand_id)
     if db_brand is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Brand not found"
         )
     db_brand.name = brand.name
     session.add(db_brand)
-    session.commit()
-    session.refresh(db_brand)
+    await bump_version(session, "brand")
+    await session.commit()
+    await session.refresh(db_brand)
     return db_brand
 
 
-def update_brand_by_name(
-    brand_name: str, brand: BrandUpdate, session: Session = Depends(get_session)
+async def update_brand_by_name(
+    brand_name: str,
+    brand: BrandUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    db_brand = session.exec(select(Brand).where(Brand.name == brand_name)).first()
+    db_brand = (
+        await session.exec(select(Brand).where(Brand.name == brand_name))
+    ).first()
     if db_brand is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Brand not found"
         )
     db_brand.name = brand.name
     session.add(db_brand)
-    session.commit()
-    session.refresh(db_brand)
+    await bump_version(session, "brand")
+    await session.commit()
+    await session.refresh(db_brand)
     return db_brand
 
 
-def delete_brand_by_name(brand_name: str, session: Session = Depends(get_session)):
-    brand = session.exec(select(Brand).where(Brand.name == brand_name)).first()
+async def delete_brand_by_name(
+    brand_name: str, session: AsyncSession = Depends(get_async_session)
+):
+    brand = (await session.exec(select(Brand).where(Brand.name == brand_name))).first()
     if brand is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Brand not found"
         )
-    session.delete(brand)
-    session.commit()
+    await session.delete(brand)
+    await bump_version(session, "brand")
+    await session.commit()
     return brand
 
 
-def delete_brand(brand_id: int, session: Session = Depends(get_session)):
-    brand = session.get(Brand, brand_id)
+async def delete_brand(
+    brand_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    brand = await session.get(Brand, brand_id)
     if brand is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Brand not found"
         )
-    session.delete(brand)
-    session.commit()
+    await session.delete(brand)
+    await bump_version(session, "brand")
+    await session.commit()
     return brand
@@ -7,20 +7,25 @@ from src.routes.brands.operations import (
     update_brand,
     delete_brand,
 )
-from src.database import get_session
-from sqlmodel import Session
+from src.database import get_async_session, UnitOfWorkRoute
+from src.versions import conditional_get
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
+# Brands are returned with their products, so the ETag follows both tables
+brand_etag = Depends(conditional_get("brand", "product"))
+brand_detail_etag = Depends(conditional_get("brand", "product", resource=Brand))
 
-@router.get("", response_model=list[BrandRead])
-def read_brands(session: Session = Depends(get_session)):
-    return get_brands(session)
 
+@router.get("", response_model=list[BrandRead], dependencies=[brand_etag])
+async def read_brands(session: AsyncSession = Depends(get_async_session)):
+    return await get_brands(session)
 
-@router.get("/{brand_id}", response_model=BrandRead)
-def read_brand(brand_id: int, session: Session = Depends(get_session)):
-    brand = get_brand_by_id(brand_id, session)
+
+@router.get("/{brand_id}", response_model=BrandRead, dependencies=[brand_detail_etag])
+async def read_brand(brand_id: int, session: AsyncSession = Depends(get_async_session)):
+    brand = await get_brand_by_id(brand_id, session)
     if not brand:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Brand not found"
@@ -29,17 +34,23 @@ def read_brand(brand_id: int, session: Session = Depends(get_session)):
 
 
 @router.post("", response_model=Brand)
-def add_brand(brand: BrandCreate, session: Session = Depends(get_session)):
-    return create_brand(brand, session)
+async def add_brand(
+    brand: BrandCreate, session: AsyncSession = Depends(get_async_session)
+):
+    return await create_brand(brand, session)
 
 
 @router.patch("/{brand_id}", response_model=Brand)
-def update_brand_by_id(
-    brand_id: int, brand: BrandUpdate, session: Session = Depends(get_session)
+async def update_brand_by_id(
+    brand_id: int,
+    brand: BrandUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    return update_brand(brand_id, brand, session)
+    return await update_brand(brand_id, brand, session)
 
 
 @router.delete("/{brand_id}")
-def remove_brand(brand_id: int, session: Session = Depends(get_session)):
-    return delete_brand(brand_id, session)
+async def remove_brand(
+    brand_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await delete_brand(brand_id, session)
@@ -1,16 +1,41 @@
-from src.routes.categories.models import CategoryCreate, Category
+from src.routes.categories.models import CategoryRead, CategoryCreate, Category
 from fastapi import Depends, HTTPException, status
-from src.database import get_session
+from src.database import get_async_session
+from src.versions import bump_version, cached
+from sqlalchemy.orm import selectinload
 from sqlmodel import select
-
-
-def get_categories(session=Depends(get_session)):
-    categories = session.exec(select(Category)).all()
-    return categories
-
-
-def get_category(category_id: int, session=Depends(get_session)):
-    category = session.exec(select(Category).where(Category.id == category_id)).first()
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+async def _load_categories(session: AsyncSession) -> list[CategoryRead]:
+    categories = (
+        await session.exec(select(Category).options(selectinload(Category.products)))
+    ).all()
+    # The result is cached and shared between requests, keep read models
+    # instead of instances tied to this session
+    return [
+        CategoryRead.model_validate(category, from_attributes=True)
+        for category in categories
+    ]
+
+
+async def get_categories(session=Depends(get_async_session)):
+    return await cached(
+        session,
+        ("categories",),
+        ("category", "product"),
+        lambda: _load_categories(session),
+    )
+
+
+async def get_category(category_id: int, session=Depends(get_async_session)):
+    category = (
+        await session.exec(
+            select(Category)
+            .where(Category.id == category_id)
+            .options(selectinload(Category.products))
+        )
+    ).first()
     if category is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Category not found"
@@ -18,25 +43,38 @@ def get_category(category_id: int, session=Depends(get_session)):
     return category
 
 
-def get_category_by_name(category_name: str, session=Depends(get_session)):
-    category = session.exec(
-        select(Category).where(Category.name == category_name)
+async def _load_category_by_name(
+    category_name: str, session: AsyncSession
+) -> dict | None:
+    category = (
+        await session.exec(select(Category).where(Category.name == category_name))
     ).first()
-    if category is None:
+    return None if category is None else category.model_dump()
+
+
+async def get_category_by_name(category_name: str, session=Depends(get_async_session)):
+    data = await cached(
+        session,
+        ("category", category_name),
+        ("category",),
+        lambda: _load_category_by_name(category_name, session),
+    )
+    if data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Category not found"
         )
-    return category
+    # A fresh instance per call, the cached row is never handed out
+    return Category.model_validate(data)
 
 
-def create_category(category: CategoryCreate, session=Depends(get_session)):
+async def create_category(category: CategoryCreate, session=Depends(get_async_session)):
     if category.name is None or category.name.strip() == "":
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Category name cannot be empty",
         )
-    existing_category = session.exec(
-        select(Category).where(Category.name == category.name)
+    existing_category = (
+        await session.exec(select(Category).where(Category.name == category.name))
     ).first()
     if existing_category:
         raise HTTPException(
@@ -44,16 +82,17 @@ def create_category(category: CategoryCreate, session=Depends(get_session)):
         )
     _category = Category.model_validate(category)
     session.add(_category)
-    session.commit()
-    session.refresh(_category)
+    await bump_version(session, "category")
+    await session.commit()
+    await session.refresh(_category)
     return _category
 
 
-def update_category_by_name(
-    category_name: str, category: CategoryCreate, session=Depends(get_session)
+async def update_category_by_name(
+    category_name: str, category: CategoryCreate, session=Depends(get_async_session)
 ):
-    _category = session.exec(
-        select(Category).where(Category.name == category_name)
+    _category = (
+        await session.exec(select(Category).where(Category.name == category_name))
     ).first()
     if _category is None:
         raise HTTPException(
@@ -61,46 +100,54 @@ def update_category_by_name(
         )
     _category.name = category.name
     session.add(_category)
-    session.commit()
-    session.refresh(_category)
+    await bump_version(session, "category")
+    await session.commit()
+    await session.refresh(_category)
     return _category
 
 
-def update_category(
-    category_id: int, category: CategoryCreate, session=Depends(get_session)
+async def update_category(
+    category_id: int, category: CategoryCreate, session=Depends(get_async_session)
 ):
-    _category = session.exec(select(Category).where(Category.id == category_id)).first()
+    _category = (
+        await session.exec(select(Category).where(Category.id == category_id))
+    ).first()
     if _category is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Category not found"
         )
     _category.name = category.name
     session.add(_category)
-    session.commit()
-    session.refresh(_category)
+    await bump_version(session, "category")
+    await session.commit()
+    await session.refresh(_category)
     return _category
 
 
-def delete_category_by_name(category_name: str, session=Depends(get_session)):
-    category = session.exec(
-        select(Category).where(Category.name == category_name)
+async def delete_category_by_name(
+    category_name: str, session=Depends(get_async_session)
+):
+    category = (
+        await session.exec(select(Category).where(Category.name == category_name))
     ).first()
     if category is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Category not found"
         )
     else:
-        session.delete(category)
-        session.commit()
+        await session.delete(category)
+        await bump_version(session, "category")
+        await session.commit()
         return category
 
 
-def delete_category(category_id: int, session=Depends(get_session)):
-    category = session.get(Category, category_id)
+async def delete_category(category_id: int, session=Depends(get_async_session)):
+    category = await session.get(Category, category_id)
     if category is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Category not found"
         )
-    session.delete(category)
-    session.commit()
+    await session.delete(category)
+    await bump_version(session, "category")
+    await session.commit()
     return category
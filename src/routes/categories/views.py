@@ -1,4 +1,5 @@
 from src.routes.categories.models import (
+    Category,
     CategoryRead,
     CategoryUpdate,
     SimpleCategoryRead,
@@ -11,34 +12,51 @@ from src.routes.categories.operations import (
     delete_category,
 )
 from fastapi import APIRouter, Depends
-from src.database import get_session
-from sqlmodel import Session
+from src.database import get_async_session, UnitOfWorkRoute
+from src.versions import conditional_get
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+# Categories are returned with their products, so the ETag follows both tables
+category_etag = Depends(conditional_get("category", "product"))
+category_detail_etag = Depends(
+    conditional_get("category", "product", resource=Category)
+)
 
 
-@router.get("", response_model=list[CategoryRead])
-def read_categories(session: Session = Depends(get_session)):
-    return get_categories(session)
+@router.get("", response_model=list[CategoryRead], dependencies=[category_etag])
+async def read_categories(session: AsyncSession = Depends(get_async_session)):
+    return await get_categories(session)
 
 
-@router.get("/{category_id}", response_model=CategoryRead)
-def read_category(category_id: int, session: Session = Depends(get_session)):
-    return get_category(category_id, session)
+@router.get(
+    "/{category_id}", response_model=CategoryRead, dependencies=[category_detail_etag]
+)
+async def read_category(
+    category_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await get_category(category_id, session)
 
 
 @router.post("", response_model=SimpleCategoryRead)
-def add_category(category: CategoryUpdate, session: Session = Depends(get_session)):
-    return create_category(category, session)
+async def add_category(
+    category: CategoryUpdate, session: AsyncSession = Depends(get_async_session)
+):
+    return await create_category(category, session)
 
 
 @router.patch("/{category_id}", response_model=CategoryUpdate)
-def update_category_by_id(
-    category_id: int, category: CategoryUpdate, session: Session = Depends(get_session)
+async def update_category_by_id(
+    category_id: int,
+    category: CategoryUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    return update_category(category_id, category, session)
+    return await update_category(category_id, category, session)
 
 
 @router.delete("/{category_id}")
-def remove_category(category_id: int, session: Session = Depends(get_session)):
-    return delete_category(category_id, session)
+async def remove_category(
+    category_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await delete_category(category_id, session)
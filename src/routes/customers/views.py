@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends
-from src.database import get_session
-from sqlmodel import Session
+from fastapi import APIRouter, Depends, Request
+from src.database import get_async_session, UnitOfWorkRoute
+from src.exports import ExportFormat, export_response
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.routes.customers.models import (
     Customer,
@@ -10,37 +11,49 @@ from src.routes.customers.models import (
 )
 from src.routes.customers.operations import (
     get_customers,
+    export_customers_statement,
     create_customer,
     get_customer_by_dni,
     update_customer,
     delete_customer,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("", response_model=list[CustomerRead])
-def read_customers(session: Session = Depends(get_session)):
-    return get_customers(session)
+async def read_customers(session: AsyncSession = Depends(get_async_session)):
+    return await get_customers(session)
+
+
+@router.get("/export")
+async def export_customers(request: Request, format: ExportFormat = "ndjson"):
+    return export_response(request, export_customers_statement(), format, "customers")
 
 
 @router.get("/{dni}", response_model=CustomerRead)
-def read_customer(dni: int, session: Session = Depends(get_session)):
-    return get_customer_by_dni(dni, session)
+async def read_customer(dni: int, session: AsyncSession = Depends(get_async_session)):
+    return await get_customer_by_dni(dni, session)
 
 
 @router.post("", response_model=Customer)
-def add_customer(customer: CustomerCreate, session: Session = Depends(get_session)):
-    return create_customer(customer, session)
+async def add_customer(
+    customer: CustomerCreate, session: AsyncSession = Depends(get_async_session)
+):
+    return await create_customer(customer, session)
 
 
 @router.patch("/{customer_id}", response_model=Customer)
-def update_customer_by_id(
-    customer_id: int, customer: CustomerUpdate, session: Session = Depends(get_session)
+async def update_customer_by_id(
+    customer_id: int,
+    customer: CustomerUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    return update_customer(customer_id, customer, session)
+    return await update_customer(customer_id, customer, session)
 
 
 @router.delete("/{customer_id}")
-def remove_customer(customer_id: int, session: Session = Depends(get_session)):
-    return delete_customer(customer_id, session)
+async def remove_customer(
+    customer_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await delete_customer(customer_id, session)
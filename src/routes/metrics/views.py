@@ -0,0 +1,60 @@
+from fastapi import APIRouter
+from src.database import (
+    get_pool_status,
+    get_async_engine,
+    get_async_read_engine,
+    get_replica_engines,
+)
+from src.cache import catalog_cache
+from src.config import get_slow_query_threshold_ms
+from src.rate_limit import rate_limiter
+from src.routes.auth.passwords import password_pool
+from src.routes.auth.token_cache import token_cache
+from src.routes.auth.user_cache import username_cache
+from src.slow_queries import slow_query_log
+
+router = APIRouter()
+
+
+@router.get("/db-pool")
+async def read_db_pool():
+    status = get_pool_status()
+    if get_async_read_engine() is not get_async_engine():
+        status["reader"] = get_pool_status(get_async_read_engine())
+    status["replicas"] = [get_pool_status(engine) for engine in get_replica_engines()]
+    return status
+
+
+@router.get("/slow-queries")
+async def read_slow_queries():
+    return {
+        "threshold_ms": get_slow_query_threshold_ms(),
+        "queued": slow_query_log.queue.qsize(),
+        "dropped": slow_query_log.dropped,
+        "recent": list(reversed(slow_query_log.recent)),
+    }
+
+
+@router.get("/cache")
+async def read_cache():
+    return catalog_cache.stats()
+
+
+@router.get("/passwords")
+async def read_password_pool():
+    return password_pool.stats()
+
+
+@router.get("/auth-tokens")
+async def read_token_cache():
+    return token_cache.stats()
+
+
+@router.get("/usernames")
+async def read_username_cache():
+    return username_cache.stats()
+
+
+@router.get("/rate-limits")
+async def read_rate_limits():
+    return rate_limiter.stats()
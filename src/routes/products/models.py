@@ -1,6 +1,7 @@
 from sqlmodel import SQLModel, Field, Relationship
-from pydantic import BaseModel
-from typing import TYPE_CHECKING, Optional, List
+from pydantic import BaseModel, Field as PydanticField, model_validator
+from sqlalchemy import Index
+from typing import TYPE_CHECKING, Literal, Optional, List
 
 import datetime
 
@@ -14,16 +15,26 @@ if TYPE_CHECKING:
 
 
 class Product(SQLModel, table=True):
+    # Keyset pagination walks these for the price and created_at sorts
+    __table_args__ = (
+        Index("ix_product_price_id", "price", "id"),
+        Index("ix_product_created_at_id", "created_at", "id"),
+    )
+
     id: int = Field(default=None, primary_key=True)
     name: str
     description: str
     stock: int = Field(default=0, ge=0)
     price: float = Field(default=0)
-    provider_name: str | None = Field(default=None, foreign_key="provider.name")
+    provider_name: str | None = Field(
+        default=None, foreign_key="provider.name", index=True
+    )
     provider: Optional["Provider"] = Relationship(back_populates="products")
-    category_name: str | None = Field(default=None, foreign_key="category.name")
+    category_name: str | None = Field(
+        default=None, foreign_key="category.name", index=True
+    )
     category: Optional["Category"] = Relationship(back_populates="products")
-    brand_name: str | None = Field(default=None, foreign_key="brand.name")
+    brand_name: str | None = Field(default=None, foreign_key="brand.name", index=True)
     brand: Optional["Brand"] = Relationship(back_populates="products")
     created_at: datetime.datetime = Field(
         default_factory=lambda: datetime.datetime.now(datetime.timezone.utc)
@@ -81,3 +92,41 @@ class ProductRead(BaseModel):
     category: Optional["SimpleCategoryRead"] = None
     brand: Optional["SimpleBrandRead"] = None
     provider: Optional["SimpleProviderRead"] = None
+
+
+ProductSort = Literal["id", "-id", "price", "-price", "created_at", "-created_at"]
+
+
+class ProductQuery(BaseModel):
+    limit: int = PydanticField(default=50, ge=1, le=200)
+    cursor: Optional[str] = None
+    sort: ProductSort = "id"
+    category_name: Optional[str] = None
+    brand_name: Optional[str] = None
+    provider_name: Optional[str] = None
+    min_price: Optional[float] = PydanticField(default=None, ge=0)
+    max_price: Optional[float] = PydanticField(default=None, ge=0)
+    in_stock: bool = False
+
+    @model_validator(mode="after")
+    def check_price_range(self):
+        if (
+            self.min_price is not None
+            and self.max_price is not None
+            and self.min_price > self.max_price
+        ):
+            raise ValueError("min_price must not be greater than max_price")
+        return self
+
+
+class BulkRowError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class BulkImportReport(BaseModel):
+    inserted: int = 0
+    failed: int = 0
+    errors: List[BulkRowError] = []
+    # Only the first BULK_IMPORT_MAX_ERRORS rows are listed, failed counts all
+    errors_truncated: bool = False
@@ -1,16 +1,149 @@
-from src.database import get_session
-from src.routes.products.models import Product, ProductCreate, ProductUpdate
+from src.database import get_async_session
+from src.versions import bump_version
+from src.pagination import decode_cursor, paginate, split_page
+from src.routes.brands.models import Brand
+from src.routes.categories.models import Category
+from src.routes.providers.models import Provider
+from src.routes.products.models import (
+    BulkImportReport,
+    BulkRowError,
+    Product,
+    ProductCreate,
+    ProductQuery,
+    ProductUpdate,
+)
+import codecs
+import csv
+import datetime
+import json
+import re
+from typing import AsyncIterator
 from fastapi import Depends, HTTPException, status
-from sqlmodel import select, Session
+from pydantic import ValidationError
+from sqlalchemy import column, func, insert, literal_column, table, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
-def get_products(session: Session = Depends(get_session)):
-    products = session.exec(select(Product)).all()
-    return products
+def _with_relations(statement, loader=selectinload):
+    return statement.options(
+        loader(Product.category),
+        loader(Product.brand),
+        loader(Product.provider),
+    )
 
 
-def get_product(product_id: int, session: Session = Depends(get_session)):
-    product = session.exec(select(Product).where(Product.id == product_id)).first()
+def _filter_products(statement, query: ProductQuery):
+    if query.category_name is not None:
+        statement = statement.where(Product.category_name == query.category_name)
+    if query.brand_name is not None:
+        statement = statement.where(Product.brand_name == query.brand_name)
+    if query.provider_name is not None:
+        statement = statement.where(Product.provider_name == query.provider_name)
+    if query.min_price is not None:
+        statement = statement.where(Product.price >= query.min_price)
+    if query.max_price is not None:
+        statement = statement.where(Product.price <= query.max_price)
+    if query.in_stock:
+        statement = statement.where(Product.stock > 0)
+    return statement
+
+
+def _sort_columns(sort: str) -> tuple:
+    field = sort.lstrip("-")
+    if field == "id":
+        return (Product.id,)
+    # id breaks ties so the key is unique
+    return (getattr(Product, field), Product.id)
+
+
+async def get_products(
+    session: AsyncSession = Depends(get_async_session),
+    query: ProductQuery = ProductQuery(),
+) -> tuple[list[Product], str | None]:
+    """Return one page of products and the cursor for the next one."""
+    columns = _sort_columns(query.sort)
+    cursor_values = None
+    if query.cursor is not None:
+        cursor_values = decode_cursor(query.cursor, query.sort, len(columns))
+    statement = paginate(
+        _filter_products(select(Product), query),
+        columns,
+        descending=query.sort.startswith("-"),
+        cursor_values=cursor_values,
+        limit=query.limit,
+    )
+    # selectin: one IN query per relationship, each brand/category/provider
+    # row is sent once however many products share it
+    products = (await session.exec(_with_relations(statement))).all()
+    return split_page(
+        list(products),
+        query.limit,
+        query.sort,
+        key=lambda product: tuple(getattr(product, c.key) for c in columns),
+    )
+
+
+_SEARCH_TOKEN = re.compile(r"\w+")
+
+# product_fts is created by migration 4, it is not a model
+_product_fts = table("product_fts", column("rowid"))
+
+
+def _search_tokens(q: str) -> list[str]:
+    # Only word characters reach the query syntax, so user input cannot
+    # inject FTS5 or tsquery operators
+    return _SEARCH_TOKEN.findall(q.lower())
+
+
+def _search_statement(dialect: str, tokens: list[str]):
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(
+            "simple", " & ".join(f"{token}:*" for token in tokens)
+        )
+        vector = literal_column("product.search_vector")
+        return (
+            select(Product)
+            .where(vector.op("@@")(tsquery))
+            .order_by(func.ts_rank_cd(vector, tsquery).desc(), Product.id)
+        )
+    match = " ".join(f'"{token}"*' for token in tokens)
+    return (
+        select(Product)
+        .join(_product_fts, _product_fts.c.rowid == Product.id)
+        .where(text("product_fts MATCH :match").bindparams(match=match))
+        # Name matches weigh ten times more than description matches
+        .order_by(text("bm25(product_fts, 10.0, 1.0)"), Product.id)
+    )
+
+
+async def search_products(
+    q: str, limit: int = 20, session: AsyncSession = Depends(get_async_session)
+) -> list[Product]:
+    """Products matching every word of ``q`` as a prefix, best match first."""
+    tokens = _search_tokens(q)
+    if not tokens:
+        return []
+    statement = _search_statement(session.bind.dialect.name, tokens).limit(limit)
+    return list((await session.exec(_with_relations(statement))).all())
+
+
+def export_products_statement():
+    # Plain rows in id order, no ORM objects or relationships to load
+    return select(Product.__table__).order_by(Product.id)
+
+
+async def get_product(
+    product_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    # joined: a single row, so the three many-to-one joins cost nothing extra
+    product = (
+        await session.exec(
+            _with_relations(select(Product).where(Product.id == product_id), joinedload)
+        )
+    ).first()
     if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
@@ -18,29 +151,41 @@ def get_product(product_id: int, session: Session = Depends(get_session)):
     return product
 
 
-def create_product(product: ProductCreate, session: Session = Depends(get_session)):
+async def create_product(
+    product: ProductCreate, session: AsyncSession = Depends(get_async_session)
+):
     _product = Product.model_validate(product)
     session.add(_product)
-    session.commit()
-    session.refresh(_product)
+    await bump_version(session, "product")
+    await session.commit()
+    await session.refresh(_product)
     return _product
 
 
-def delete_product(product_id: int, session: Session = Depends(get_session)):
-    product = session.exec(select(Product).where(Product.id == product_id)).first()
+async def delete_product(
+    product_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    product = (
+        await session.exec(select(Product).where(Product.id == product_id))
+    ).first()
     if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
-    session.delete(product)
-    session.commit()
+    await session.delete(product)
+    await bump_version(session, "product")
+    await session.commit()
     return product
 
 
-def update_product(
-    product_id: int, product: ProductUpdate, session: Session = Depends(get_session)
+async def update_product(
+    product_id: int,
+    product: ProductUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    _product = session.exec(select(Product).where(Product.id == product_id)).first()
+    _product = (
+        await session.exec(select(Product).where(Product.id == product_id))
+    ).first()
     if _product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
@@ -49,6 +194,177 @@ def update_product(
     for key, value in product_data.items():
         setattr(_product, key, value)
     session.add(_product)
-    session.commit()
-    session.refresh(_product)
+    await bump_version(session, "product")
+    await session.commit()
+    await session.refresh(_product)
     return _product
+
+
+BULK_IMPORT_MAX_ERRORS = 1000
+
+_REFERENCES = (
+    ("category_name", Category),
+    ("brand_name", Brand),
+    ("provider_name", Provider),
+)
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def _iter_csv_rows(lines: AsyncIterator[str]):
+    header = None
+    pending = None
+    row_number = 0
+    async for line in lines:
+        record = line if pending is None else f"{pending}\n{line}"
+        # An odd number of quotes means a quoted field continues on the next line
+        if record.count('"') % 2:
+            pending = record
+            continue
+        pending = None
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield (
+                row_number,
+                BulkRowError(
+                    row=row_number,
+                    errors=[f"Expected {len(header)} columns, got {len(values)}"],
+                ),
+            )
+            continue
+        yield row_number, dict(zip(header, values))
+    if pending is not None:
+        yield (
+            row_number + 1,
+            BulkRowError(row=row_number + 1, errors=["Unterminated quoted field"]),
+        )
+
+
+async def _iter_ndjson_rows(lines: AsyncIterator[str]):
+    row_number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            value = json.loads(line)
+        except ValueError:
+            yield row_number, BulkRowError(row=row_number, errors=["Invalid JSON"])
+            continue
+        if not isinstance(value, dict):
+            yield (
+                row_number,
+                BulkRowError(row=row_number, errors=["Expected a JSON object"]),
+            )
+            continue
+        yield row_number, value
+
+
+def _record_error(report: BulkImportReport, error: BulkRowError):
+    report.failed += 1
+    if len(report.errors) < BULK_IMPORT_MAX_ERRORS:
+        report.errors.append(error)
+    else:
+        report.errors_truncated = True
+
+
+async def _resolve_references(
+    products: list[ProductCreate], known: dict[str, set], session: AsyncSession
+):
+    """Add the referenced names that exist to ``known``, one query per
+    reference type and batch, skipping names already seen."""
+    for field, model in _REFERENCES:
+        names = {getattr(product, field) for product in products} - known[field]
+        if names:
+            found = await session.exec(select(model.name).where(model.name.in_(names)))
+            known[field].update(found.all())
+
+
+async def _import_batch(
+    batch: list, known: dict[str, set], session: AsyncSession, report: BulkImportReport
+):
+    valid = []
+    for row_number, raw in batch:
+        if isinstance(raw, BulkRowError):
+            _record_error(report, raw)
+            continue
+        try:
+            valid.append((row_number, ProductCreate.model_validate(raw)))
+        except ValidationError as exc:
+            errors = [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in exc.errors()
+            ]
+            _record_error(report, BulkRowError(row=row_number, errors=errors))
+
+    await _resolve_references([product for _, product in valid], known, session)
+
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    rows, row_numbers = [], []
+    for row_number, product in valid:
+        errors = [
+            f"{field}: unknown {model.__name__.lower()} '{getattr(product, field)}'"
+            for field, model in _REFERENCES
+            if getattr(product, field) not in known[field]
+        ]
+        if errors:
+            _record_error(report, BulkRowError(row=row_number, errors=errors))
+            continue
+        rows.append({**product.model_dump(), "created_at": created_at})
+        row_numbers.append(row_number)
+    if not rows:
+        return
+
+    try:
+        # Core insert, one executemany per batch without the ORM unit of work
+        await session.exec(insert(Product.__table__), params=rows)
+        await bump_version(session, "product")
+        await session.commit()
+    except SQLAlchemyError as exc:
+        await session.rollback()
+        message = f"Batch rejected by the database: {exc.__class__.__name__}"
+        for row_number in row_numbers:
+            _record_error(report, BulkRowError(row=row_number, errors=[message]))
+        return
+    report.inserted += len(rows)
+
+
+async def bulk_import_products(
+    chunks: AsyncIterator[bytes],
+    format: str,
+    batch_size: int,
+    session: AsyncSession = Depends(get_async_session),
+) -> BulkImportReport:
+    """Insert products from a CSV or NDJSON byte stream, ``batch_size`` rows
+    per transaction. Invalid rows are reported and skipped."""
+    report = BulkImportReport()
+    known = {field: set() for field, _ in _REFERENCES}
+    iter_rows = _iter_csv_rows if format == "csv" else _iter_ndjson_rows
+    batch = []
+    async for row in iter_rows(_iter_lines(chunks)):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await _import_batch(batch, known, session, report)
+            batch = []
+    if batch:
+        await _import_batch(batch, known, session, report)
+    # Parse errors are recorded before validation errors within a batch
+    report.errors.sort(key=lambda error: error.row)
+    return report
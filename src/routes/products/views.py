@@ -1,45 +1,128 @@
 from src.routes.products.models import (
     Product,
+    BulkImportReport,
     ProductCreate,
+    ProductQuery,
     ProductRead,
     ProductUpdate,
 )
 from src.routes.products.operations import (
     get_products,
+    export_products_statement,
+    search_products,
+    bulk_import_products,
     create_product,
     get_product,
     delete_product,
     update_product,
 )
-from fastapi import APIRouter, Depends
-from src.database import get_session
-from sqlmodel import Session
+from typing import Annotated
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from src.config import get_bulk_import_batch_size
+from src.database import get_async_session, UnitOfWorkRoute
+from src.versions import conditional_get
+from src.exports import ExportFormat, export_response
+from src.pagination import NEXT_CURSOR_HEADER
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+# Products embed their category, brand and provider, and show the stock
+# that sales change
+PRODUCT_TABLES = ("product", "stock", "category", "brand", "provider")
+product_etag = Depends(conditional_get(*PRODUCT_TABLES))
+product_detail_etag = Depends(conditional_get(*PRODUCT_TABLES, resource=Product))
+
+BULK_IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+@router.get("", response_model=list[ProductRead], dependencies=[product_etag])
+async def read_products(
+    response: Response,
+    query: Annotated[ProductQuery, Query()],
+    session: AsyncSession = Depends(get_async_session),
+):
+    products, next_cursor = await get_products(session, query)
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return products
+
 
-router = APIRouter()
+@router.get("/search", response_model=list[ProductRead])
+async def search(
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await search_products(q, limit, session)
 
 
-@router.get("", response_model=list[ProductRead])
-def read_products(session: Session = Depends(get_session)):
-    return get_products(session)
+@router.get("/export")
+async def export_products(request: Request, format: ExportFormat = "ndjson"):
+    return export_response(request, export_products_statement(), format, "products")
 
 
-@router.get("/{product_id}", response_model=ProductRead)
-def read_product(product_id: int, session: Session = Depends(get_session)):
-    return get_product(product_id, session)
+@router.get(
+    "/{product_id}", response_model=ProductRead, dependencies=[product_detail_etag]
+)
+async def read_product(
+    product_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await get_product(product_id, session)
 
 
 @router.post("", response_model=Product)
-def add_product(product: ProductCreate, session: Session = Depends(get_session)):
-    return create_product(product, session)
+async def add_product(
+    product: ProductCreate, session: AsyncSession = Depends(get_async_session)
+):
+    return await create_product(product, session)
+
+
+@router.post("/bulk", response_model=BulkImportReport)
+async def add_products_bulk(
+    request: Request,
+    batch_size: Annotated[int | None, Query(ge=1, le=10000)] = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    format = BULK_IMPORT_FORMATS.get(content_type.lower())
+    if format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson",
+        )
+    return await bulk_import_products(
+        request.stream(),
+        format,
+        batch_size or get_bulk_import_batch_size(),
+        session,
+    )
 
 
 @router.patch("/{product_id}", response_model=Product)
-def modify_product(
-    product_id: int, product: ProductUpdate, session: Session = Depends(get_session)
+async def modify_product(
+    product_id: int,
+    product: ProductUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    return update_product(product_id, product, session)
+    return await update_product(product_id, product, session)
 
 
 @router.delete("/{product_id}")
-def remove_product(product_id: int, session: Session = Depends(get_session)):
-    return delete_product(product_id, session)
+async def remove_product(
+    product_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await delete_product(product_id, session)
@@ -1,24 +1,59 @@
-from src.routes.providers.models import Provider, ProviderCreate, ProviderUpdate
-from src.database import get_session
+from src.routes.providers.models import (
+    ProviderRead,
+    Provider,
+    ProviderCreate,
+    ProviderUpdate,
+)
+from src.database import get_async_session
+from src.versions import bump_version, cached
 from fastapi import Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
-def create_provider(provider: ProviderCreate, session: Session = Depends(get_session)):
+async def create_provider(
+    provider: ProviderCreate, session: AsyncSession = Depends(get_async_session)
+):
     _provider = Provider.model_validate(provider)
     session.add(_provider)
-    session.commit()
-    session.refresh(_provider)
+    await bump_version(session, "provider")
+    await session.commit()
+    await session.refresh(_provider)
     return _provider
 
 
-def get_providers(session: Session = Depends(get_session)):
-    providers = session.exec(select(Provider)).all()
-    return providers
+async def _load_providers(session: AsyncSession) -> list[ProviderRead]:
+    providers = (
+        await session.exec(select(Provider).options(selectinload(Provider.products)))
+    ).all()
+    # The result is cached and shared between requests, keep read models
+    # instead of instances tied to this session
+    return [
+        ProviderRead.model_validate(provider, from_attributes=True)
+        for provider in providers
+    ]
+
 
+async def get_providers(session: AsyncSession = Depends(get_async_session)):
+    return await cached(
+        session,
+        ("providers",),
+        ("provider", "product"),
+        lambda: _load_providers(session),
+    )
 
-def get_provider(provider_id: int, session: Session = Depends(get_session)):
-    provider = session.exec(select(Provider).where(Provider.id == provider_id)).first()
+
+async def get_provider(
+    provider_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    provider = (
+        await session.exec(
+            select(Provider)
+            .where(Provider.id == provider_id)
+            .options(selectinload(Provider.products))
+        )
+    ).first()
     if provider is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Provider not found"
@@ -26,21 +61,40 @@ def get_provider(provider_id: int, session: Session = Depends(get_session)):
     return provider
 
 
-def get_provider_by_name(provider_name: str, session: Session = Depends(get_session)):
-    provider = session.exec(
-        select(Provider).where(Provider.name == provider_name)
+async def _load_provider_by_name(
+    provider_name: str, session: AsyncSession
+) -> dict | None:
+    provider = (
+        await session.exec(select(Provider).where(Provider.name == provider_name))
     ).first()
-    if provider is None:
+    return None if provider is None else provider.model_dump()
+
+
+async def get_provider_by_name(
+    provider_name: str, session: AsyncSession = Depends(get_async_session)
+):
+    data = await cached(
+        session,
+        ("provider", provider_name),
+        ("provider",),
+        lambda: _load_provider_by_name(provider_name, session),
+    )
+    if data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Provider not found"
         )
-    return provider
+    # A fresh instance per call, the cached row is never handed out
+    return Provider.model_validate(data)
 
 
-def update_provider(
-    provider_id: int, provider: ProviderUpdate, session: Session = Depends(get_session)
+async def update_provider(
+    provider_id: int,
+    provider: ProviderUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    _provider = session.exec(select(Provider).where(Provider.id == provider_id)).first()
+    _provider = (
+        await session.exec(select(Provider).where(Provider.id == provider_id))
+    ).first()
     if _provider is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Provider not found"
@@ -51,18 +105,19 @@ def update_provider(
     _provider.phone = provider.phone
     _provider.address = provider.address
     session.add(_provider)
-    session.commit()
-    session.refresh(_provider)
+    await bump_version(session, "provider")
+    await session.commit()
+    await session.refresh(_provider)
     return _provider
 
 
-def update_provider_by_name(
+async def update_provider_by_name(
     provider_name: str,
     provider: ProviderUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    _provider = session.exec(
-        select(Provider).where(Provider.name == provider_name)
+    _provider = (
+        await session.exec(select(Provider).where(Provider.name == provider_name))
     ).first()
     if _provider is None:
         raise HTTPException(
@@ -74,32 +129,37 @@ def update_provider_by_name(
     _provider.phone = provider.phone
     _provider.address = provider.address
     session.add(_provider)
-    session.commit()
-    session.refresh(_provider)
+    await bump_version(session, "provider")
+    await session.commit()
+    await session.refresh(_provider)
     return _provider
 
 
-def delete_provider(provider_id: int, session: Session = Depends(get_session)):
-    provider = session.get(Provider, provider_id)
+async def delete_provider(
+    provider_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    provider = await session.get(Provider, provider_id)
     if provider is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Provider not found"
         )
-    session.delete(provider)
-    session.commit()
+    await session.delete(provider)
+    await bump_version(session, "provider")
+    await session.commit()
     return provider
 
 
-def delete_provider_by_name(
-    provider_name: str, session: Session = Depends(get_session)
+async def delete_provider_by_name(
+    provider_name: str, session: AsyncSession = Depends(get_async_session)
 ):
-    provider = session.exec(
-        select(Provider).where(Provider.name == provider_name)
+    provider = (
+        await session.exec(select(Provider).where(Provider.name == provider_name))
     ).first()
     if provider is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Provider not found"
         )
-    session.delete(provider)
-    session.commit()
+    await session.delete(provider)
+    await bump_version(session, "provider")
+    await session.commit()
     return provider
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.database import get_session
+from src.database import get_async_session, UnitOfWorkRoute
+from src.versions import conditional_get
 from src.routes.providers.models import (
     ProviderRead,
     ProviderCreate,
@@ -16,33 +17,47 @@ from src.routes.providers.operations import (
     delete_provider,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+# Providers are returned with their products, so the ETag follows both tables
+provider_etag = Depends(conditional_get("provider", "product"))
+provider_detail_etag = Depends(
+    conditional_get("provider", "product", resource=Provider)
+)
 
 
 @router.post("", response_model=Provider)
-def create_provider_view(
-    provider: ProviderCreate, session: Session = Depends(get_session)
+async def create_provider_view(
+    provider: ProviderCreate, session: AsyncSession = Depends(get_async_session)
 ):
-    return create_provider(provider, session)
+    return await create_provider(provider, session)
 
 
-@router.get("", response_model=list[ProviderRead])
-def get_providers_view(session: Session = Depends(get_session)):
-    return get_providers(session)
+@router.get("", response_model=list[ProviderRead], dependencies=[provider_etag])
+async def get_providers_view(session: AsyncSession = Depends(get_async_session)):
+    return await get_providers(session)
 
 
-@router.get("/{provider_id}", response_model=ProviderRead)
-def get_provider_view(provider_id: int, session: Session = Depends(get_session)):
-    return get_provider(provider_id, session)
+@router.get(
+    "/{provider_id}", response_model=ProviderRead, dependencies=[provider_detail_etag]
+)
+async def get_provider_view(
+    provider_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await get_provider(provider_id, session)
 
 
 @router.patch("/{provider_id}", response_model=ProviderUpdate)
-def update_provider_view(
-    provider_id: int, provider: ProviderUpdate, session: Session = Depends(get_session)
+async def update_provider_view(
+    provider_id: int,
+    provider: ProviderUpdate,
+    session: AsyncSession = Depends(get_async_session),
 ):
-    return update_provider(provider_id, provider, session)
+    return await update_provider(provider_id, provider, session)
 
 
 @router.delete("/{provider_id}")
-def delete_provider_view(provider_id: int, session: Session = Depends(get_session)):
-    return delete_provider(provider_id, session)
+async def delete_provider_view(
+    provider_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await delete_provider(provider_id, session)
@@ -0,0 +1,22 @@
+"""Rebuild the daily sales rollups from the sales history.
+
+Migrations 7 and 13 built them once; run it by hand after editing sales in the
+database directly:
+
+    python -m src.routes.reports.backfill
+"""
+
+from src.database import get_engine
+from src.migrations import migrate
+from src.routes.reports.operations import (
+    rebuild_daily_product_sales,
+    rebuild_daily_sales,
+)
+
+if __name__ == "__main__":
+    engine = get_engine()
+    migrate(engine)
+    with engine.begin() as connection:
+        product_rows = rebuild_daily_product_sales(connection)
+        day_rows = rebuild_daily_sales(connection)
+    print(f"Rebuilt {product_rows} daily product sales rows and {day_rows} daily rows")
@@ -0,0 +1,59 @@
+import datetime
+from typing import Literal, Optional
+
+from pydantic import BaseModel, model_validator
+from sqlmodel import Field, SQLModel
+
+
+class DailyProductSales(SQLModel, table=True):
+    """Sales of one product on one (UTC) day, kept up to date by create_sale."""
+
+    __tablename__ = "daily_product_sales"
+
+    day: datetime.date = Field(primary_key=True)
+    product_id: int = Field(foreign_key="product.id", primary_key=True)
+    revenue: float = Field(default=0)
+    units: int = Field(default=0)
+    # Sales that included the product
+    orders: int = Field(default=0)
+
+
+class DailySales(SQLModel, table=True):
+    """All sales on one (UTC) day, kept up to date by create_sale."""
+
+    __tablename__ = "daily_sales"
+
+    day: datetime.date = Field(primary_key=True)
+    revenue: float = Field(default=0)
+    units: int = Field(default=0)
+    orders: int = Field(default=0)
+
+
+SalesReportGroup = Literal["day", "product", "category", "brand"]
+
+
+class SalesReportQuery(BaseModel):
+    group_by: SalesReportGroup = "day"
+    date_from: Optional[datetime.date] = None
+    # Inclusive, reports are by whole days
+    date_to: Optional[datetime.date] = None
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if (
+            self.date_from is not None
+            and self.date_to is not None
+            and self.date_from > self.date_to
+        ):
+            raise ValueError("date_from must not be after date_to")
+        return self
+
+
+class SalesReportRow(BaseModel):
+    # The day, product id, category name or brand name
+    key: Optional[datetime.date | int | str]
+    revenue: float
+    units: int
+    # Sales, each counted once. None by category and brand: a sale can span
+    # several of them, and the rollups only count sales per day and product
+    orders: Optional[int] = None
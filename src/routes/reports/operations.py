@@ -0,0 +1,162 @@
+import datetime
+
+from fastapi import Depends
+from sqlalchemy import delete, func, insert, null
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.database import get_async_session
+from src.routes.products.models import Product
+from src.routes.reports.models import (
+    DailyProductSales,
+    DailySales,
+    SalesReportQuery,
+    SalesReportRow,
+)
+from src.routes.sales.link_models import ProductSale
+from src.routes.sales.models import Sale
+
+
+async def _upsert(session: AsyncSession, table, keys: list[str], rows: list[dict]):
+    """Insert ``rows``, adding their counters to the rows already there."""
+    dialect = session.bind.dialect.name
+    statement = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c[key] for key in keys],
+        set_={
+            column: table.c[column] + statement.excluded[column]
+            for column in ("revenue", "units", "orders")
+        },
+    )
+    await session.exec(statement, params=rows)
+
+
+async def record_sale(
+    session: AsyncSession, day: datetime.date, lines: dict[int, tuple[int, float]]
+):
+    """Add one sale's lines (product id -> (units, revenue)) to ``day``'s
+    rollup rows, in the caller's transaction, with one upsert per rollup."""
+    await _upsert(
+        session,
+        DailyProductSales.__table__,
+        ["day", "product_id"],
+        [
+            {
+                "day": day,
+                "product_id": product_id,
+                "revenue": revenue,
+                "units": units,
+                "orders": 1,
+            }
+            for product_id, (units, revenue) in lines.items()
+        ],
+    )
+    await _upsert(
+        session,
+        DailySales.__table__,
+        ["day"],
+        [
+            {
+                "day": day,
+                "revenue": sum(revenue for _, revenue in lines.values()),
+                "units": sum(units for units, _ in lines.values()),
+                "orders": 1,
+            }
+        ],
+    )
+
+
+def rebuild_daily_product_sales(connection: Connection) -> int:
+    """Recompute every rollup row from the sales history and return how
+    many there are.
+
+    Line items do not record the price they were sold at, so revenue for
+    sales made before the rollup existed uses the product's current price."""
+    table = DailyProductSales.__table__
+    day = func.date(Sale.created_at)
+    history = (
+        select(
+            day,
+            ProductSale.product_id,
+            func.sum(ProductSale.quantity * Product.price),
+            func.sum(ProductSale.quantity),
+            func.count(),
+        )
+        .join(Sale, ProductSale.sale_id == Sale.id)
+        .join(Product, ProductSale.product_id == Product.id)
+        .group_by(day, ProductSale.product_id)
+    )
+    connection.execute(delete(table))
+    result = connection.execute(
+        insert(table).from_select(
+            ["day", "product_id", "revenue", "units", "orders"], history
+        )
+    )
+    return result.rowcount
+
+
+def rebuild_daily_sales(connection: Connection) -> int:
+    """Recompute the per-day rollup from ``daily_product_sales`` and the
+    sales history, and return how many rows there are."""
+    table = DailySales.__table__
+    day = func.date(Sale.created_at)
+    orders = select(day.label("day"), func.count().label("orders")).group_by(day)
+    orders = orders.subquery()
+    totals = (
+        select(
+            DailyProductSales.day,
+            func.sum(DailyProductSales.revenue),
+            func.sum(DailyProductSales.units),
+            orders.c.orders,
+        )
+        .join(orders, orders.c.day == DailyProductSales.day)
+        .group_by(DailyProductSales.day, orders.c.orders)
+    )
+    connection.execute(delete(table))
+    result = connection.execute(
+        insert(table).from_select(["day", "revenue", "units", "orders"], totals)
+    )
+    return result.rowcount
+
+
+_GROUP_KEYS = {
+    "product": DailyProductSales.product_id,
+    "category": Product.category_name,
+    "brand": Product.brand_name,
+}
+
+
+async def get_sales_report(
+    session: AsyncSession = Depends(get_async_session),
+    query: SalesReportQuery = SalesReportQuery(),
+) -> list[SalesReportRow]:
+    """Revenue, units and orders per ``query.group_by``, read from the
+    rollups alone (joined to product for category and brand)."""
+    if query.group_by == "day":
+        table = DailySales
+        key = DailySales.day
+        statement = select(key, table.revenue, table.units, table.orders)
+    else:
+        table = DailyProductSales
+        key = _GROUP_KEYS[query.group_by]
+        statement = select(
+            key,
+            func.sum(table.revenue),
+            func.sum(table.units),
+            # A sale includes a product once, but may span categories and brands
+            func.sum(table.orders) if query.group_by == "product" else null(),
+        )
+        if query.group_by in ("category", "brand"):
+            statement = statement.join(Product, table.product_id == Product.id)
+        statement = statement.group_by(key)
+    if query.date_from is not None:
+        statement = statement.where(table.day >= query.date_from)
+    if query.date_to is not None:
+        statement = statement.where(table.day <= query.date_to)
+    rows = await session.exec(statement.order_by(key))
+    return [
+        SalesReportRow(key=key, revenue=revenue, units=units, orders=orders)
+        for key, revenue, units, orders in rows
+    ]
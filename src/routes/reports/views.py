@@ -0,0 +1,18 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.database import get_async_session, UnitOfWorkRoute
+from src.routes.reports.models import SalesReportQuery, SalesReportRow
+from src.routes.reports.operations import get_sales_report
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+
+@router.get("/sales", response_model=list[SalesReportRow])
+async def read_sales_report(
+    query: Annotated[SalesReportQuery, Query()],
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await get_sales_report(session, query)
@@ -3,5 +3,6 @@ from sqlmodel import SQLModel, Field
 
 class ProductSale(SQLModel, table=True):
     product_id: int = Field(foreign_key="product.id", primary_key=True)
-    sale_id: int = Field(foreign_key="sale.id", primary_key=True)
+    # The primary key leads with product_id, sale -> products needs its own index
+    sale_id: int = Field(foreign_key="sale.id", primary_key=True, index=True)
     quantity: int = Field(default=1)
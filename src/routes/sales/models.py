@@ -1,7 +1,8 @@
 import datetime
 from sqlmodel import SQLModel, Field, Relationship
-from pydantic import BaseModel, Field as PydanticField
-from typing import Optional, List, TYPE_CHECKING
+from pydantic import BaseModel, Field as PydanticField, model_validator
+from sqlalchemy import Index
+from typing import Optional, List, Literal, TYPE_CHECKING
 
 from src.routes.sales.link_models import ProductSale
 
@@ -18,13 +19,20 @@ class CustomerRead(BaseModel):
 
 
 class Sale(SQLModel, table=True):
+    __table_args__ = (
+        # Keyset pages over the whole history and over one customer's; both
+        # also serve plain lookups on their leading column
+        Index("ix_sale_created_at_id", "created_at", "id"),
+        Index("ix_sale_customer_dni_created_at_id", "customer_dni", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     total: float
     products: List["Product"] = Relationship(
         back_populates="sales", link_model=ProductSale
     )
     created_at: datetime.datetime = Field(
-        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc)
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc),
     )
     customer_dni: int = Field(foreign_key="customer.dni")
 
@@ -51,3 +59,57 @@ class SaleRead(SQLModel):
     total: float
     created_at: datetime.datetime
     customer: Optional[CustomerRead] = None
+
+
+class SaleItemRead(ProductSaleRead):
+    product_id: int
+
+
+class SaleSummaryRead(BaseModel):
+    id: int
+    total: float
+    created_at: datetime.datetime
+    customer_dni: int
+    # Only sent with ?embed=items
+    items: Optional[List[SaleItemRead]] = None
+
+
+SaleSort = Literal["created_at", "-created_at"]
+
+
+def _as_naive_utc(value: Optional[datetime.datetime]):
+    # created_at is stored without a time zone, in UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class SaleQuery(BaseModel):
+    limit: int = PydanticField(default=50, ge=1, le=200)
+    cursor: Optional[str] = None
+    sort: SaleSort = "-created_at"
+    created_from: Optional[datetime.datetime] = None
+    # Exclusive, so consecutive ranges do not overlap
+    created_before: Optional[datetime.datetime] = None
+    customer_dni: Optional[int] = None
+    min_total: Optional[float] = PydanticField(default=None, ge=0)
+    max_total: Optional[float] = PydanticField(default=None, ge=0)
+    embed: Optional[Literal["items"]] = None
+
+    @model_validator(mode="after")
+    def check_ranges(self):
+        self.created_from = _as_naive_utc(self.created_from)
+        self.created_before = _as_naive_utc(self.created_before)
+        if (
+            self.created_from is not None
+            and self.created_before is not None
+            and self.created_from >= self.created_before
+        ):
+            raise ValueError("created_from must be before created_before")
+        if (
+            self.min_total is not None
+            and self.max_total is not None
+            and self.min_total > self.max_total
+        ):
+            raise ValueError("min_total must not be greater than max_total")
+        return self
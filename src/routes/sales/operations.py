@@ -1,20 +1,29 @@
 from fastapi import Depends, HTTPException
-from sqlmodel import Session, select
+from sqlalchemy import case, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.routes.sales.models import (
     Sale,
     ProductSale,
     SaleCreate,
+    SaleItemRead,
+    SaleQuery,
     SaleRead,
+    SaleSummaryRead,
     ProductSaleRead,
     CustomerRead,
 )
 from src.routes.customers.models import Customer
 from src.routes.products.models import Product
-from src.database import get_session
+from src.routes.reports.operations import record_sale
+from src.database import get_async_session
+from src.idempotency import IdempotentRequest
+from src.pagination import decode_cursor, paginate, split_page
+from src.versions import bump_version
 
 
-def read_sale(sale_id: int, session: Session = Depends(get_session)):
+async def read_sale(sale_id: int, session: AsyncSession = Depends(get_async_session)):
     statement = (
         select(Sale, Product, ProductSale)
         .join(ProductSale, Sale.id == ProductSale.sale_id)
@@ -22,14 +31,14 @@ def read_sale(sale_id: int, session: Session = Depends(get_session)):
         .where(Sale.id == sale_id)
     )
 
-    results = session.exec(statement).all()
+    results = (await session.exec(statement)).all()
 
     if not results:
         raise HTTPException(status_code=404, detail="Sale not found")
 
     sale = results[0][0]
-    customer = session.exec(
-        select(Customer).where(Customer.dni == sale.customer_dni)
+    customer = (
+        await session.exec(select(Customer).where(Customer.dni == sale.customer_dni))
     ).first()  # Now using the actual sale's user_dni
     if customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -62,17 +71,111 @@ def read_sale(sale_id: int, session: Session = Depends(get_session)):
     return sale_read
 
 
-def read_sales(session: Session = Depends(get_session)):
-    sales = session.exec(select(Sale)).all()
-    return sales
+def _filter_sales(statement, query: SaleQuery):
+    if query.created_from is not None:
+        statement = statement.where(Sale.created_at >= query.created_from)
+    if query.created_before is not None:
+        statement = statement.where(Sale.created_at < query.created_before)
+    if query.customer_dni is not None:
+        statement = statement.where(Sale.customer_dni == query.customer_dni)
+    if query.min_total is not None:
+        statement = statement.where(Sale.total >= query.min_total)
+    if query.max_total is not None:
+        statement = statement.where(Sale.total <= query.max_total)
+    return statement
 
 
-def create_sale(sale_input: SaleCreate, session: Session = Depends(get_session)):
-    total_amount = 0
+async def _get_sale_items(
+    session: AsyncSession, sale_ids: list[int]
+) -> dict[int, list[SaleItemRead]]:
+    """Line items of every sale in ``sale_ids``, in one joined query."""
+    rows = await session.exec(
+        select(
+            ProductSale.sale_id,
+            ProductSale.product_id,
+            ProductSale.quantity,
+            Product.name,
+            Product.price,
+        )
+        .join(Product, ProductSale.product_id == Product.id)
+        .where(ProductSale.sale_id.in_(sale_ids))
+        .order_by(ProductSale.sale_id, ProductSale.product_id)
+    )
+    items: dict[int, list[SaleItemRead]] = {sale_id: [] for sale_id in sale_ids}
+    for sale_id, product_id, quantity, name, price in rows:
+        items[sale_id].append(
+            SaleItemRead(
+                product_id=product_id, name=name, price=price, quantity=quantity
+            )
+        )
+    return items
+
+
+async def read_sales(
+    session: AsyncSession = Depends(get_async_session),
+    query: SaleQuery = SaleQuery(),
+) -> tuple[list[SaleSummaryRead], str | None]:
+    """Return one page of sales, newest first by default, and the cursor for
+    the next one."""
+    # id breaks ties between sales created in the same instant
+    columns = (Sale.created_at, Sale.id)
+    cursor_values = None
+    if query.cursor is not None:
+        cursor_values = decode_cursor(query.cursor, query.sort, len(columns))
+    statement = paginate(
+        _filter_sales(select(Sale), query),
+        columns,
+        descending=query.sort.startswith("-"),
+        cursor_values=cursor_values,
+        limit=query.limit,
+    )
+    sales, next_cursor = split_page(
+        list((await session.exec(statement)).all()),
+        query.limit,
+        query.sort,
+        key=lambda sale: (sale.created_at, sale.id),
+    )
+    page = [
+        SaleSummaryRead.model_validate(sale, from_attributes=True) for sale in sales
+    ]
+    if query.embed == "items" and page:
+        items = await _get_sale_items(session, [sale.id for sale in page])
+        for sale in page:
+            sale.items = items[sale.id]
+    return page, next_cursor
+
+
+def export_sales_statement():
+    return select(Sale.__table__).order_by(Sale.id)
+
+
+async def reserve_stock(session: AsyncSession, quantities: dict[int, int]) -> bool:
+    """Take ``quantities`` (product id -> units) out of stock in one
+    conditional UPDATE. Returns False, with nothing changed, if any product
+    is short.
+
+    The check and the decrement are the same statement, so two concurrent
+    sales can never both take the last units the way a read-then-write
+    could."""
+    quantity = case(quantities, value=Product.id)
+    result = await session.exec(
+        update(Product.__table__)
+        .where(Product.id.in_(quantities), Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+    )
+    return result.rowcount == len(quantities)
+
 
+async def create_sale(
+    sale_input: SaleCreate,
+    session: AsyncSession = Depends(get_async_session),
+    idempotency: IdempotentRequest | None = None,
+):
     # Check if user exists
-    if not session.exec(
-        select(Customer).where(Customer.dni == sale_input.customer_dni)
+    if not (
+        await session.exec(
+            select(Customer).where(Customer.dni == sale_input.customer_dni)
+        )
     ).first():
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -80,41 +183,80 @@ def create_sale(sale_input: SaleCreate, session: Session = Depends(get_session))
     if not sale_input.products:
         raise HTTPException(status_code=400, detail="No products provided")
 
+    # Repeated lines for a product are one reservation and one sale line
+    quantities: dict[int, int] = {}
     for item in sale_input.products:
         if item.quantity <= 0:
             raise HTTPException(
                 status_code=400, detail="Quantity must be greater than 0"
             )
-        product = session.get(Product, item.product_id)
-        if not product:
-            raise HTTPException(
-                status_code=404, detail=f"Product {item.product_id} not found"
-            )
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
 
-        # check if enought stock
-        if product.stock < item.quantity:
+    products = {
+        product.id: product
+        for product in (
+            await session.exec(
+                select(Product.id, Product.name, Product.price, Product.stock).where(
+                    Product.id.in_(quantities)
+                )
+            )
+        ).all()
+    }
+    for product_id in quantities:
+        if product_id not in products:
             raise HTTPException(
-                status_code=400, detail=f"Not enough stock for product {product.name}"
+                status_code=404, detail=f"Product {product_id} not found"
             )
 
-        # remove stock
-        product.stock -= item.quantity
+    if not await reserve_stock(session, quantities):
+        await session.rollback()
+        # Name the first product that was short when it was read; another
+        # sale may have taken the stock since, then it is the first line
+        short = next(
+            (
+                product_id
+                for product_id, quantity in quantities.items()
+                if products[product_id].stock < quantity
+            ),
+            next(iter(quantities)),
+        )
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough stock for product {products[short].name}",
+        )
 
-        total_amount += product.price * item.quantity
+    total_amount = sum(
+        products[product_id].price * quantity
+        for product_id, quantity in quantities.items()
+    )
 
     # Create sale
     sale = Sale(customer_dni=sale_input.customer_dni, total=total_amount)
     session.add(sale)
-    session.flush()  # To get sale ID
+    await session.flush()  # To get sale ID
+
+    await record_sale(
+        session,
+        sale.created_at.date(),
+        {
+            product_id: (quantity, products[product_id].price * quantity)
+            for product_id, quantity in quantities.items()
+        },
+    )
 
     # Create product sales
-    for item in sale_input.products:
-        product_sale = ProductSale(
-            product_id=item.product_id, sale_id=sale.id, quantity=item.quantity
-        )
-        session.add(product_sale)
+    session.add_all(
+        ProductSale(product_id=product_id, sale_id=sale.id, quantity=quantity)
+        for product_id, quantity in quantities.items()
+    )
 
-    session.commit()
-    session.refresh(sale)
+    # Serialized once, the stored copy replays exactly what is returned here
+    body = sale.model_dump(mode="json")
+    if idempotency is not None:
+        await idempotency.save(session, 200, body)
+    # Last, so concurrent checkouts hold the counter's row lock only until
+    # the commit right after
+    await bump_version(session, "stock")
+    await session.commit()
 
-    return sale
+    return body
@@ -1,22 +1,60 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session
-from src.routes.sales.models import SaleCreate, SaleRead
-from src.routes.sales.operations import create_sale, read_sale, read_sales
-from src.database import get_session
+from typing import Annotated
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.routes.sales.models import SaleCreate, SaleQuery, SaleRead, SaleSummaryRead
+from src.routes.sales.operations import (
+    create_sale,
+    export_sales_statement,
+    read_sale,
+    read_sales,
+)
+from src.database import get_async_session, UnitOfWorkRoute
+from src.exports import ExportFormat, export_response
+from src.idempotency import idempotent_response
+from src.routes.auth.operations import get_current_user
+from src.pagination import NEXT_CURSOR_HEADER
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.post("/")
-def create_sale_route(sale: SaleCreate, session: Session = Depends(get_session)):
-    return create_sale(sale, session)
+async def create_sale_route(
+    sale: SaleCreate,
+    session: AsyncSession = Depends(get_async_session),
+    idempotency_key: Annotated[str | None, Header(min_length=1, max_length=255)] = None,
+    user: tuple[str, str | None] = Depends(get_current_user),
+):
+    if idempotency_key is None:
+        return await create_sale(sale, session)
+    username, _ = user
+    return await idempotent_response(
+        session,
+        username,
+        idempotency_key,
+        sale,
+        lambda idempotency: create_sale(sale, session, idempotency),
+    )
+
+
+@router.get("/export")
+async def export_sales(request: Request, format: ExportFormat = "ndjson"):
+    return export_response(request, export_sales_statement(), format, "sales")
 
 
 @router.get("/{sale_id}", response_model=SaleRead)
-def read_sale_route(sale_id: int, session: Session = Depends(get_session)):
-    return read_sale(sale_id, session)
+async def read_sale_route(
+    sale_id: int, session: AsyncSession = Depends(get_async_session)
+):
+    return await read_sale(sale_id, session)
 
 
-@router.get("/")
-def read_sales_route(session: Session = Depends(get_session)):
-    return read_sales(session)
+@router.get("/", response_model=list[SaleSummaryRead], response_model_exclude_none=True)
+async def read_sales_route(
+    response: Response,
+    query: Annotated[SaleQuery, Query()],
+    session: AsyncSession = Depends(get_async_session),
+):
+    sales, next_cursor = await read_sales(session, query)
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return sales
@@ -0,0 +1,180 @@
+"""Slow query log.
+
+Statements slower than ``DB_SLOW_QUERY_MS`` are queued with their redacted
+parameters and the route that issued them. A background thread captures the
+EXPLAIN plan on its own connection and writes the entry to the
+``src.slow_queries`` logger, so neither step runs on the request path.
+"""
+
+import datetime
+import logging
+import queue
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, field
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import NullPool
+
+# Imported for its listeners, which time each statement before ours runs
+from src.instrumentation import get_query_stats, get_route_path
+from src.config import get_slow_query_threshold_ms, get_slow_query_explain
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 1000
+RECENT_SIZE = 100
+REDACTED = "<redacted>"
+
+# Set on the EXPLAIN engines so their own statements are never logged
+_SKIP_OPTION = "skip_slow_query_log"
+
+# Async drivers cannot be used from the worker thread, explain through the
+# sync driver for the same database instead
+_SYNC_DRIVERS = {"sqlite+aiosqlite": "sqlite", "postgresql+asyncpg": "postgresql"}
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    parameters: list
+    duration_ms: float
+    route: str | None
+    database: str
+    executemany: bool = False
+    logged_at: str = field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc).isoformat()
+    )
+    plan: list[str] | None = None
+    # Kept out of the log entry, only used to run EXPLAIN
+    url: str = field(default="", repr=False)
+    raw_parameters: object = field(default=None, repr=False)
+
+
+def redact(parameters) -> list:
+    """Keep numbers, booleans and NULLs, which are ids and flags, and hide
+    everything else (names, emails, password hashes, tokens)."""
+    if parameters is None:
+        return []
+    if isinstance(parameters, dict):
+        parameters = list(parameters.values())
+    return [
+        value if value is None or isinstance(value, (bool, int, float)) else REDACTED
+        for value in parameters
+    ]
+
+
+class SlowQueryLog:
+    def __init__(self, maxsize: int = QUEUE_SIZE):
+        self.queue: queue.Queue[SlowQuery | None] = queue.Queue(maxsize=maxsize)
+        self.recent: deque[dict] = deque(maxlen=RECENT_SIZE)
+        self.dropped = 0
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        # Only touched from the worker thread
+        self._engines: dict[str, Engine] = {}
+
+    def submit(self, entry: SlowQuery):
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # Never make the request wait for the log
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="slow-query-log", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            entry = self.queue.get()
+            try:
+                if entry is None:
+                    return
+                self._write(entry)
+            except Exception:
+                logger.exception("Could not write slow query entry")
+            finally:
+                self.queue.task_done()
+
+    def _write(self, entry: SlowQuery):
+        if get_slow_query_explain() and not entry.executemany:
+            entry.plan = self.explain(entry.url, entry.statement, entry.raw_parameters)
+        record = asdict(entry)
+        del record["url"], record["raw_parameters"]
+        self.recent.append(record)
+        logger.warning(
+            "Slow query %.1f ms on %s: %s", entry.duration_ms, entry.route, record
+        )
+
+    def explain(self, url: str, statement: str, parameters) -> list[str]:
+        engine = self._engines.get(url)
+        if engine is None:
+            engine = self._engines[url] = get_explain_engine(url)
+        if engine.dialect.name == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            prefix = "EXPLAIN "
+        try:
+            with engine.connect() as connection:
+                rows = connection.exec_driver_sql(prefix + statement, parameters or ())
+                return [str(row[-1]) for row in rows]
+        except Exception as exc:
+            return [f"EXPLAIN failed: {exc}"]
+
+    def flush(self):
+        """Block until every queued entry has been written."""
+        self.queue.join()
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+        for engine in self._engines.values():
+            engine.dispose()
+        self._engines.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def get_explain_engine(db_url: str):
+    url = make_url(db_url)
+    drivername = _SYNC_DRIVERS.get(url.drivername, url.drivername)
+    return create_engine(
+        url.set(drivername=drivername),
+        poolclass=NullPool,
+        execution_options={_SKIP_OPTION: True},
+    )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _log_slow_statement(conn, cursor, statement, parameters, context, executemany):
+    threshold = get_slow_query_threshold_ms()
+    elapsed_ms = conn.info["query_elapsed"] * 1000
+    if threshold <= 0 or elapsed_ms < threshold:
+        return
+    if conn.get_execution_options().get(_SKIP_OPTION):
+        return
+    stats = get_query_stats()
+    request = stats.request if stats is not None else None
+    slow_query_log.submit(
+        SlowQuery(
+            statement=statement,
+            parameters=[] if executemany else redact(parameters),
+            duration_ms=round(elapsed_ms, 3),
+            route=f"{request.method} {get_route_path(request)}" if request else None,
+            database=conn.engine.url.render_as_string(),
+            executemany=executemany,
+            url=conn.engine.url.render_as_string(hide_password=False),
+            raw_parameters=None if executemany else parameters,
+        )
+    )
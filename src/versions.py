@@ -0,0 +1,152 @@
+"""Per-table version counters, conditional GETs and catalog cache freshness.
+
+Every write to a catalog table bumps the table's row in ``table_version`` in
+the same transaction. GETs build a strong ETag from the versions of the
+tables their response is made of, so a client that already has the current
+representation gets ``304 Not Modified`` after one primary-key read, without
+the rows being loaded or serialized. The ETag also carries the request's
+path and query, so different resources or pages never share one, and a
+single resource is only answered 304 once it is known to exist.
+
+Sales only change product stock, and bump a separate ``stock`` counter that
+nothing but the product ETags is built from.
+
+The same rows keep ``catalog_cache`` coherent across workers: a commit that
+bumped a table invalidates it in this process right away, and other
+processes notice the new version when they next read the versions, either
+for an ETag or when polling every ``CATALOG_CACHE_POLL_MS``.
+"""
+
+import hashlib
+import time
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from sqlmodel import Field, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.cache import MISSING, catalog_cache
+from src.config import get_catalog_cache_poll_ms, get_catalog_cache_size
+from src.database import get_async_session
+
+# "stock" counts stock changes from sales, which bump it instead of
+# "product": only product responses show stock, so category, brand and
+# provider ETags and cached entries survive checkouts
+VERSIONED_TABLES = ("product", "category", "brand", "provider", "stock")
+
+
+class TableVersion(SQLModel, table=True):
+    __tablename__ = "table_version"
+
+    name: str = Field(primary_key=True)
+    version: int = Field(default=0)
+
+
+async def bump_version(session: AsyncSession, table: str):
+    """Bump ``table``'s version inside the session's transaction; call it
+    before the commit that writes the rows."""
+    result = await session.exec(
+        update(TableVersion)
+        .where(TableVersion.name == table)
+        .values(version=TableVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        # Migration 5 seeds the rows, databases built by create_all alone
+        # get theirs on the first write
+        session.add(TableVersion(name=table, version=1))
+    session.info.setdefault("bumped_tables", set()).add(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tables(session):
+    for table in session.info.pop("bumped_tables", ()):
+        catalog_cache.invalidate(table)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back_tables(session, previous_transaction):
+    session.info.pop("bumped_tables", None)
+
+
+async def get_versions(session: AsyncSession) -> dict:
+    """Read every table's version and let the cache catch up with them."""
+    rows = await session.exec(
+        select(TableVersion.name, TableVersion.version).where(
+            TableVersion.name.in_(VERSIONED_TABLES)
+        )
+    )
+    versions = dict(rows.all())
+    catalog_cache.observe(versions)
+    catalog_cache.polled_at = time.monotonic()
+    return versions
+
+
+async def cached(session: AsyncSession, key: tuple, tables: tuple[str, ...], load):
+    """Return the cached value for ``key``, built from ``tables``, or await
+    ``load()`` and cache its result."""
+    if get_catalog_cache_size() <= 0:
+        return await load()
+    poll_interval = get_catalog_cache_poll_ms() / 1000
+    if time.monotonic() - catalog_cache.polled_at >= poll_interval:
+        await get_versions(session)
+    value = catalog_cache.get(key)
+    if value is MISSING:
+        generations = catalog_cache.generations(tables)
+        value = await load()
+        catalog_cache.put(key, value, tables, generations)
+    return value
+
+
+def make_etag(tables: tuple[str, ...], versions: dict, scope: str = "") -> str:
+    """ETag for ``tables`` at ``versions``; ``scope`` is the URL (path and
+    query) of the representation."""
+    digest = hashlib.blake2b(scope.encode(), digest_size=8).hexdigest()
+    counters = "-".join(str(versions.get(table, 0)) for table in tables)
+    return f'"{digest}-{counters}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison, so W/"1-2" matches "1-2"
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+async def _exists(session: AsyncSession, resource: type[SQLModel], path_params):
+    try:
+        (resource_id,) = (int(value) for value in path_params.values())
+    except ValueError:
+        return False
+    row = await session.exec(select(resource.id).where(resource.id == resource_id))
+    return row.first() is not None
+
+
+def conditional_get(*tables: str, resource: type[SQLModel] | None = None):
+    """Dependency for GETs whose response is built from ``tables``.
+
+    It sets the ETag for their current versions and answers 304 before the
+    handler runs when the client sent it back in ``If-None-Match``. For a
+    single row, ``resource`` is its model and the id its path parameter: the
+    304 (including for ``*``) then costs one more primary-key read to make
+    sure the row still exists, otherwise the handler answers 404."""
+
+    async def check_etag(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_async_session),
+    ):
+        scope = request.url.path
+        if request.url.query:
+            scope += "?" + request.url.query
+        etag = make_etag(tables, await get_versions(session), scope)
+        if etag_matches(request.headers.get("if-none-match"), etag) and (
+            resource is None or await _exists(session, resource, request.path_params)
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        response.headers["ETag"] = etag
+
+    return check_etag
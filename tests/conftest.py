@@ -1,14 +1,33 @@
 import pytest
+import pytest_asyncio
 import asyncio
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.pool import StaticPool
 import tempfile
 import os
 from unittest.mock import patch
+from contextlib import contextmanager
 
 from src.app import create_app
-from src.database import get_session
+from src.cache import catalog_cache
+from src.config import get_auth_settings, get_rate_limit_settings
+from src.idempotency import response_cache
+from src.routes.auth.revocation import revocation_list
+from src.routes.auth.token_cache import token_cache
+from src.routes.auth.user_cache import username_cache
+from src.instrumentation import capture_queries
+from src.rate_limit import rate_limiter
+from src.database import (
+    get_async_db_url,
+    get_async_session,
+    get_engine,
+    get_async_engine,
+    get_async_read_engine,
+)
 
 
 @pytest.fixture(scope="session")
@@ -54,11 +73,48 @@ def test_session(test_db):
 
 
 @pytest.fixture
-def client(test_session):
+def async_test_db(test_db):
+    """Create an async engine over the same temporary SQLite file."""
+    # NullPool: aiosqlite connections must not outlive the loop that opened them
+    engine = create_async_engine(
+        get_async_db_url(test_db.url.render_as_string()), poolclass=NullPool
+    )
+    yield engine
+    engine.sync_engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_test_session(async_test_db):
+    """Create an async test database session."""
+    async with AsyncSession(async_test_db, expire_on_commit=False) as session:
+        yield session
+
+
+def _clear_process_caches():
+    for factory in (
+        get_engine,
+        get_async_engine,
+        get_async_read_engine,
+        get_auth_settings,
+        get_rate_limit_settings,
+    ):
+        factory.cache_clear()
+    # Every test gets a fresh database, cached catalog rows must not leak
+    catalog_cache.clear()
+    response_cache.clear()
+    token_cache.clear()
+    revocation_list.clear()
+    username_cache.clear()
+    rate_limiter.clear()
+
+
+@pytest.fixture
+def client(test_db, async_test_db):
     """Create a test client with dependency override."""
 
-    def get_test_session():
-        yield test_session
+    async def get_test_session():
+        async with AsyncSession(async_test_db, expire_on_commit=False) as session:
+            yield session
 
     # Mock environment variables for testing
     with patch.dict(
@@ -67,12 +123,23 @@ def client(test_session):
             "SECRET_KEY": "test_secret_key_for_testing_only",
             "ALGORITHM": "HS256",
             "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+            # Every client registers and logs in a user, the minimum cost
+            # keeps that from dominating the suite
+            "BCRYPT_ROUNDS": "4",
+            # No background revocation sync adding queries to query budgets
+            "REVOCATION_SYNC_MS": "0",
+            # Tests log in far more often than any client should; the rate
+            # limit tests turn it back on
+            "RATE_LIMIT_ENABLED": "false",
+            "RATE_LIMIT_DB": ":memory:",
             "ALLOWED_ORIGIN": "http://localhost:3000",
-            "DB_URL": "sqlite:///test.db",  # This will be overridden by test_db fixture
+            # Startup migrates DB_URL, so point it at the temporary database
+            "DB_URL": test_db.url.render_as_string(),
         },
     ):
+        _clear_process_caches()
         app = create_app()
-        app.dependency_overrides[get_session] = get_test_session
+        app.dependency_overrides[get_async_session] = get_test_session
 
         with TestClient(app) as test_client:
             seed_user = {
@@ -91,6 +158,25 @@ def client(test_session):
                 token = token_response.json()["access_token"]
                 test_client.headers.update({"Authorization": f"Bearer {token}"})
             yield test_client
+        _clear_process_caches()
+
+
+@pytest.fixture
+def query_budget():
+    """Fail the test if the block runs more SQL statements than allowed.
+
+    Usage: ``with query_budget(3): client.get("/brands")``"""
+
+    @contextmanager
+    def budget(max_queries: int):
+        with capture_queries() as stats:
+            yield stats
+        shapes = "\n".join(f"{n}x {shape}" for shape, n in stats.shapes.items())
+        assert stats.count <= max_queries, (
+            f"{stats.count} queries, budget is {max_queries}:\n{shapes}"
+        )
+
+    return budget
 
 
 @pytest.fixture
@@ -148,6 +234,28 @@ def sample_customer_data():
     }
 
 
+@pytest.fixture
+def catalog_product(client, sample_provider_data, sample_customer_data):
+    """A product with 10 units in stock, with its brand, category and
+    provider, and a customer to sell it to."""
+    client.post("/brands", json={"name": "Acme"})
+    client.post("/categories", json={"name": "Tools"})
+    client.post("/providers", json=sample_provider_data)
+    client.post("/customers", json=sample_customer_data)
+    return client.post(
+        "/products",
+        json={
+            "name": "Hammer",
+            "description": "Steel",
+            "stock": 10,
+            "price": 12.5,
+            "brand_name": "Acme",
+            "category_name": "Tools",
+            "provider_name": sample_provider_data["name"],
+        },
+    ).json()
+
+
 @pytest.fixture
 def authenticated_headers(client, sample_user_data):
     """Get authentication headers for testing protected endpoints."""
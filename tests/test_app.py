@@ -1,3 +1,9 @@
+from fastapi.testclient import TestClient
+from src.app import create_app
+from src.config import get_bcrypt_workers
+from src.routes.auth.passwords import password_pool
+
+
 class TestApp:
     """Test cases for the main FastAPI application."""
 
@@ -19,6 +25,16 @@ class TestApp:
         # The fact that client fixture works means lifespan startup was successful
         assert True
 
+    def test_lifespan_starts_and_stops_the_password_pool(self, client):
+        """Test that the bcrypt workers are up before the first request and
+        shut down with the app."""
+        assert len(password_pool._executor._processes) == get_bcrypt_workers()
+
+        with TestClient(create_app()):
+            pass
+
+        assert password_pool._executor is None
+
 
 class TestHealthCheck:
     """Test cases for application health and basic functionality."""
@@ -1,4 +1,16 @@
+import asyncio
+import datetime
+import os
+import pytest
+from unittest.mock import patch
 from fastapi import status
+from jose import jwt
+from sqlmodel import select
+from src.database import get_async_engine, get_async_read_engine
+from src.routes.auth.models import RevokedToken
+from src.routes.auth.passwords import password_pool
+from src.routes.auth.revocation import revocation_list
+from src.routes.auth.user_cache import username_cache
 
 
 class TestAuthEndpoints:
@@ -22,6 +34,26 @@ class TestAuthEndpoints:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "already registered" in response.json()["detail"]
 
+    def test_duplicate_username_is_caught_by_the_unique_index(
+        self, client, sample_user_data
+    ):
+        """Test that a duplicate missed by the username cache still fails."""
+        client.post("/auth/register", json=sample_user_data)
+        username_cache.clear()
+
+        response = client.post("/auth/register", json=sample_user_data)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "already registered" in response.json()["detail"]
+
+    def test_register_is_a_single_insert(self, client, sample_user_data, query_budget):
+        """Test that registration does not look the username up first."""
+        with query_budget(1) as stats:
+            response = client.post("/auth/register", json=sample_user_data)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert all(shape.startswith("INSERT") for shape in stats.shapes)
+
     def test_register_user_invalid_data(self, client):
         """Test registration with invalid data."""
         invalid_data = {"username": ""}  # Missing password
@@ -63,6 +95,43 @@ class TestAuthEndpoints:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
         assert "Incorrect username or password" in response.json()["detail"]
 
+    def test_unknown_username_is_cached(self, client, query_budget):
+        """Test that repeated logins for an unknown user skip the database."""
+        login_data = {"username": "nobody", "password": "guess"}
+        client.post("/auth/token", data=login_data)
+
+        with query_budget(0):
+            response = client.post("/auth/token", data=login_data)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.get("/metrics/usernames").json()["hits"] >= 1
+
+    def test_login_right_after_register(self, client, sample_user_data):
+        """Test that a cached miss does not lock out a user who just registered."""
+        login_data = {
+            "username": sample_user_data["username"],
+            "password": sample_user_data["password"],
+        }
+        response = client.post("/auth/token", data=login_data)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        client.post("/auth/register", json=sample_user_data)
+        response = client.post("/auth/token", data=login_data)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_taken_username_clears_a_cached_miss(self, client, sample_user_data):
+        """Test that a miss cached before another worker registered the name
+        is dropped when registration finds the name taken."""
+        client.post("/auth/register", json=sample_user_data)
+        username_cache.put(sample_user_data["username"], None)
+
+        response = client.post("/auth/register", json=sample_user_data)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.post("/auth/token", data=sample_user_data)
+        assert response.status_code == status.HTTP_200_OK
+
     def test_login_wrong_password(self, client, sample_user_data):
         """Test login with wrong password."""
         # Register user first
@@ -78,6 +147,21 @@ class TestAuthEndpoints:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
         assert "Incorrect username or password" in response.json()["detail"]
 
+    def test_login_when_password_pool_is_saturated(self, client, sample_user_data):
+        """Test that a login beyond the hashing queue gets a fast 503."""
+        client.post("/auth/register", json=sample_user_data)
+        login_data = {
+            "username": sample_user_data["username"],
+            "password": sample_user_data["password"],
+        }
+
+        with patch.object(password_pool, "in_flight", 10**6):
+            response = client.post("/auth/token", data=login_data)
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+        assert client.get("/metrics/passwords").json()["rejected"] >= 1
+
     def test_login_missing_credentials(self, client):
         """Test login with missing credentials."""
         response = client.post("/auth/token", data={})
@@ -149,3 +233,113 @@ class TestAuthIntegration:
         # This would require mocking time or using very short expiry times
         # Implementation depends on how token expiry is handled
         pass
+
+
+class TestRefreshTokens:
+    """Test cases for refresh tokens and session revocation."""
+
+    @pytest.fixture
+    def tokens(self, client, sample_user_data):
+        client.post("/auth/register", json=sample_user_data)
+        response = client.post(
+            "/auth/token",
+            data={
+                "username": sample_user_data["username"],
+                "password": sample_user_data["password"],
+            },
+        )
+        return response.json()
+
+    def _get_customers(self, client, access_token):
+        return client.get(
+            "/customers", headers={"Authorization": f"Bearer {access_token}"}
+        )
+
+    def test_login_issues_a_refresh_token(self, tokens):
+        """Test that the login response carries both tokens."""
+        assert tokens["token_type"] == "bearer"
+        assert tokens["access_token"]
+        assert tokens["refresh_token"]
+
+    def test_refresh_skips_password_verification(self, client, tokens):
+        """Test that a refresh issues a working access token without bcrypt."""
+        completed = password_pool.completed
+
+        response = client.post(
+            "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        access_token = response.json()["access_token"]
+        assert self._get_customers(client, access_token).status_code == 200
+        assert password_pool.completed == completed
+
+    def test_tokens_are_not_interchangeable(self, client, tokens):
+        """Test that refresh tokens are not bearer tokens and vice versa."""
+        as_bearer = self._get_customers(client, tokens["refresh_token"])
+        as_refresh = client.post(
+            "/auth/refresh", json={"refresh_token": tokens["access_token"]}
+        )
+
+        assert as_bearer.status_code == status.HTTP_401_UNAUTHORIZED
+        assert as_refresh.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_revoke_ends_the_session(self, client, tokens, test_session):
+        """Test that a revoked session can neither refresh nor authenticate."""
+        # Verified and cached before the revocation
+        assert self._get_customers(client, tokens["access_token"]).status_code == 200
+
+        response = client.post(
+            "/auth/revoke", json={"refresh_token": tokens["refresh_token"]}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        refresh = client.post(
+            "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+        assert refresh.status_code == status.HTTP_401_UNAUTHORIZED
+        customers = self._get_customers(client, tokens["access_token"])
+        assert customers.status_code == status.HTTP_401_UNAUTHORIZED
+        assert len(test_session.exec(select(RevokedToken)).all()) == 1
+
+    def test_revocation_check_runs_no_queries(self, client, tokens, query_budget):
+        """Test that the revocation check is answered from memory."""
+        with query_budget(1):
+            response = self._get_customers(client, tokens["access_token"])
+
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.asyncio
+    async def test_revocation_from_another_worker(
+        self, client, tokens, test_session, async_test_session
+    ):
+        """Test that a revocation row from another worker applies after a sync."""
+        sid = jwt.get_unverified_claims(tokens["refresh_token"])["sid"]
+        test_session.add(
+            RevokedToken(session_id=sid, expires_at=datetime.datetime(2100, 1, 1))
+        )
+        test_session.commit()
+        assert self._get_customers(client, tokens["access_token"]).status_code == 200
+
+        await revocation_list.sync(async_test_session)
+
+        response = self._get_customers(client, tokens["access_token"])
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.asyncio
+    async def test_revocation_sync_does_not_need_the_writer(self, test_db):
+        """Test that the revocation list loads while a write holds the lock."""
+        env = {"DB_URL": test_db.url.render_as_string(), "REVOCATION_SYNC_MS": "60000"}
+        with patch.dict(os.environ, env):
+            get_async_engine.cache_clear()
+            get_async_read_engine.cache_clear()
+            try:
+                async with get_async_engine().begin() as connection:
+                    await connection.exec_driver_sql("SELECT 1")
+                    await asyncio.wait_for(revocation_list.start(), timeout=2)
+                await revocation_list.stop()
+            finally:
+                await get_async_engine().dispose()
+                await get_async_read_engine().dispose()
+                get_async_engine.cache_clear()
+                get_async_read_engine.cache_clear()
@@ -1,8 +1,11 @@
+import asyncio
 import pytest
+from fastapi import HTTPException
 from unittest.mock import patch
 from datetime import timedelta
 from jose import jwt
 
+from src.config import AuthSettings
 from src.routes.auth.models import User, UserLogin
 from src.routes.auth.operations import (
     create_user,
@@ -11,7 +14,14 @@ from src.routes.auth.operations import (
     create_access_token,
     verify_token,
     get_current_user,
-    pwd_context,
+)
+from src.routes.auth.revocation import BloomFilter
+from src.routes.auth.token_cache import VerifiedTokenCache, token_cache
+from src.bcrypt_worker import pwd_context
+from src.routes.auth.passwords import hash_password, password_pool, verify_password
+
+TEST_SETTINGS = AuthSettings(
+    secret_key="test_secret_key", algorithm="HS256", access_token_expire_minutes=30
 )
 
 
@@ -37,41 +47,49 @@ class TestAuthModels:
 class TestAuthOperations:
     """Test cases for authentication operations."""
 
-    def test_create_user(self, test_session):
+    @pytest.mark.asyncio
+    async def test_create_user(self, async_test_session):
         """Test user creation operation."""
         user_login = UserLogin(username="newuser", password="password123")
-        result = create_user(user_login, test_session)
+        result = await create_user(user_login, async_test_session)
 
         assert result == "complete"
 
         # Verify user was created in database
         from sqlalchemy import text
 
-        created_user = test_session.exec(
-            text("SELECT * FROM user WHERE username = 'newuser'")
+        created_user = (
+            await async_test_session.exec(
+                text("SELECT * FROM user WHERE username = 'newuser'")
+            )
         ).first()
         assert created_user is not None
 
-    def test_get_user_by_username_existing(self, test_session):
+    @pytest.mark.asyncio
+    async def test_get_user_by_username_existing(self, async_test_session):
         """Test getting existing user by username."""
         # Create a test user first
         test_user = User(
             username="existinguser", hashed_password="hashedpass", role="user"
         )
-        test_session.add(test_user)
-        test_session.commit()
+        async_test_session.add(test_user)
+        await async_test_session.commit()
 
         # Test retrieval
-        retrieved_user = get_user_by_username("existinguser", test_session)
+        retrieved_user = await get_user_by_username("existinguser", async_test_session)
         assert retrieved_user is not None
         assert retrieved_user.username == "existinguser"
 
-    def test_get_user_by_username_nonexistent(self, test_session):
+    @pytest.mark.asyncio
+    async def test_get_user_by_username_nonexistent(self, async_test_session):
         """Test getting non-existent user by username."""
-        retrieved_user = get_user_by_username("nonexistentuser", test_session)
+        retrieved_user = await get_user_by_username(
+            "nonexistentuser", async_test_session
+        )
         assert retrieved_user is None
 
-    def test_authenticate_user_success(self, test_session):
+    @pytest.mark.asyncio
+    async def test_authenticate_user_success(self, async_test_session):
         """Test successful user authentication."""
         # Create user with known password
         password = "testpassword"
@@ -80,15 +98,18 @@ class TestAuthOperations:
         test_user = User(
             username="authuser", hashed_password=hashed_password, role="user"
         )
-        test_session.add(test_user)
-        test_session.commit()
+        async_test_session.add(test_user)
+        await async_test_session.commit()
 
         # Test authentication
-        authenticated_user = authenticate_user("authuser", password, test_session)
+        authenticated_user = await authenticate_user(
+            "authuser", password, async_test_session
+        )
         assert authenticated_user is not False
         assert authenticated_user.username == "authuser"
 
-    def test_authenticate_user_wrong_password(self, test_session):
+    @pytest.mark.asyncio
+    async def test_authenticate_user_wrong_password(self, async_test_session):
         """Test authentication with wrong password."""
         # Create user
         hashed_password = pwd_context.hash("correctpassword")
@@ -96,21 +117,25 @@ class TestAuthOperations:
         test_user = User(
             username="authuser2", hashed_password=hashed_password, role="user"
         )
-        test_session.add(test_user)
-        test_session.commit()
+        async_test_session.add(test_user)
+        await async_test_session.commit()
 
         # Test authentication with wrong password
-        result = authenticate_user("authuser2", "wrongpassword", test_session)
+        result = await authenticate_user(
+            "authuser2", "wrongpassword", async_test_session
+        )
         assert result is False
 
-    def test_authenticate_user_nonexistent(self, test_session):
+    @pytest.mark.asyncio
+    async def test_authenticate_user_nonexistent(self, async_test_session):
         """Test authentication with non-existent user."""
-        result = authenticate_user("nonexistentuser", "anypassword", test_session)
+        result = await authenticate_user(
+            "nonexistentuser", "anypassword", async_test_session
+        )
         assert result is False
 
-    @patch("src.routes.auth.operations.get_secret_key", return_value="test_secret_key")
-    @patch("src.routes.auth.operations.get_algorithm", return_value="HS256")
-    def test_create_access_token(self, mock_algo, mock_key):
+    @patch("src.routes.auth.operations.get_auth_settings", return_value=TEST_SETTINGS)
+    def test_create_access_token(self, mock_settings):
         """Test access token creation."""
         data = {"sub": "testuser", "role": "user"}
         token = create_access_token(data)
@@ -121,9 +146,8 @@ class TestAuthOperations:
         assert decoded["role"] == "user"
         assert "exp" in decoded
 
-    @patch("src.routes.auth.operations.get_secret_key", return_value="test_secret_key")
-    @patch("src.routes.auth.operations.get_algorithm", return_value="HS256")
-    def test_create_access_token_with_expiry(self, mock_algo, mock_key):
+    @patch("src.routes.auth.operations.get_auth_settings", return_value=TEST_SETTINGS)
+    def test_create_access_token_with_expiry(self, mock_settings):
         """Test access token creation with custom expiry."""
         data = {"sub": "testuser", "role": "user"}
         expires_delta = timedelta(minutes=60)
@@ -134,9 +158,8 @@ class TestAuthOperations:
         assert decoded["sub"] == "testuser"
         assert "exp" in decoded
 
-    @patch("src.routes.auth.operations.get_secret_key", return_value="test_secret_key")
-    @patch("src.routes.auth.operations.get_algorithm", return_value="HS256")
-    def test_verify_token_valid(self, mock_algo, mock_key):
+    @patch("src.routes.auth.operations.get_auth_settings", return_value=TEST_SETTINGS)
+    def test_verify_token_valid(self, mock_settings):
         """Test token verification with valid token."""
         data = {"sub": "testuser", "role": "user"}
         token = create_access_token(data)
@@ -145,23 +168,22 @@ class TestAuthOperations:
         assert payload["sub"] == "testuser"
         assert payload["role"] == "user"
 
-    @patch("src.routes.auth.operations.get_secret_key", return_value="test_secret_key")
-    @patch("src.routes.auth.operations.get_algorithm", return_value="HS256")
-    def test_verify_token_invalid(self, mock_algo, mock_key):
+    @patch("src.routes.auth.operations.get_auth_settings", return_value=TEST_SETTINGS)
+    def test_verify_token_invalid(self, mock_settings):
         """Test token verification with invalid token."""
         invalid_token = "invalid.token.here"
 
         with pytest.raises(Exception):  # Should raise HTTPException
             verify_token(invalid_token)
 
-    @patch("src.routes.auth.operations.get_secret_key", return_value="test_secret_key")
-    @patch("src.routes.auth.operations.get_algorithm", return_value="HS256")
-    def test_get_current_user(self, mock_algo, mock_key):
+    @patch("src.routes.auth.operations.get_auth_settings", return_value=TEST_SETTINGS)
+    @pytest.mark.asyncio
+    async def test_get_current_user(self, mock_settings):
         """Test getting current user from token."""
         data = {"sub": "testuser", "role": "admin"}
         token = create_access_token(data)
 
-        username, role = get_current_user(token)
+        username, role = await get_current_user(token)
         assert username == "testuser"
         assert role == "admin"
 
@@ -182,3 +204,111 @@ class TestPasswordHashing:
 
         # Should fail with wrong password
         assert pwd_context.verify("wrongpassword", hashed) is False
+
+    @pytest.mark.asyncio
+    async def test_pool_hashes_with_configured_rounds(self):
+        """Test that the worker pool hashes at BCRYPT_ROUNDS and verifies."""
+        with patch.dict("os.environ", {"BCRYPT_ROUNDS": "5"}):
+            hashed = await hash_password("mysecretpassword")
+
+        assert hashed.startswith("$2b$05$")
+        assert await verify_password("mysecretpassword", hashed) is True
+        assert await verify_password("wrongpassword", hashed) is False
+
+    @pytest.mark.asyncio
+    async def test_saturated_pool_answers_503(self):
+        """Test that work beyond the workers and queue is refused at once."""
+        with patch.dict(
+            "os.environ",
+            {"BCRYPT_ROUNDS": "4", "BCRYPT_WORKERS": "1", "BCRYPT_QUEUE_DEPTH": "0"},
+        ):
+            rejected = password_pool.rejected
+            results = await asyncio.gather(
+                hash_password("first"), hash_password("second"), return_exceptions=True
+            )
+
+        assert isinstance(results[0], str)
+        assert isinstance(results[1], HTTPException)
+        assert results[1].status_code == 503
+        assert results[1].headers["Retry-After"] == "1"
+        assert password_pool.rejected == rejected + 1
+        assert password_pool.in_flight == 0
+
+
+class TestVerifiedTokenCache:
+    """Test cases for the cache of verified access tokens."""
+
+    @patch("src.routes.auth.operations.get_auth_settings", return_value=TEST_SETTINGS)
+    @pytest.mark.asyncio
+    async def test_repeated_token_is_not_decoded_again(self, mock_settings):
+        """Test that a verified token skips jwt.decode until it expires."""
+        token = create_access_token({"sub": "cached", "role": "user"})
+        token_cache.clear()
+
+        with patch("src.routes.auth.operations.jwt.decode", wraps=jwt.decode) as decode:
+            first = await get_current_user(token)
+            second = await get_current_user(token)
+
+        assert first == second == ("cached", "user")
+        assert decode.call_count == 1
+        token_cache.clear()
+
+    def test_entries_expire_with_the_token(self):
+        """Test that an entry is dropped once the token's exp has passed."""
+        cache = VerifiedTokenCache()
+        cache.put("expired", ("someone", "user"), exp=1)
+        cache.put("valid", ("someone", "user"), exp=2**40)
+
+        assert cache.get("expired") is None
+        assert cache.get("valid") == ("someone", "user")
+
+    def test_size_is_bounded(self):
+        """Test that the least recently used token goes first."""
+        cache = VerifiedTokenCache()
+        with patch.dict("os.environ", {"AUTH_TOKEN_CACHE_SIZE": "2"}):
+            for token in ("a", "b"):
+                cache.put(token, (token, "user"), exp=2**40)
+            cache.get("a")
+            cache.put("c", ("c", "user"), exp=2**40)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == ("a", "user")
+
+    def test_tokens_are_stored_as_digests(self):
+        """Test that the cache does not keep the bearer tokens themselves."""
+        cache = VerifiedTokenCache()
+        cache.put("secret.bearer.token", ("someone", "user"), exp=2**40)
+
+        assert all(b"secret" not in key for key in cache._entries)
+
+    @patch("src.routes.auth.operations.get_auth_settings", return_value=TEST_SETTINGS)
+    @pytest.mark.asyncio
+    async def test_invalid_token_is_not_cached(self, mock_settings):
+        """Test that a token failing verification is refused every time."""
+        for _ in range(2):
+            with pytest.raises(HTTPException) as error:
+                await get_current_user("invalid.token.here")
+            assert error.value.status_code == 401
+        assert token_cache.get("invalid.token.here") is None
+
+
+class TestBloomFilter:
+    """Test cases for the Bloom filter in front of the revocation set."""
+
+    def test_no_false_negatives(self):
+        """Test that every added id is reported as present."""
+        bloom = BloomFilter(1000, 0.01)
+        ids = [f"session-{i}" for i in range(1000)]
+        for session_id in ids:
+            bloom.add(session_id)
+
+        assert all(session_id in bloom for session_id in ids)
+
+    def test_false_positive_rate_at_capacity(self):
+        """Test that a full filter stays near its false positive rate."""
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f"session-{i}")
+
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 300
@@ -0,0 +1,111 @@
+import pytest
+from unittest.mock import patch
+from fastapi import status
+from sqlalchemy import text
+from src.cache import MISSING, CatalogCache, catalog_cache
+from src.instrumentation import capture_queries
+from src.routes.brands.models import Brand
+from src.routes.brands.operations import get_brand_by_name
+
+
+class TestCatalogCache:
+    """Test cases for the in-process catalog cache."""
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry goes first."""
+        cache = CatalogCache()
+        with patch.dict("os.environ", {"CATALOG_CACHE_SIZE": "2"}):
+            for key in ("a", "b"):
+                cache.put((key,), key, ("brand",), cache.generations(("brand",)))
+            cache.get(("a",))
+            cache.put(("c",), "c", ("brand",), cache.generations(("brand",)))
+
+        assert cache.get(("b",)) is MISSING
+        assert cache.get(("a",)) == "a"
+        assert cache.evictions == 1
+
+    def test_expired_entries_are_misses(self):
+        """Test that an entry past its TTL is reloaded."""
+        cache = CatalogCache()
+        cache.put(("a",), "a", ("brand",), cache.generations(("brand",)))
+
+        with patch("src.cache.time.monotonic", return_value=float("inf")):
+            assert cache.get(("a",)) is MISSING
+        assert (cache.hits, cache.misses) == (0, 1)
+
+    def test_load_racing_an_invalidation_is_not_stored(self):
+        """Test that a value loaded before an invalidation is discarded."""
+        cache = CatalogCache()
+        generations = cache.generations(("brand", "product"))
+        cache.invalidate("product")
+        cache.put(("brands",), ["stale"], ("brand", "product"), generations)
+
+        assert cache.get(("brands",)) is MISSING
+
+    def test_new_shared_version_invalidates(self):
+        """Test that a version bumped by another worker drops the table."""
+        cache = CatalogCache()
+        cache.observe({"brand": 1, "product": 1})
+        cache.put(("brand", "Acme"), {}, ("brand",), cache.generations(("brand",)))
+        cache.put(("categories",), [], ("category",), cache.generations(("category",)))
+
+        cache.observe({"brand": 2, "product": 1})
+
+        assert cache.get(("brand", "Acme")) is MISSING
+        assert cache.get(("categories",)) == []
+
+    def test_list_is_served_from_cache(self, client, query_budget):
+        """Test that a repeated list costs only the version read."""
+        client.post("/brands", json={"name": "Acme"})
+        client.get("/brands")
+
+        with query_budget(1):
+            response = client.get("/brands")
+
+        assert [brand["name"] for brand in response.json()] == ["Acme"]
+        stats = client.get("/metrics/cache").json()
+        assert stats["hits"] >= 1
+        assert stats["misses"] >= 1
+
+    def test_local_write_invalidates(self, client):
+        """Test that a write through the operations is visible right away."""
+        client.post("/brands", json={"name": "Acme"})
+        client.get("/brands")
+
+        client.post("/brands", json={"name": "Globex"})
+
+        names = [brand["name"] for brand in client.get("/brands").json()]
+        assert names == ["Acme", "Globex"]
+
+    def test_write_from_another_worker_invalidates(self, client, test_session):
+        """Test that a bump of the shared version row reaches this process."""
+        client.post("/brands", json={"name": "Acme"})
+        client.get("/brands")
+
+        # What another worker's create_brand commits
+        test_session.add(Brand(name="Globex"))
+        test_session.exec(
+            text("UPDATE table_version SET version = version + 1 WHERE name = 'brand'")
+        )
+        test_session.commit()
+
+        response = client.get("/brands")
+        assert response.status_code == status.HTTP_200_OK
+        assert [brand["name"] for brand in response.json()] == ["Acme", "Globex"]
+
+    @pytest.mark.asyncio
+    async def test_lookup_by_name(self, async_test_session):
+        """Test that lookups by name are cached and copied per caller."""
+        catalog_cache.clear()
+        async_test_session.add(Brand(name="Acme"))
+        await async_test_session.commit()
+
+        with patch.dict("os.environ", {"CATALOG_CACHE_POLL_MS": "60000"}):
+            first = await get_brand_by_name("Acme", async_test_session)
+            with capture_queries() as stats:
+                second = await get_brand_by_name("Acme", async_test_session)
+
+        assert stats.count == 0
+        assert second.name == "Acme"
+        assert second is not first
+        catalog_cache.clear()
@@ -1,5 +1,29 @@
+import os
+import pytest
+from fastapi import Depends
+from unittest.mock import patch
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session
-from src.database import init_db, get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.database import (
+    init_db,
+    get_session,
+    get_async_session,
+    get_async_db_url,
+    get_pool_options,
+    get_pool_status,
+    warm_pool,
+    TimedAsyncQueuePool,
+    get_async_engine,
+    get_async_read_engine,
+    get_replica_engines,
+    get_engine_for_request,
+    PRIMARY_PIN_COOKIE,
+    AsyncSessionLocal,
+    UnitOfWorkRoute,
+)
+from starlette.requests import Request
 from src.routes.auth.models import User
 
 
@@ -25,6 +49,30 @@ class TestDatabase:
         users = session.exec(select(User)).all()
         assert isinstance(users, list)
 
+    @pytest.mark.asyncio
+    async def test_get_async_session_generator(self, test_db):
+        """Test that get_async_session yields a usable AsyncSession."""
+        session_gen = get_async_session()
+        session = await anext(session_gen)
+        assert isinstance(session, AsyncSession)
+
+        from sqlmodel import select
+
+        users = (await session.exec(select(User))).all()
+        assert isinstance(users, list)
+        await session_gen.aclose()
+
+    def test_get_async_db_url(self):
+        """Test that sync URLs are mapped to their async drivers."""
+        assert get_async_db_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+        assert (
+            get_async_db_url("postgresql://u:p@h/db") == "postgresql+psycopg://u:p@h/db"
+        )
+        assert (
+            get_async_db_url("postgresql+psycopg://u:p@h/db")
+            == "postgresql+psycopg://u:p@h/db"
+        )
+
     def test_database_crud_operations(self, test_session):
         """Test basic CRUD operations on the database."""
         # Create a test user
@@ -56,3 +104,241 @@ class TestDatabase:
 
         deleted_user = test_session.get(User, test_user.id)
         assert deleted_user is None
+
+
+class TestConnectionPool:
+    """Test cases for pool configuration and pool metrics."""
+
+    def test_pool_options_from_env(self):
+        """Test that pool settings are read from the environment."""
+        env = {
+            "DB_POOL_SIZE": "7",
+            "DB_MAX_OVERFLOW": "3",
+            "DB_POOL_TIMEOUT": "4",
+            "DB_POOL_RECYCLE": "600",
+            "DB_POOL_PRE_PING": "false",
+        }
+        with patch.dict(os.environ, env):
+            options = get_pool_options("sqlite:///./pool.db", TimedAsyncQueuePool)
+
+        assert options["pool_size"] == 7
+        assert options["max_overflow"] == 3
+        assert options["pool_timeout"] == 4
+        assert options["pool_recycle"] == 600
+        assert options["pool_pre_ping"] is False
+
+    def test_pool_options_invalid_env_falls_back(self):
+        """Test that invalid pool settings fall back to defaults."""
+        with patch.dict(os.environ, {"DB_POOL_SIZE": "zero"}):
+            options = get_pool_options("sqlite:///./pool.db", TimedAsyncQueuePool)
+
+        assert options["pool_size"] == 5
+
+    def test_pool_options_in_memory_sqlite(self):
+        """Test that in-memory SQLite keeps SQLAlchemy's single-connection pool."""
+        assert get_pool_options("sqlite://", TimedAsyncQueuePool) == {}
+
+    @pytest.mark.asyncio
+    async def test_warm_pool_and_status(self, test_db):
+        """Test that pre-warming leaves idle connections in the pool."""
+        db_url = get_async_db_url(test_db.url.render_as_string())
+        engine = create_async_engine(
+            db_url, **get_pool_options(db_url, TimedAsyncQueuePool)
+        )
+        try:
+            opened = await warm_pool(engine, connections=3)
+            status = get_pool_status(engine)
+
+            assert opened == 3
+            assert status["idle"] == 3
+            assert status["checked_out"] == 0
+            assert status["overflow"] == 0
+            assert status["wait"]["checkouts"] == 3
+
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                assert get_pool_status(engine)["checked_out"] == 1
+        finally:
+            await engine.dispose()
+
+    def test_pool_metrics_endpoint(self, client):
+        """Test that the pool metrics endpoint reports pool state."""
+        response = client.get("/metrics/db-pool")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert {"size", "checked_out", "idle", "overflow", "wait"} <= body.keys()
+
+
+def _make_request(method: str, cookies: str = "") -> Request:
+    headers = [(b"cookie", cookies.encode())] if cookies else []
+    return Request({"type": "http", "method": method, "headers": headers})
+
+
+class TestReplicaRouting:
+    """Test cases for read-replica session routing."""
+
+    @pytest.fixture
+    def replica_env(self, tmp_path):
+        env = {"DB_REPLICA_URLS": f"sqlite:///{tmp_path / 'replica.db'}"}
+        get_replica_engines.cache_clear()
+        with patch.dict(os.environ, env):
+            yield
+        get_replica_engines.cache_clear()
+
+    def test_reads_without_replicas_use_primary(self):
+        """Test that everything goes to the primary when no replica is set."""
+        get_replica_engines.cache_clear()
+        with patch.dict(os.environ, {"DB_REPLICA_URLS": ""}):
+            engine = get_engine_for_request(_make_request("GET"))
+            assert engine is get_async_read_engine()
+            assert get_engine_for_request(_make_request("POST")) is get_async_engine()
+        get_replica_engines.cache_clear()
+
+    def test_get_uses_replica(self, replica_env):
+        """Test that GET requests are routed to a replica."""
+        engine = get_engine_for_request(_make_request("GET"))
+        assert engine is get_replica_engines()[0]
+        assert engine.url.database.endswith("replica.db")
+
+    def test_writes_use_primary(self, replica_env):
+        """Test that mutating requests are routed to the primary."""
+        for method in ("POST", "PATCH", "PUT", "DELETE"):
+            assert get_engine_for_request(_make_request(method)) is get_async_engine()
+
+    def test_recent_writer_is_pinned_to_primary(self, replica_env):
+        """Test that a client that just wrote reads from the primary."""
+        import time
+
+        fresh = f"{PRIMARY_PIN_COOKIE}={time.time() + 5}"
+        stale = f"{PRIMARY_PIN_COOKIE}={time.time() - 5}"
+
+        assert (
+            get_engine_for_request(_make_request("GET", fresh))
+            is get_async_read_engine()
+        )
+        assert (
+            get_engine_for_request(_make_request("GET", stale))
+            is get_replica_engines()[0]
+        )
+
+    @pytest.mark.asyncio
+    async def test_session_reads_from_replica(self, replica_env):
+        """Test that the session dependency is bound to the routed engine."""
+        from src.routes.brands.models import Brand
+
+        async with get_replica_engines()[0].begin() as connection:
+            await connection.run_sync(Brand.metadata.create_all)
+            await connection.execute(
+                Brand.__table__.insert().values(name="Replica Brand")
+            )
+
+        session_gen = get_async_session(_make_request("GET"))
+        session = await anext(session_gen)
+        from sqlmodel import select
+
+        brands = (await session.exec(select(Brand))).all()
+        assert [brand.name for brand in brands] == ["Replica Brand"]
+        await session_gen.aclose()
+        for engine in (get_async_engine(), *get_replica_engines()):
+            await engine.dispose()
+
+    def test_write_sets_primary_pin_cookie(self, client, replica_env):
+        """Test that a mutating request pins the client to the primary."""
+        read_response = client.get("/brands")
+        write_response = client.post("/brands", json={"name": "Pinned Brand"})
+
+        assert PRIMARY_PIN_COOKIE not in read_response.cookies
+        assert write_response.status_code == 200
+        assert PRIMARY_PIN_COOKIE in write_response.cookies
+
+
+class TestSqliteProfile:
+    """Test cases for the SQLite production profile."""
+
+    @pytest.fixture
+    def sqlite_env(self, tmp_path):
+        db_path = tmp_path / "profile.db"
+        with patch.dict(os.environ, {"DB_URL": f"sqlite:///{db_path}"}):
+            yield db_path
+
+    @staticmethod
+    async def _pragma(engine, name):
+        async with engine.connect() as connection:
+            return (await connection.exec_driver_sql(f"PRAGMA {name}")).scalar()
+
+    @pytest.mark.asyncio
+    async def test_pragmas_applied_on_connect(self, sqlite_env):
+        """Test that every connection gets the production pragmas."""
+        engine = get_async_read_engine.__wrapped__()
+
+        assert await self._pragma(engine, "journal_mode") == "wal"
+        assert await self._pragma(engine, "synchronous") == 1  # NORMAL
+        assert await self._pragma(engine, "busy_timeout") == 5000
+        assert await self._pragma(engine, "temp_store") == 2  # MEMORY
+        assert await self._pragma(engine, "cache_size") == -64 * 1024
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_writer_is_serialized(self, sqlite_env):
+        """Test that the write engine has one connection and locks on BEGIN."""
+        import sqlite3
+
+        writer = get_async_engine.__wrapped__()
+        assert get_pool_status(writer)["size"] == 1
+        assert get_pool_status(writer)["max_overflow"] == 0
+
+        async with writer.begin() as connection:
+            await connection.exec_driver_sql("SELECT 1")
+            # The write lock is taken before anything has been written
+            other = sqlite3.connect(sqlite_env, timeout=0)
+            with pytest.raises(sqlite3.OperationalError, match="locked"):
+                other.execute("BEGIN IMMEDIATE")
+            other.close()
+        await writer.dispose()
+
+    @pytest.mark.asyncio
+    async def test_tuning_can_be_disabled(self, sqlite_env):
+        """Test that SQLITE_TUNING=false leaves SQLite defaults alone."""
+        with patch.dict(os.environ, {"SQLITE_TUNING": "false"}):
+            engine = get_async_engine.__wrapped__()
+
+        assert get_pool_status(engine)["size"] == 5
+        assert await self._pragma(engine, "journal_mode") == "delete"
+        await engine.dispose()
+
+
+class TestUnitOfWork:
+    """Test cases for per-request session lifetime."""
+
+    @pytest.fixture
+    def pooled_engine(self, test_db):
+        db_url = get_async_db_url(test_db.url.render_as_string())
+        return create_async_engine(
+            db_url, **get_pool_options(db_url, TimedAsyncQueuePool)
+        )
+
+    @pytest.mark.asyncio
+    async def test_unused_session_never_checks_out(self, pooled_engine):
+        """Test that a session that runs no statement never touches the pool."""
+        async with AsyncSessionLocal(bind=pooled_engine) as session:
+            assert isinstance(session, AsyncSession)
+
+        assert get_pool_status(pooled_engine)["wait"]["checkouts"] == 0
+        await pooled_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_route_releases_session_when_handler_returns(self, pooled_engine):
+        """Test that the connection is back in the pool before serialization."""
+
+        async def endpoint(session: AsyncSession = Depends(get_async_session)):
+            await session.exec(text("SELECT 1"))
+            assert get_pool_status(pooled_engine)["checked_out"] == 1
+            return "ok"
+
+        route = UnitOfWorkRoute("/uow", endpoint)
+        async with AsyncSessionLocal(bind=pooled_engine) as session:
+            assert await route.endpoint(session=session) == "ok"
+            # Still inside the dependency scope, but already released
+            assert get_pool_status(pooled_engine)["checked_out"] == 0
+        await pooled_engine.dispose()
@@ -0,0 +1,275 @@
+import asyncio
+import datetime
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlmodel import Session, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.idempotency import (
+    IN_FLIGHT,
+    IdempotencyRecord,
+    KeyLocks,
+    idempotent_response,
+    request_fingerprint,
+    response_cache,
+)
+from src.routes.products.models import Product
+from src.routes.sales.models import Sale
+
+
+@pytest.fixture
+def checkout(catalog_product, sample_customer_data):
+    """A sale request for 2 of the product's 10 units."""
+    return {
+        "customer_dni": sample_customer_data["dni"],
+        "products": [{"product_id": catalog_product["id"], "quantity": 2}],
+    }
+
+
+class Payload(BaseModel):
+    value: int
+
+
+class TestIdempotencyKeys:
+    """Test cases for Idempotency-Key on POST /sales/."""
+
+    def _count_sales(self, test_session):
+        return test_session.exec(select(func.count()).select_from(Sale)).one()
+
+    def test_retry_replays_the_first_response(self, client, checkout, test_session):
+        """Test that a retry gets the same sale back and sells nothing."""
+        headers = {"Idempotency-Key": "retry-1"}
+
+        first = client.post("/sales/", json=checkout, headers=headers)
+        retry = client.post("/sales/", json=checkout, headers=headers)
+
+        assert first.status_code == status.HTTP_200_OK
+        assert retry.status_code == status.HTTP_200_OK
+        assert retry.content == first.content
+        assert "Idempotent-Replayed" not in first.headers
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert first.json()["total"] == 25.0
+        assert self._count_sales(test_session) == 1
+        product_id = checkout["products"][0]["product_id"]
+        assert test_session.get(Product, product_id).stock == 8
+
+    def test_replay_from_cache_runs_no_queries(self, client, checkout, query_budget):
+        """Test that a retry on the same worker is answered from the LRU."""
+        headers = {"Idempotency-Key": "retry-2"}
+        client.post("/sales/", json=checkout, headers=headers)
+
+        with query_budget(0):
+            response = client.post("/sales/", json=checkout, headers=headers)
+
+        assert response.headers["Idempotent-Replayed"] == "true"
+
+    def test_replay_from_table(self, client, checkout, test_session):
+        """Test that another worker, without the response cached, replays it."""
+        headers = {"Idempotency-Key": "retry-3"}
+        first = client.post("/sales/", json=checkout, headers=headers)
+        response_cache.clear()
+
+        retry = client.post("/sales/", json=checkout, headers=headers)
+
+        assert retry.content == first.content
+        assert self._count_sales(test_session) == 1
+
+    def test_key_reused_for_another_request(self, client, checkout):
+        """Test that a key cannot be replayed for a different body."""
+        headers = {"Idempotency-Key": "retry-4"}
+        client.post("/sales/", json=checkout, headers=headers)
+        checkout["products"][0]["quantity"] = 3
+
+        response = client.post("/sales/", json=checkout, headers=headers)
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def _login_other_user(self, client):
+        user = {"username": "other_cashier", "password": "other_password_123"}
+        client.post("/auth/register", json=user)
+        token = client.post("/auth/token", data=user).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_keys_are_per_user(self, client, checkout, test_session):
+        """Test that another user's key is not replayed, with any body."""
+        first = client.post(
+            "/sales/", json=checkout, headers={"Idempotency-Key": "shared"}
+        )
+        other = {**self._login_other_user(client), "Idempotency-Key": "shared"}
+
+        same_body = client.post("/sales/", json=checkout, headers=other)
+        checkout["products"][0]["quantity"] = 3
+        other_body = client.post("/sales/", json=checkout, headers=other)
+
+        assert same_body.status_code == status.HTTP_200_OK
+        assert "Idempotent-Replayed" not in same_body.headers
+        assert same_body.json()["id"] != first.json()["id"]
+        # The key is taken by the other user's first sale, not by the first user
+        assert other_body.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert self._count_sales(test_session) == 2
+
+    def test_response_is_the_same_with_or_without_a_key(self, client, checkout):
+        """Test that the stored body is the one a plain POST returns."""
+        plain = client.post("/sales/", json=checkout).json()
+        keyed = client.post(
+            "/sales/", json=checkout, headers={"Idempotency-Key": "format"}
+        ).json()
+
+        assert list(plain) == list(keyed)
+        assert (
+            datetime.datetime.fromisoformat(plain["created_at"]).tzinfo
+            == datetime.datetime.fromisoformat(keyed["created_at"]).tzinfo
+        )
+
+    def test_failed_request_is_not_stored(self, client, checkout, test_session):
+        """Test that an error is not replayed, so the client can retry."""
+        headers = {"Idempotency-Key": "retry-5"}
+        checkout["products"][0]["quantity"] = 11
+
+        failed = client.post("/sales/", json=checkout, headers=headers)
+        stored = test_session.exec(select(IdempotencyRecord)).all()
+        checkout["products"][0]["quantity"] = 2
+        response = client.post("/sales/", json=checkout, headers=headers)
+
+        assert failed.status_code == status.HTTP_400_BAD_REQUEST
+        assert stored == []
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_expired_key_runs_again(self, client, checkout, test_session):
+        """Test that a key past its TTL is treated as new."""
+        test_session.add(
+            IdempotencyRecord(
+                username="fixture_user",
+                key="retry-6",
+                fingerprint="old",
+                status_code=200,
+                body="{}",
+                expires_at=datetime.datetime(2000, 1, 1),
+            )
+        )
+        test_session.commit()
+
+        response = client.post(
+            "/sales/", json=checkout, headers={"Idempotency-Key": "retry-6"}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert self._count_sales(test_session) == 1
+
+    def test_requests_without_a_key_are_not_deduplicated(
+        self, client, checkout, test_session
+    ):
+        """Test that plain POSTs keep creating a sale each."""
+        client.post("/sales/", json=checkout)
+        client.post("/sales/", json=checkout)
+
+        assert self._count_sales(test_session) == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_wait_for_the_first(self, async_test_db):
+        """Test that a request with a key in flight waits and replays it."""
+        runs = 0
+
+        async def handler(session, idempotency):
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.05)
+            await idempotency.save(session, 201, {"run": runs})
+            await session.commit()
+
+        async def request():
+            async with AsyncSession(async_test_db, expire_on_commit=False) as session:
+                return await idempotent_response(
+                    session,
+                    "cashier",
+                    "concurrent",
+                    Payload(value=1),
+                    lambda idempotency: handler(session, idempotency),
+                )
+
+        first, second = await asyncio.gather(request(), request())
+
+        assert runs == 1
+        assert first.body == second.body == b'{"run":1}'
+        assert first.status_code == second.status_code == 201
+        response_cache.clear()
+
+    @pytest.mark.asyncio
+    async def test_key_in_flight_on_another_worker(self, async_test_db):
+        """Test that a retry on another worker, while the first request is
+        still running, gets a 409 instead of running the handler."""
+        started, finish = asyncio.Event(), asyncio.Event()
+        runs = []
+
+        async def first_handler(session, idempotency):
+            runs.append("first")
+            started.set()
+            await finish.wait()
+            await idempotency.save(session, 201, {"name": "Müller"})
+            await session.commit()
+
+        async def retry_handler(session, idempotency):
+            runs.append("retry")
+
+        async def request(handler):
+            async with AsyncSession(async_test_db, expire_on_commit=False) as session:
+                return await idempotent_response(
+                    session,
+                    "cashier",
+                    "in-flight",
+                    Payload(value=1),
+                    lambda idempotency: handler(session, idempotency),
+                )
+
+        first = asyncio.create_task(request(first_handler))
+        await started.wait()
+        # Another worker does not share this process's key locks
+        with patch("src.idempotency.key_locks", KeyLocks()):
+            with pytest.raises(HTTPException) as conflict:
+                await request(retry_handler)
+            finish.set()
+            original = await first
+            response_cache.clear()
+            replay = await request(retry_handler)
+
+        assert conflict.value.status_code == status.HTTP_409_CONFLICT
+        assert conflict.value.headers["Retry-After"] == "1"
+        assert runs == ["first"]
+        assert replay.body == original.body == JSONResponse({"name": "Müller"}).body
+        assert replay.headers["Idempotent-Replayed"] == "true"
+        response_cache.clear()
+
+    @pytest.mark.asyncio
+    async def test_claim_of_a_dead_worker_expires(self, test_db, async_test_db):
+        """Test that a key left in flight past its claim runs again."""
+        with Session(test_db) as other:
+            other.add(
+                IdempotencyRecord(
+                    username="cashier",
+                    key="abandoned",
+                    fingerprint=request_fingerprint(Payload(value=1)),
+                    status_code=IN_FLIGHT,
+                    body="",
+                    expires_at=datetime.datetime(2000, 1, 1),
+                )
+            )
+            other.commit()
+
+        async def handler(session, idempotency):
+            await idempotency.save(session, 201, {"run": 1})
+            await session.commit()
+
+        async with AsyncSession(async_test_db, expire_on_commit=False) as session:
+            response = await idempotent_response(
+                session,
+                "cashier",
+                "abandoned",
+                Payload(value=1),
+                lambda idempotency: handler(session, idempotency),
+            )
+
+        assert response.status_code == 201
+        assert "Idempotent-Replayed" not in response.headers
+        response_cache.clear()
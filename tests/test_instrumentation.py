@@ -0,0 +1,107 @@
+import logging
+import pytest
+from unittest.mock import patch
+from fastapi import Response, status
+from starlette.requests import Request
+from src.instrumentation import (
+    QueryStats,
+    statement_shape,
+    report_query_stats,
+    QUERY_COUNT_HEADER,
+    QUERY_TIME_HEADER,
+)
+
+
+@pytest.fixture
+def catalog(client, sample_provider_data):
+    """Three brands, categories and providers with two products each."""
+    for i in range(3):
+        client.post("/brands", json={"name": f"Brand {i}"})
+        client.post("/categories", json={"name": f"Category {i}"})
+        client.post(
+            "/providers",
+            json={**sample_provider_data, "ruc": 100 + i, "name": f"Provider {i}"},
+        )
+    for i in range(6):
+        client.post(
+            "/products",
+            json={
+                "name": f"Product {i}",
+                "description": "Catalog product",
+                "stock": 1,
+                "price": 10.0,
+                "brand_name": f"Brand {i % 3}",
+                "category_name": f"Category {i % 3}",
+                "provider_name": f"Provider {i % 3}",
+            },
+        )
+
+
+class TestQueryStats:
+    """Test cases for statement counting and N+1 detection."""
+
+    def test_statement_shape_collapses_in_lists(self):
+        """Test that IN lists of any length share a shape."""
+        one = "SELECT * FROM product\n WHERE product.brand_name IN (?)"
+        three = "SELECT * FROM product WHERE product.brand_name IN (?, ?, ?)"
+        assert statement_shape(one) == statement_shape(three)
+
+    def test_repeated_statements_are_reported(self, caplog):
+        """Test that a shape over the threshold is logged as an N+1 suspect."""
+        stats = QueryStats()
+        for _ in range(5):
+            stats.record("SELECT * FROM brand WHERE brand.id = ?", 0.001)
+        stats.record("SELECT * FROM product", 0.001)
+        request = Request(
+            {"type": "http", "method": "GET", "path": "/brands", "headers": []}
+        )
+        response = Response()
+
+        with caplog.at_level(logging.WARNING, logger="src.instrumentation"):
+            with patch.dict("os.environ", {"DB_QUERY_HEADERS": "true"}):
+                report_query_stats(request, response, stats)
+
+        assert response.headers[QUERY_COUNT_HEADER] == "6"
+        assert response.headers[QUERY_TIME_HEADER] == "6.00"
+        assert "Possible N+1 on GET /brands: ran 5 times" in caplog.text
+        assert "FROM product" not in caplog.text
+
+    def test_response_headers(self, client, monkeypatch):
+        """Test that with DB_QUERY_HEADERS every response reports its query
+        count and time."""
+        monkeypatch.setenv("DB_QUERY_HEADERS", "true")
+        response = client.get("/customers")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers[QUERY_COUNT_HEADER] == "1"
+        assert float(response.headers[QUERY_TIME_HEADER]) > 0
+
+    def test_no_response_headers_by_default(self, client):
+        """Test that query timings are not sent unless asked for."""
+        response = client.get("/customers")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert QUERY_COUNT_HEADER not in response.headers
+        assert QUERY_TIME_HEADER not in response.headers
+
+
+class TestQueryBudgets:
+    """Test cases pinning the number of statements per list endpoint."""
+
+    @pytest.mark.parametrize(
+        "path, budget",
+        [
+            # The ETag's version read, the list and one selectin per relationship
+            ("/brands", 3),
+            ("/categories", 3),
+            ("/providers", 3),
+            ("/products", 5),
+        ],
+    )
+    def test_list_endpoint_budget(self, client, catalog, query_budget, path, budget):
+        """Test that list endpoints do not issue a query per row."""
+        with query_budget(budget):
+            response = client.get(path)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) >= 3
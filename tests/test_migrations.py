@@ -0,0 +1,194 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from unittest.mock import patch
+from sqlalchemy import Column, Index, Integer, MetaData, Table, event, inspect, text
+from sqlmodel import SQLModel, create_engine
+from src import migrations
+from src.migrations import (
+    Migration,
+    MIGRATIONS,
+    baseline_metadata,
+    migrate,
+    head_version,
+    schema_fingerprint,
+    get_schema_state,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+def _count_statements(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+class TestMigrations:
+    """Test cases for the schema migration subsystem."""
+
+    def test_migrate_fresh_database(self, engine):
+        """Test that an empty database is created and stamped at head."""
+        assert migrate(engine) == head_version()
+
+        tables = set(inspect(engine).get_table_names())
+        assert set(SQLModel.metadata.tables) <= tables
+        assert get_schema_state(engine) == (head_version(), schema_fingerprint())
+
+    def test_migrate_database_created_by_create_all(self, engine):
+        """Test that a pre-migrations database is adopted without losing data."""
+        SQLModel.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO brand (name) VALUES ('Kept')"))
+
+        assert migrate(engine) == head_version()
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT name FROM brand")).scalar() == "Kept"
+
+    def test_current_database_is_a_single_query(self, engine):
+        """Test that startup on a migrated database reads one row and stops."""
+        migrate(engine)
+        statements = _count_statements(engine)
+
+        migrate(engine)
+
+        assert len(statements) == 1
+        assert "schema_version" in statements[0]
+
+    def test_workers_booting_together(self, tmp_path):
+        """Test that concurrent startups on a fresh SQLite file all succeed."""
+        url = f"sqlite:///{tmp_path / 'boot.db'}"
+        workers = 4
+        barrier = threading.Barrier(workers)
+
+        def boot(_):
+            worker_engine = create_engine(url)
+            barrier.wait()
+            try:
+                return migrate(worker_engine)
+            finally:
+                worker_engine.dispose()
+
+        with ThreadPoolExecutor(workers) as pool:
+            versions = list(pool.map(boot, range(workers)))
+
+        assert versions == [head_version()] * workers
+        with create_engine(url).connect() as connection:
+            applied = connection.execute(
+                text("SELECT count(*) FROM schema_version")
+            ).scalar()
+        assert applied == head_version()
+
+    def test_migrations_build_the_models(self, engine, tmp_path):
+        """Test that migrating a fresh database gives what the models describe."""
+        migrate(engine)
+        reference = create_engine(f"sqlite:///{tmp_path / 'reference.db'}")
+        SQLModel.metadata.create_all(reference)
+        migrated, expected = inspect(engine), inspect(reference)
+
+        for table in SQLModel.metadata.tables:
+            assert {
+                (column["name"], column["nullable"])
+                for column in migrated.get_columns(table)
+            } == {
+                (column["name"], column["nullable"])
+                for column in expected.get_columns(table)
+            }, table
+            indexes = {
+                (index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                for index in migrated.get_indexes(table)
+            }
+            for index in expected.get_indexes(table):
+                key = (
+                    index["name"],
+                    tuple(index["column_names"]),
+                    bool(index["unique"]),
+                )
+                assert key in indexes, (table, key)
+        reference.dispose()
+
+    def test_initial_schema_is_frozen(self, engine):
+        """Test that migration 1 creates the first release's tables only."""
+        with engine.begin() as connection:
+            MIGRATIONS[0].upgrade(connection)
+
+        assert set(inspect(engine).get_table_names()) == set(baseline_metadata.tables)
+        assert "ix_product_category_name" not in {
+            index["name"] for index in inspect(engine).get_indexes("product")
+        }
+
+    def test_pending_migration_is_applied(self, engine):
+        """Test that a new migration runs once and bumps the stored version."""
+        migrate(engine)
+        calls = []
+
+        def add_index(connection):
+            calls.append(connection)
+            connection.execute(text("CREATE INDEX ix_test_brand ON brand (name)"))
+
+        extra = Migration(head_version() + 1, "test index", add_index)
+        with patch.object(migrations, "MIGRATIONS", [*MIGRATIONS, extra]):
+            assert migrate(engine) == extra.version
+            assert migrate(engine) == extra.version
+
+        assert len(calls) == 1
+        assert "ix_test_brand" in {
+            index["name"] for index in inspect(engine).get_indexes("brand")
+        }
+
+    def test_model_change_without_migration_fails(self, engine):
+        """Test that schema drift at the head version is reported."""
+        migrate(engine)
+
+        with patch.object(migrations, "schema_fingerprint", return_value="changed"):
+            with pytest.raises(RuntimeError, match="Add a migration"):
+                migrate(engine)
+
+    def test_fingerprint_tracks_indexes(self):
+        """Test that the fingerprint changes when an index is added."""
+        metadata = MetaData()
+        table = Table("item", metadata, Column("id", Integer, primary_key=True))
+        Table("other", metadata, Column("code", Integer))
+        before = schema_fingerprint(metadata)
+
+        assert schema_fingerprint(metadata) == before
+        Index("ix_item_id", table.c.id)
+        assert schema_fingerprint(metadata) != before
+
+    def test_usernames_are_unique(self, engine):
+        """Test that migrating leaves a unique index on the username."""
+        migrate(engine)
+
+        indexes = {
+            index["name"]: index for index in inspect(engine).get_indexes("user")
+        }
+        assert indexes["ix_user_username"]["unique"]
+
+    def test_duplicate_usernames_stop_the_migration(self, engine):
+        """Test that duplicates are reported rather than silently dropped."""
+        unique = next(m for m in MIGRATIONS if m.description == "unique usernames")
+        migrate(engine)
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_user_username"))
+            connection.execute(text("CREATE INDEX ix_user_username ON user (username)"))
+            for _ in range(2):
+                connection.execute(
+                    text(
+                        "INSERT INTO user (username, hashed_password, role) "
+                        "VALUES ('twin', 'x', 'user')"
+                    )
+                )
+
+        with engine.begin() as connection:
+            with pytest.raises(RuntimeError, match="twin"):
+                unique.upgrade(connection)
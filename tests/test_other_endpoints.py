@@ -66,6 +66,17 @@ class TestBrandEndpoints:
         updated_brand = response.json()
         assert updated_brand["name"] == "Updated Brand Name"
 
+    def test_get_brand_includes_products(self, client, sample_product_data):
+        """Test that a brand's products are serialized with the brand."""
+        brand = client.post("/brands", json={"name": "Test Brand"}).json()
+        client.post("/products", json=sample_product_data)
+
+        response = client.get(f"/brands/{brand['id']}")
+
+        assert response.status_code == status.HTTP_200_OK
+        products = response.json()["products"]
+        assert [p["name"] for p in products] == [sample_product_data["name"]]
+
     def test_delete_brand_success(self, client, sample_brand_data):
         """Test successful brand deletion."""
         # Create a brand first
@@ -216,3 +227,14 @@ class TestCustomerEndpoints:
         # Verify customer is deleted
         get_response = client.get(f"/customers/{sample_customer_data['dni']}")
         assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_export_customers_csv(self, client, sample_customer_data):
+        """Test that customers stream out as CSV with a header row."""
+        client.post("/customers", json=sample_customer_data)
+
+        response = client.get("/customers/export", params={"format": "csv"})
+
+        assert response.status_code == status.HTTP_200_OK
+        header, row = response.text.splitlines()
+        assert header == "id,dni,name,last_name,email"
+        assert row.split(",")[1] == str(sample_customer_data["dni"])
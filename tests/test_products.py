@@ -1,4 +1,14 @@
+import csv
+import io
+import json
+import pytest
 from fastapi import status
+from src.exports import stream_rows
+from src.routes.brands.models import Brand
+from src.routes.categories.models import Category
+from src.routes.products.models import Product
+from src.routes.products.operations import export_products_statement
+from src.routes.providers.models import Provider
 
 
 class TestProductEndpoints:
@@ -199,3 +209,399 @@ class TestProductIntegration:
         # Verify deletion
         final_read_response = client.get(f"/products/{product_id}")
         assert final_read_response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestProductQueryCount:
+    """Test cases pinning the statements behind product reads."""
+
+    @staticmethod
+    def _seed_catalog(session, size):
+        for i in range(size):
+            session.add(Brand(name=f"Brand {i}"))
+            session.add(Category(name=f"Category {i}"))
+            session.add(
+                Provider(
+                    ruc=1000 + i,
+                    name=f"Provider {i}",
+                    address="Street",
+                    phone="555",
+                    email="p@example.com",
+                )
+            )
+            session.add(
+                Product(
+                    name=f"Product {i}",
+                    description="Seeded",
+                    stock=1,
+                    price=1.0,
+                    brand_name=f"Brand {i}",
+                    category_name=f"Category {i}",
+                    provider_name=f"Provider {i}",
+                )
+            )
+        session.commit()
+
+    @pytest.mark.parametrize("size", [3, 60])
+    def test_list_query_count_is_constant(
+        self, client, test_session, query_budget, size
+    ):
+        """Test that GET /products costs the same with 3 or 60 products."""
+        self._seed_catalog(test_session, size)
+
+        # The ETag's version read, the page and one selectin per relation
+        with query_budget(5) as stats:
+            response = client.get("/products", params={"limit": 200})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == size
+        assert all(p["brand"] and p["provider"] for p in response.json())
+        assert stats.count == 5
+
+    def test_detail_is_a_single_query(self, client, test_session, query_budget):
+        """Test that GET /products/{id} loads its relations in one join."""
+        self._seed_catalog(test_session, 1)
+
+        # Plus the ETag's version read
+        with query_budget(2):
+            response = client.get("/products/1")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["category"]["name"] == "Category 0"
+
+
+class TestProductListing:
+    """Test cases for GET /products pagination, filters and sorting."""
+
+    @pytest.fixture
+    def catalog(self, test_session):
+        prices = [5.0, 1.0, 3.0, 3.0, 2.0, 4.0, 3.0]
+        for i, price in enumerate(prices):
+            test_session.add(
+                Product(
+                    name=f"Product {i}",
+                    description="Listed",
+                    stock=i % 3,
+                    price=price,
+                    brand_name="Even Brand" if i % 2 == 0 else "Odd Brand",
+                    category_name=f"Category {i % 2}",
+                    provider_name="Provider",
+                )
+            )
+        test_session.commit()
+        return prices
+
+    @staticmethod
+    def _all_pages(client, **params):
+        pages, cursor = [], None
+        while True:
+            response = client.get(
+                "/products", params={**params, **({"cursor": cursor} if cursor else {})}
+            )
+            assert response.status_code == status.HTTP_200_OK
+            pages.append(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return pages
+
+    def test_cursor_walks_every_product_once(self, client, catalog):
+        """Test that following cursors returns each product once, in id order."""
+        pages = self._all_pages(client, limit=3)
+
+        assert [len(page) for page in pages] == [3, 3, 1]
+        ids = [p["id"] for page in pages for p in page]
+        assert ids == sorted(ids) and len(ids) == len(catalog)
+
+    def test_sort_by_price_descending_is_stable(self, client, catalog):
+        """Test that price ties are broken by id across page boundaries."""
+        pages = self._all_pages(client, limit=2, sort="-price")
+
+        rows = [(p["price"], p["id"]) for page in pages for p in page]
+        assert rows == sorted(rows, reverse=True)
+        assert len(rows) == len(catalog)
+
+    def test_sort_by_created_at(self, client, catalog):
+        """Test that created_at cursors round-trip through the datetime."""
+        pages = self._all_pages(client, limit=4, sort="created_at")
+
+        assert len([p for page in pages for p in page]) == len(catalog)
+
+    def test_filters_run_in_sql(self, client, catalog, query_budget):
+        """Test the category, brand, price range and stock filters."""
+        with query_budget(5):
+            response = client.get(
+                "/products",
+                params={
+                    "brand_name": "Even Brand",
+                    "category_name": "Category 0",
+                    "min_price": 2,
+                    "max_price": 4.5,
+                    "in_stock": True,
+                },
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        products = response.json()
+        assert products
+        for product in products:
+            assert product["brand"] is None or product["brand"]["name"] == "Even Brand"
+            assert 2 <= product["price"] <= 4.5
+            assert product["stock"] > 0
+        expected = [
+            i
+            for i, price in enumerate(catalog)
+            if i % 2 == 0 and 2 <= price <= 4.5 and i % 3 > 0
+        ]
+        assert [p["name"] for p in products] == [f"Product {i}" for i in expected]
+
+    def test_provider_filter_without_matches(self, client, catalog):
+        """Test that a filter with no match returns an empty page."""
+        response = client.get("/products", params={"provider_name": "Nobody"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == []
+        assert "X-Next-Cursor" not in response.headers
+
+    def test_invalid_cursor(self, client, catalog):
+        """Test that a malformed cursor or one from another sort is rejected."""
+        cursor = client.get("/products", params={"limit": 1}).headers["X-Next-Cursor"]
+
+        bad = client.get("/products", params={"cursor": "not-a-cursor"})
+        other_sort = client.get("/products", params={"cursor": cursor, "sort": "price"})
+
+        assert bad.status_code == status.HTTP_400_BAD_REQUEST
+        assert other_sort.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_invalid_query_parameters(self, client):
+        """Test limit bounds, unknown sorts and inverted price ranges."""
+        for params in (
+            {"limit": 0},
+            {"limit": 201},
+            {"sort": "name"},
+            {"min_price": 5, "max_price": 1},
+        ):
+            response = client.get("/products", params=params)
+            assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestProductSearch:
+    """Test cases for GET /products/search."""
+
+    @staticmethod
+    def _create(client, sample_product_data, name, description):
+        response = client.post(
+            "/products",
+            json={**sample_product_data, "name": name, "description": description},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    @staticmethod
+    def _search(client, q, **params):
+        response = client.get("/products/search", params={"q": q, **params})
+        assert response.status_code == status.HTTP_200_OK
+        return [product["name"] for product in response.json()]
+
+    def test_name_matches_rank_first(self, client, sample_product_data):
+        """Test that a match in the name outranks one in the description."""
+        self._create(client, sample_product_data, "USB cable", "Braided, two meters")
+        self._create(client, sample_product_data, "Charger", "Comes with a cable")
+        self._create(client, sample_product_data, "Mouse", "Wireless")
+
+        assert self._search(client, "cable") == ["USB cable", "Charger"]
+
+    def test_prefix_and_every_word(self, client, sample_product_data):
+        """Test prefix matching, AND between words and accent folding."""
+        self._create(client, sample_product_data, "Teclado mecánico", "Switches")
+        self._create(client, sample_product_data, "Teclado de membrana", "Barato")
+
+        assert self._search(client, "tecl") == [
+            "Teclado mecánico",
+            "Teclado de membrana",
+        ]
+        assert self._search(client, "teclado mecanico") == ["Teclado mecánico"]
+        assert self._search(client, "tecl", limit=1) == ["Teclado mecánico"]
+
+    def test_index_follows_updates_and_deletes(self, client, sample_product_data):
+        """Test that the search index is kept in sync with product writes."""
+        product = self._create(client, sample_product_data, "Old Name", "Text")
+
+        client.patch(
+            f"/products/{product['id']}",
+            json={**sample_product_data, "name": "Renamed Gadget"},
+        )
+        assert self._search(client, "old") == []
+        assert self._search(client, "gadget") == ["Renamed Gadget"]
+
+        client.delete(f"/products/{product['id']}")
+        assert self._search(client, "gadget") == []
+
+    def test_query_syntax_is_not_interpreted(self, client, sample_product_data):
+        """Test that FTS operators in q are treated as plain text."""
+        self._create(client, sample_product_data, "Cable", "Plain")
+
+        assert self._search(client, 'cable OR "x" NEAR(*)') == []
+        assert self._search(client, "***") == []
+        response = client.get("/products/search", params={"q": ""})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestProductBulkImport:
+    """Test cases for POST /products/bulk."""
+
+    @pytest.fixture
+    def references(self, test_session):
+        test_session.add(Brand(name="Acme"))
+        test_session.add(Category(name="Tools"))
+        test_session.add(
+            Provider(
+                ruc=1,
+                name="Supplier",
+                address="Street",
+                phone="555",
+                email="s@example.com",
+            )
+        )
+        test_session.commit()
+
+    @staticmethod
+    def _post(client, body, content_type, **params):
+        return client.post(
+            "/products/bulk",
+            content=body.encode(),
+            headers={"Content-Type": content_type},
+            params=params,
+        )
+
+    def test_csv_import_with_row_errors(self, client, references):
+        """Test that bad rows are reported while good rows are inserted."""
+        body = (
+            "name,description,stock,price,provider_name,category_name,brand_name\n"
+            'Hammer,"Steel, 500g",5,12.5,Supplier,Tools,Acme\n'
+            'Saw,"Two lines\nof description",3,20,Supplier,Tools,Acme\n'
+            "Drill,Cordless,-1,80,Supplier,Tools,Acme\n"
+            "Wrench,Adjustable,2,9,Supplier,Tools,Unknown Brand\n"
+            "Pliers,Too few columns\n"
+            "\n"
+            "Level,Laser,1,30,Supplier,Tools,Acme\n"
+        )
+
+        response = self._post(client, body, "text/csv")
+
+        assert response.status_code == status.HTTP_200_OK
+        report = response.json()
+        assert report["inserted"] == 3
+        assert report["failed"] == 3
+        errors = {error["row"]: error["errors"] for error in report["errors"]}
+        assert list(errors) == [3, 4, 5]
+        assert errors[3][0].startswith("stock:")
+        assert errors[4] == ["brand_name: unknown brand 'Unknown Brand'"]
+        assert errors[5] == ["Expected 7 columns, got 2"]
+
+        names = [p["name"] for p in client.get("/products").json()]
+        assert names == ["Hammer", "Saw", "Level"]
+        saw = client.get("/products/search", params={"q": "lines"}).json()
+        assert saw[0]["description"] == "Two lines\nof description"
+
+    def test_ndjson_import_in_batches(self, client, references, query_budget):
+        """Test NDJSON rows, bad lines and one reference lookup per type."""
+        good = (
+            '{"name": "Item %d", "description": "d", "stock": 1, "price": 1,'
+            ' "provider_name": "Supplier", "category_name": "Tools",'
+            ' "brand_name": "Acme"}'
+        )
+        lines = [good % i for i in range(6)] + ["not json", "[1, 2]"]
+
+        with query_budget(8) as stats:
+            response = self._post(
+                client, "\n".join(lines), "application/x-ndjson", batch_size=3
+            )
+
+        report = response.json()
+        assert report["inserted"] == 6
+        assert [error["errors"] for error in report["errors"]] == [
+            ["Invalid JSON"],
+            ["Expected a JSON object"],
+        ]
+        # Three reference lookups for the first batch, then only the insert
+        # and the version bump per batch
+        assert sum("INSERT" in shape for shape in stats.shapes) == 1
+        assert stats.count == 3 + 2 * 2
+
+    def test_unsupported_content_type(self, client):
+        """Test that only CSV and NDJSON bodies are accepted."""
+        response = self._post(client, "{}", "application/json")
+
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+
+class TestProductExport:
+    """Test cases for GET /products/export."""
+
+    @pytest.fixture
+    def products(self, test_session):
+        test_session.add(Brand(name="Acme"))
+        test_session.add(Category(name="Tools"))
+        test_session.add(
+            Provider(
+                ruc=1,
+                name="Supplier",
+                address="Street",
+                phone="555",
+                email="s@example.com",
+            )
+        )
+        for i in range(5):
+            test_session.add(
+                Product(
+                    name=f"Item {i}",
+                    description="Line one\nline two, with comma" if i == 0 else "d",
+                    stock=i,
+                    price=1.5 * i,
+                    provider_name="Supplier",
+                    category_name="Tools",
+                    brand_name="Acme",
+                )
+            )
+        test_session.commit()
+
+    def test_ndjson_export(self, client, products):
+        """Test that every product is sent as one JSON object per line."""
+        response = client.get("/products/export")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert "products.ndjson" in response.headers["content-disposition"]
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["name"] for row in rows] == [f"Item {i}" for i in range(5)]
+        assert rows[2]["price"] == 3.0
+        assert rows[2]["brand_name"] == "Acme"
+        assert "created_at" in rows[2]
+
+    def test_csv_export(self, client, products):
+        """Test that the CSV export has a header and quotes awkward values."""
+        response = client.get("/products/export", params={"format": "csv"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 5
+        assert rows[0]["description"] == "Line one\nline two, with comma"
+        assert rows[4]["stock"] == "4"
+
+    def test_unknown_format(self, client):
+        """Test that only NDJSON and CSV exports are offered."""
+        response = client.get("/products/export", params={"format": "xml"})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    @pytest.mark.asyncio
+    async def test_rows_are_sent_one_batch_at_a_time(self, async_test_db, products):
+        """Test that the export yields a chunk per batch instead of one body."""
+        chunks = [
+            chunk
+            async for chunk in stream_rows(
+                async_test_db, export_products_statement(), "ndjson", 2
+            )
+        ]
+
+        assert [chunk.count("\n") for chunk in chunks] == [2, 2, 1]
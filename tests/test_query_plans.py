@@ -0,0 +1,131 @@
+import datetime
+import pytest
+from sqlalchemy import inspect, text, tuple_
+from sqlmodel import create_engine, select
+from src.migrations import migrate
+from src.routes.auth.models import User
+from src.routes.brands.models import Brand
+from src.routes.categories.models import Category
+from src.routes.products.models import Product
+from src.routes.products.operations import _search_statement
+from src.routes.providers.models import Provider
+from src.routes.reports.models import DailyProductSales, DailySales
+from src.routes.sales.link_models import ProductSale
+from src.routes.sales.models import Sale
+from src.versions import VERSIONED_TABLES, TableVersion
+
+# The statements behind the hot paths, with the shape SQLAlchemy emits for them
+HOT_QUERIES = {
+    "login": select(User).where(User.username == "someone"),
+    "category products": select(Product).where(Product.category_name.in_(["c"])),
+    "brand products": select(Product).where(Product.brand_name.in_(["b"])),
+    "provider products": select(Product).where(Product.provider_name.in_(["p"])),
+    "sales by customer": select(Sale).where(Sale.customer_dni == 12345678),
+    "sales by date": select(Sale).where(
+        Sale.created_at >= datetime.datetime(2024, 1, 1)
+    ),
+    "sale detail": select(Sale, Product, ProductSale)
+    .join(ProductSale, Sale.id == ProductSale.sale_id)
+    .join(Product, ProductSale.product_id == Product.id)
+    .where(Sale.id == 1),
+    "products page by price": select(Product)
+    .where(tuple_(Product.price, Product.id) > tuple_(1.0, 5))
+    .order_by(Product.price, Product.id)
+    .limit(51),
+    "products page by date": select(Product)
+    .where(
+        tuple_(Product.created_at, Product.id)
+        < tuple_(datetime.datetime(2024, 1, 1), 5)
+    )
+    .order_by(Product.created_at.desc(), Product.id.desc())
+    .limit(51),
+    "product search": _search_statement("sqlite", ["cable"]),
+    "sales page": select(Sale)
+    .where(tuple_(Sale.created_at, Sale.id) < tuple_(datetime.datetime(2024, 1, 1), 5))
+    .order_by(Sale.created_at.desc(), Sale.id.desc())
+    .limit(51),
+    "customer sales page": select(Sale)
+    .where(
+        Sale.customer_dni == 12345678,
+        Sale.created_at >= datetime.datetime(2024, 1, 1),
+        tuple_(Sale.created_at, Sale.id) < tuple_(datetime.datetime(2024, 6, 1), 5),
+    )
+    .order_by(Sale.created_at.desc(), Sale.id.desc())
+    .limit(51),
+    "sale items of a page": select(ProductSale, Product.name)
+    .join(Product, ProductSale.product_id == Product.id)
+    .where(ProductSale.sale_id.in_([1, 2, 3])),
+    "category lookup": select(Category).where(Category.name == "c"),
+    "brand lookup": select(Brand).where(Brand.name == "b"),
+    "provider lookup": select(Provider).where(Provider.name == "p"),
+    "sales report by day": select(DailySales).where(
+        DailySales.day >= datetime.date(2024, 1, 1)
+    ),
+    "sales report by product": select(DailyProductSales).where(
+        DailyProductSales.day >= datetime.date(2024, 1, 1)
+    ),
+    "table versions": select(TableVersion).where(
+        TableVersion.name.in_(VERSIONED_TABLES)
+    ),
+}
+
+HOT_INDEXES = {
+    "product": {
+        "ix_product_price_id",
+        "ix_product_created_at_id",
+        "ix_product_category_name",
+        "ix_product_brand_name",
+        "ix_product_provider_name",
+    },
+    "sale": {"ix_sale_created_at_id", "ix_sale_customer_dni_created_at_id"},
+    "productsale": {"ix_productsale_sale_id"},
+    "user": {"ix_user_username"},
+}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+def full_table_scans(connection, statement) -> list[str]:
+    sql = str(
+        statement.compile(
+            dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+    plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    # "SCAN product" is a full scan, "SCAN ... USING INDEX" walks an index
+    return [
+        row.detail
+        for row in plan
+        if row.detail.startswith("SCAN ") and "INDEX" not in row.detail
+    ]
+
+
+class TestQueryPlans:
+    """Test cases for indexes on the hot query paths."""
+
+    @pytest.mark.parametrize("name", HOT_QUERIES)
+    def test_hot_query_uses_an_index(self, engine, name):
+        """Test that no hot query falls back to a full table scan."""
+        with engine.connect() as connection:
+            assert full_table_scans(connection, HOT_QUERIES[name]) == []
+
+    def test_migration_adds_indexes_to_existing_database(self, engine):
+        """Test that a database from before the index pack gets the indexes."""
+        with engine.begin() as connection:
+            for indexes in HOT_INDEXES.values():
+                for index in indexes:
+                    connection.execute(text(f"DROP INDEX {index}"))
+            connection.execute(text("DELETE FROM schema_version WHERE version > 1"))
+
+        migrate(engine)
+
+        inspector = inspect(engine)
+        for table, indexes in HOT_INDEXES.items():
+            names = {index["name"] for index in inspector.get_indexes(table)}
+            assert indexes <= names
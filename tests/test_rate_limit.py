@@ -0,0 +1,279 @@
+import asyncio
+import sqlite3
+import zlib
+import pytest
+from fastapi import Request, status
+from src.config import RateLimit, get_rate_limit_settings
+from src.rate_limit import (
+    BUSY_RETRY_SECONDS,
+    SHARDS,
+    BucketStore,
+    RateLimiter,
+    ShardedBucketStore,
+    rate_limiter,
+    route_group,
+)
+from src.routes.auth.operations import token_username
+
+
+def _request(
+    path: str, host: str, token: str | None = None, method: str = "GET"
+) -> Request:
+    headers = [] if token is None else [(b"authorization", f"Bearer {token}".encode())]
+    return Request(
+        {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": b"",
+            "headers": headers,
+            "client": (host, 50000),
+        }
+    )
+
+
+class TestBucketStore:
+    """Test cases for the shared token-bucket store."""
+
+    def test_burst_then_refill(self):
+        """Test that a bucket allows its burst, then one request per refill."""
+        store = BucketStore(":memory:")
+        limit = RateLimit(per_minute=60, burst=3)
+
+        assert [store.take(["ip:a"], limit, 100.0) for _ in range(3)] == [0, 0, 0]
+        assert store.take(["ip:a"], limit, 100.0) == pytest.approx(1.0)
+        assert store.take(["ip:a"], limit, 101.0) == 0
+
+    def test_refused_request_takes_nothing(self):
+        """Test that a request refused by one bucket leaves the others full."""
+        store = BucketStore(":memory:")
+        limit = RateLimit(per_minute=60, burst=2)
+        store.take(["user:a"], limit, 100.0)
+        store.take(["user:a"], limit, 100.0)
+
+        assert store.take(["ip:b", "user:a"], limit, 100.0) > 0
+        assert store.take(["ip:b"], limit, 100.0) == 0
+        assert store.take(["ip:b"], limit, 100.0) == 0
+
+    def test_buckets_are_shared_through_the_file(self, tmp_path):
+        """Test that two workers opening the same file share their buckets."""
+        path = str(tmp_path / "rate-limit.db")
+        first, second = BucketStore(path), BucketStore(path)
+        limit = RateLimit(per_minute=60, burst=1)
+
+        assert first.take(["ip:a"], limit, 100.0) == 0
+        assert second.take(["ip:a"], limit, 100.0) > 0
+        first.close()
+        second.close()
+
+    def test_sharded_store_refuses_all_or_nothing(self, tmp_path):
+        """Test that keys in different files are still charged together."""
+        store = ShardedBucketStore(str(tmp_path / "rate-limit.db"))
+        limit = RateLimit(per_minute=60, burst=1)
+
+        def shard_of(key):
+            return zlib.crc32(key.encode()) % SHARDS
+
+        ip = next(
+            f"ip:{i}" for i in range(100) if shard_of(f"ip:{i}") != shard_of("user:a")
+        )
+        store.take(["user:a"], limit, 100.0)
+
+        assert store.take([ip, "user:a"], limit, 100.0) > 0
+        assert store.take([ip], limit, 100.0) == 0
+        assert len(list(tmp_path.glob("rate-limit-*.db"))) == SHARDS
+        store.close()
+
+    def test_settle_adds_up_the_workers(self, tmp_path):
+        """Test that tokens taken in two workers are both charged."""
+        path = str(tmp_path / "rate-limit.db")
+        first, second = ShardedBucketStore(path), ShardedBucketStore(path)
+        limit = RateLimit(per_minute=60, burst=5)
+
+        assert first.settle({"read:ip:a": (limit, 3)}, 100.0) == {"read:ip:a": 2}
+        assert second.settle({"read:ip:a": (limit, 4)}, 100.0) == {"read:ip:a": -2}
+        first.close()
+        second.close()
+
+    @pytest.mark.parametrize(
+        "method,path,group",
+        [
+            ("POST", "/auth/token", "auth"),
+            ("POST", "/auth/register", "auth"),
+            ("POST", "/auth/refresh", "write"),
+            ("DELETE", "/brands/1", "write"),
+            ("GET", "/products", "read"),
+            ("OPTIONS", "/auth/token", None),
+        ],
+    )
+    def test_route_groups(self, method, path, group):
+        assert route_group(method, path) == group
+
+
+@pytest.fixture
+def limits(client, monkeypatch):
+    """Turn rate limiting on with small limits for the client."""
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "true")
+    monkeypatch.setenv("RATE_LIMIT_AUTH_PER_MINUTE", "1")
+    monkeypatch.setenv("RATE_LIMIT_AUTH_BURST", "2")
+    monkeypatch.setenv("RATE_LIMIT_READ_PER_MINUTE", "1")
+    monkeypatch.setenv("RATE_LIMIT_READ_BURST", "2")
+    get_rate_limit_settings.cache_clear()
+    yield
+    get_rate_limit_settings.cache_clear()
+
+
+class TestRateLimitMiddleware:
+    """Test cases for rate limiting in front of the routes."""
+
+    def test_login_burst_gets_429(self, client, limits, query_budget):
+        """Test that logins past the burst are refused before any work."""
+        login_data = {"username": "fixture_user", "password": "wrong"}
+        for _ in range(2):
+            response = client.post("/auth/token", data=login_data)
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        with query_budget(0):
+            response = client.post("/auth/token", data=login_data)
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response.headers["Retry-After"] == "60"
+        assert client.get("/metrics/rate-limits").json()["limited"] == {"auth": 1}
+
+    def test_groups_have_their_own_buckets(self, client, limits):
+        """Test that exhausting the login limit does not block reads."""
+        for _ in range(3):
+            client.post("/auth/register", json={"username": "x", "password": "y"})
+
+        assert client.get("/brands").status_code == status.HTTP_200_OK
+
+    @pytest.mark.asyncio
+    async def test_user_is_limited_across_addresses(self, client, limits):
+        """Test that a user cannot dodge the limit by changing address."""
+        token = client.headers["Authorization"].removeprefix("Bearer ")
+
+        for host, allowed in (
+            ("10.0.0.1", True),
+            ("10.0.0.2", True),
+            ("10.0.0.3", False),
+        ):
+            wait = await rate_limiter.check(
+                _request("/brands", host, token), token_username
+            )
+            assert (wait == 0) is allowed
+        assert (
+            await rate_limiter.check(_request("/brands", "10.0.0.3"), token_username)
+            == 0
+        )
+
+    @pytest.mark.asyncio
+    async def test_reads_are_settled_across_workers(
+        self, limits, monkeypatch, tmp_path
+    ):
+        """Test that reads counted in two workers add up once they sync."""
+        monkeypatch.setenv("RATE_LIMIT_DB", str(tmp_path / "rate-limit.db"))
+        get_rate_limit_settings.cache_clear()
+        workers = [RateLimiter(), RateLimiter()]
+        request = _request("/brands", "10.0.0.1")
+        # One of the two tokens each, either worker alone would allow another
+        for worker in workers:
+            assert await worker.check(request, token_username) == 0
+
+        # The first to sync learns about the other one on its next sync
+        for worker in [*workers, *workers]:
+            await worker.sync()
+
+        for worker in workers:
+            assert await worker.check(request, token_username) > 0
+            worker.clear()
+
+
+@pytest.fixture
+def locked_store(limits, monkeypatch, tmp_path):
+    """Shared bucket files another process holds the write lock on."""
+    path = str(tmp_path / "rate-limit.db")
+    monkeypatch.setenv("RATE_LIMIT_DB", path)
+    get_rate_limit_settings.cache_clear()
+    ShardedBucketStore(path).close()
+    others = [
+        sqlite3.connect(shard, isolation_level=None)
+        for shard in sorted(tmp_path.glob("rate-limit-*.db"))
+    ]
+    for other in others:
+        other.execute("BEGIN IMMEDIATE")
+    yield others
+    for other in others:
+        other.close()
+
+
+class TestLockedStore:
+    """Test cases for bucket files locked past the busy timeout."""
+
+    @pytest.mark.asyncio
+    async def test_write_is_let_through_uncharged(self, locked_store):
+        """Test that a write is allowed, and charged nothing, when the store
+        cannot be written."""
+        request = _request("/brands/1", "10.0.0.1", method="DELETE")
+        assert await rate_limiter.check(request, token_username) == 0
+        assert rate_limiter.errors == 1
+
+        for other in locked_store:
+            other.execute("ROLLBACK")
+        limit = get_rate_limit_settings().limits["write"]
+        for _ in range(limit.burst):
+            assert await rate_limiter.check(request, token_username) == 0
+        assert await rate_limiter.check(request, token_username) > 0
+
+    @pytest.mark.asyncio
+    async def test_login_is_refused(self, locked_store):
+        """Test that logins fail closed while the store is busy."""
+        request = _request("/auth/token", "10.0.0.1", method="POST")
+
+        wait = await rate_limiter.check(request, token_username)
+
+        assert wait == BUSY_RETRY_SECONDS
+        assert rate_limiter.errors == 1
+        assert rate_limiter.limited == {}
+
+    @pytest.mark.asyncio
+    async def test_busy_policy_is_configurable(self, locked_store, monkeypatch):
+        """Test that RATE_LIMIT_AUTH_FAIL_OPEN lets logins through."""
+        monkeypatch.setenv("RATE_LIMIT_AUTH_FAIL_OPEN", "true")
+        monkeypatch.setenv("RATE_LIMIT_WRITE_FAIL_OPEN", "false")
+        get_rate_limit_settings.cache_clear()
+
+        login = _request("/auth/token", "10.0.0.1", method="POST")
+        write = _request("/brands/1", "10.0.0.1", method="DELETE")
+
+        assert await rate_limiter.check(login, token_username) == 0
+        assert await rate_limiter.check(write, token_username) == BUSY_RETRY_SECONDS
+
+    @pytest.mark.asyncio
+    async def test_reads_never_wait_for_the_store(self, locked_store):
+        """Test that reads are counted in process, without the store."""
+        request = _request("/brands", "10.0.0.1")
+
+        assert await rate_limiter.check(request, token_username) == 0
+        assert await rate_limiter.check(request, token_username) == 0
+        assert await rate_limiter.check(request, token_username) > 0
+        assert rate_limiter.errors == 0
+
+    @pytest.mark.asyncio
+    async def test_wait_does_not_block_the_event_loop(self, locked_store):
+        """Test that the busy timeout is waited out off the event loop."""
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticker = asyncio.create_task(tick())
+        request = _request("/brands/1", "10.0.0.1", method="DELETE")
+        wait = await rate_limiter.check(request, token_username)
+        ticker.cancel()
+
+        assert wait == 0
+        assert rate_limiter.errors == 1
+        assert ticks >= 3
@@ -0,0 +1,213 @@
+import datetime
+from fastapi import status
+from sqlmodel import select
+from src.routes.reports.models import DailyProductSales, DailySales
+from src.routes.reports.operations import (
+    rebuild_daily_product_sales,
+    rebuild_daily_sales,
+)
+
+
+class TestSalesReport:
+    """Test cases for the daily sales rollup and the report endpoint."""
+
+    def _create_catalog(self, client):
+        """Create two products in different categories and brands, and a customer."""
+        for brand in ("Acme", "Globex"):
+            client.post("/brands", json={"name": brand})
+        for category in ("Tools", "Toys"):
+            client.post("/categories", json={"name": category, "description": ""})
+        client.post(
+            "/providers",
+            json={
+                "ruc": 987654321,
+                "name": "Report Provider",
+                "address": "123 St",
+                "phone": "555-0000",
+                "email": "report@provider.com",
+            },
+        )
+        products = [
+            client.post(
+                "/products",
+                json={
+                    "name": name,
+                    "description": "",
+                    "stock": 100,
+                    "price": price,
+                    "provider_name": "Report Provider",
+                    "category_name": category,
+                    "brand_name": brand,
+                },
+            ).json()
+            for name, price, category, brand in (
+                ("Hammer", 10.0, "Tools", "Acme"),
+                ("Yo-yo", 2.5, "Toys", "Globex"),
+            )
+        ]
+        client.post(
+            "/customers",
+            json={
+                "dni": 87654321,
+                "name": "Report",
+                "last_name": "Customer",
+                "email": "report@customer.com",
+            },
+        )
+        return products
+
+    def _sell(self, client, lines):
+        response = client.post(
+            "/sales/",
+            json={
+                "customer_dni": 87654321,
+                "products": [
+                    {"product_id": product["id"], "quantity": quantity}
+                    for product, quantity in lines
+                ],
+            },
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_sales_update_the_rollup(self, client, test_session):
+        """Test that each sale adds its lines to the day's rollup rows."""
+        hammer, yoyo = self._create_catalog(client)
+        self._sell(client, [(hammer, 2), (yoyo, 4)])
+        self._sell(client, [(hammer, 1)])
+
+        rows = test_session.exec(
+            select(DailyProductSales).order_by(DailyProductSales.product_id)
+        ).all()
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        assert [(r.day, r.product_id, r.revenue, r.units, r.orders) for r in rows] == [
+            (today, hammer["id"], 30.0, 3, 2),
+            (today, yoyo["id"], 10.0, 4, 1),
+        ]
+        day = test_session.get(DailySales, today)
+        assert (day.revenue, day.units, day.orders) == (40.0, 7, 2)
+
+    def test_rejected_sale_leaves_rollup_alone(self, client, test_session):
+        """Test that a sale rolled back for lack of stock is not counted."""
+        hammer, _ = self._create_catalog(client)
+
+        response = client.post(
+            "/sales/",
+            json={
+                "customer_dni": 87654321,
+                "products": [{"product_id": hammer["id"], "quantity": 1000}],
+            },
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert test_session.exec(select(DailyProductSales)).all() == []
+        assert test_session.exec(select(DailySales)).all() == []
+
+    def test_report_groupings(self, client):
+        """Test the report by day, product, category and brand."""
+        hammer, yoyo = self._create_catalog(client)
+        self._sell(client, [(hammer, 2), (yoyo, 4)])
+        self._sell(client, [(yoyo, 1)])
+        today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+        def report(group_by):
+            response = client.get("/reports/sales", params={"group_by": group_by})
+            assert response.status_code == status.HTTP_200_OK
+            return [
+                (row["key"], row["revenue"], row["units"], row["orders"])
+                for row in response.json()
+            ]
+
+        # Two sales, the first of two products
+        assert report("day") == [(today, 32.5, 7, 2)]
+        assert report("product") == [
+            (hammer["id"], 20.0, 2, 1),
+            (yoyo["id"], 12.5, 5, 2),
+        ]
+        assert report("category") == [
+            ("Tools", 20.0, 2, None),
+            ("Toys", 12.5, 5, None),
+        ]
+        assert report("brand") == [("Acme", 20.0, 2, None), ("Globex", 12.5, 5, None)]
+
+    def test_report_date_range(self, client, test_session):
+        """Test that the range is inclusive and filters whole days."""
+        hammer, _ = self._create_catalog(client)
+        for day in (1, 2, 3):
+            test_session.add(
+                DailyProductSales(
+                    day=datetime.date(2024, 1, day),
+                    product_id=hammer["id"],
+                    revenue=10.0,
+                    units=1,
+                    orders=1,
+                )
+            )
+            test_session.add(
+                DailySales(
+                    day=datetime.date(2024, 1, day), revenue=10.0, units=1, orders=1
+                )
+            )
+        test_session.commit()
+
+        for group_by, keys in (
+            ("day", ["2024-01-02", "2024-01-03"]),
+            ("product", [hammer["id"]]),
+        ):
+            response = client.get(
+                "/reports/sales",
+                params={
+                    "group_by": group_by,
+                    "date_from": "2024-01-02",
+                    "date_to": "2024-01-03",
+                },
+            )
+            assert [row["key"] for row in response.json()] == keys
+            assert sum(row["units"] for row in response.json()) == 2
+
+    def test_report_rejects_reversed_range(self, client):
+        """Test that date_from after date_to is a validation error."""
+        response = client.get(
+            "/reports/sales",
+            params={"date_from": "2024-01-03", "date_to": "2024-01-01"},
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_report_reads_only_the_rollup(self, client, query_budget):
+        """Test that the report is a single grouped query over the rollup."""
+        hammer, yoyo = self._create_catalog(client)
+        self._sell(client, [(hammer, 1), (yoyo, 1)])
+
+        with query_budget(1) as stats:
+            client.get("/reports/sales", params={"group_by": "category"})
+
+        (statement,) = stats.shapes
+        assert "productsale" not in statement
+        assert "FROM sale " not in statement
+
+    def test_backfill_matches_incremental_rollup(self, client, test_db, test_session):
+        """Test that rebuilding from the sales history gives the same rows."""
+        hammer, yoyo = self._create_catalog(client)
+        self._sell(client, [(hammer, 2), (yoyo, 4)])
+        self._sell(client, [(hammer, 1)])
+
+        def snapshot():
+            test_session.expire_all()
+            products = [
+                (r.day, r.product_id, r.revenue, r.units, r.orders)
+                for r in test_session.exec(
+                    select(DailyProductSales).order_by(DailyProductSales.product_id)
+                )
+            ]
+            days = [
+                (r.day, r.revenue, r.units, r.orders)
+                for r in test_session.exec(select(DailySales))
+            ]
+            return products, days
+
+        incremental = snapshot()
+        with test_db.begin() as connection:
+            assert rebuild_daily_product_sales(connection) == 2
+            assert rebuild_daily_sales(connection) == 1
+
+        assert snapshot() == incremental
@@ -1,4 +1,21 @@
-from fastapi import status
+import asyncio
+import datetime
+import json
+import os
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.database import get_async_engine
+from src.migrations import migrate
+from src.routes.customers.models import Customer
+from src.routes.products.models import Product
+from src.routes.sales.link_models import ProductSale
+from src.pagination import NEXT_CURSOR_HEADER
+from src.routes.sales.models import Sale, SaleCreate
+from src.routes.sales.operations import create_sale
 
 
 class TestSaleEndpoints:
@@ -157,3 +174,238 @@ class TestSaleEndpoints:
 
         assert response.status_code == status.HTTP_200_OK
         assert isinstance(response.json(), list)
+
+    def test_export_sales(self, client):
+        """Test that sales stream out as NDJSON in id order."""
+        product, customer = self._create_prerequisites(client)
+        for quantity in (1, 2):
+            client.post(
+                "/sales/",
+                json={
+                    "customer_dni": customer["dni"],
+                    "products": [{"product_id": product["id"], "quantity": quantity}],
+                },
+            )
+
+        response = client.get("/sales/export")
+
+        assert response.status_code == status.HTTP_200_OK
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["total"] for row in rows] == [25.0, 50.0]
+        assert rows[0]["customer_dni"] == customer["dni"]
+
+    def test_checkout_statements_do_not_grow_with_lines(self, client, query_budget):
+        """Test that stock and the daily rollup for every line go in bulk."""
+        product, customer = self._create_prerequisites(client)
+        others = [
+            client.post(
+                "/products", json={**product, "name": f"Extra {i}", "id": None}
+            ).json()
+            for i in range(3)
+        ]
+        lines = [{"product_id": p["id"], "quantity": 1} for p in [product, *others]]
+
+        with query_budget(8) as one_line:
+            client.post(
+                "/sales/",
+                json={"customer_dni": customer["dni"], "products": lines[:1]},
+            )
+        with query_budget(8) as four_lines:
+            response = client.post(
+                "/sales/",
+                json={"customer_dni": customer["dni"], "products": lines},
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["total"] == 100.0
+        assert four_lines.count == one_line.count
+
+    def test_repeated_lines_are_merged(self, client):
+        """Test that two lines for one product reserve their combined quantity."""
+        product, customer = self._create_prerequisites(client)
+
+        response = client.post(
+            "/sales/",
+            json={
+                "customer_dni": customer["dni"],
+                "products": [
+                    {"product_id": product["id"], "quantity": 30},
+                    {"product_id": product["id"], "quantity": 30},
+                ],
+            },
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert client.get(f"/products/{product['id']}").json()["stock"] == 50
+
+    def test_failed_line_releases_the_others(self, client):
+        """Test that a short line leaves the stock of every line untouched."""
+        product, customer = self._create_prerequisites(client)
+        scarce = client.post(
+            "/products", json={**product, "name": "Scarce", "stock": 1, "id": None}
+        ).json()
+
+        response = client.post(
+            "/sales/",
+            json={
+                "customer_dni": customer["dni"],
+                "products": [
+                    {"product_id": product["id"], "quantity": 5},
+                    {"product_id": scarce["id"], "quantity": 2},
+                ],
+            },
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["detail"] == "Not enough stock for product Scarce"
+        assert client.get(f"/products/{product['id']}").json()["stock"] == 50
+
+
+class TestConcurrentCheckout:
+    """Stress test for stock reservation under parallel checkouts."""
+
+    STOCK = 25
+    BUYERS = 60
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("tuning", ["true", "false"])
+    async def test_parallel_checkouts_never_oversell(self, tmp_path, tuning):
+        """Test that exactly the available units are sold, with or without
+        the serialized SQLite writer."""
+        db_url = f"sqlite:///{tmp_path / 'checkout.db'}"
+        sync_engine = create_engine(db_url)
+        migrate(sync_engine)
+        with Session(sync_engine) as session:
+            session.add(Customer(dni=12345678, name="A", last_name="B", email="a@b.c"))
+            for name, stock in (("Scarce", self.STOCK), ("Plenty", 1000)):
+                session.add(Product(name=name, description="d", stock=stock, price=2))
+            session.commit()
+        sync_engine.dispose()
+        with patch.dict(os.environ, {"DB_URL": db_url, "SQLITE_TUNING": tuning}):
+            engine = get_async_engine.__wrapped__()
+
+        async def checkout() -> bool:
+            sale = SaleCreate(
+                customer_dni=12345678,
+                products=[
+                    {"product_id": 2, "quantity": 1},
+                    {"product_id": 1, "quantity": 1},
+                ],
+            )
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                try:
+                    await create_sale(sale, session)
+                except HTTPException as exc:
+                    assert exc.status_code == status.HTTP_400_BAD_REQUEST
+                    return False
+            return True
+
+        results = await asyncio.gather(*(checkout() for _ in range(self.BUYERS)))
+
+        async with AsyncSession(engine) as session:
+            stock = dict(
+                (await session.exec(select(Product.name, Product.stock))).all()
+            )
+            sold = (
+                await session.exec(
+                    select(func.sum(ProductSale.quantity)).where(
+                        ProductSale.product_id == 1
+                    )
+                )
+            ).one()
+        await engine.dispose()
+        assert sum(results) == self.STOCK
+        assert stock == {"Scarce": 0, "Plenty": 1000 - self.STOCK}
+        assert sold == self.STOCK
+
+
+class TestSaleListing:
+    """Test cases for the paginated GET /sales."""
+
+    @pytest.fixture
+    def history(self, test_session):
+        """Six sales on consecutive days for two customers, two lines each."""
+        for dni in (11111111, 22222222):
+            test_session.add(
+                Customer(dni=dni, name="N", last_name="L", email=f"{dni}@x.com")
+            )
+        for name, price in (("Pen", 1.0), ("Book", 10.0)):
+            test_session.add(Product(name=name, description="d", stock=0, price=price))
+        test_session.commit()
+        for day in range(6):
+            sale = Sale(
+                customer_dni=11111111 if day % 2 == 0 else 22222222,
+                total=10.0 * (day + 1),
+                created_at=datetime.datetime(2024, 1, day + 1, 12),
+            )
+            test_session.add(sale)
+            test_session.flush()
+            test_session.add(ProductSale(product_id=1, sale_id=sale.id, quantity=day))
+            test_session.add(ProductSale(product_id=2, sale_id=sale.id, quantity=1))
+        test_session.commit()
+
+    def test_pages_follow_the_cursor(self, client, history):
+        """Test newest-first keyset pages with no overlap or gap."""
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 4} if cursor is None else {"limit": 4, "cursor": cursor}
+            response = client.get("/sales/", params=params)
+            assert response.status_code == status.HTTP_200_OK
+            seen += [sale["id"] for sale in response.json()]
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+
+        assert seen == [6, 5, 4, 3, 2, 1]
+        assert "items" not in response.json()[0]
+
+    def test_filters(self, client, history):
+        """Test the date range, customer and total filters together."""
+        response = client.get(
+            "/sales/",
+            params={
+                "created_from": "2024-01-02T00:00:00Z",
+                "created_before": "2024-01-06T00:00:00Z",
+                "customer_dni": 11111111,
+                "min_total": 20,
+                "max_total": 50,
+                "sort": "created_at",
+            },
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [sale["total"] for sale in response.json()] == [30.0, 50.0]
+
+    def test_embedded_items_are_one_query(self, client, history, query_budget):
+        """Test that ?embed=items loads the lines of the whole page at once."""
+        with query_budget(2):
+            response = client.get("/sales/", params={"embed": "items", "limit": 3})
+
+        sales = response.json()
+        assert [sale["id"] for sale in sales] == [6, 5, 4]
+        assert sales[0]["items"] == [
+            {"product_id": 1, "name": "Pen", "price": 1.0, "quantity": 5},
+            {"product_id": 2, "name": "Book", "price": 10.0, "quantity": 1},
+        ]
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"created_from": "2024-02-01", "created_before": "2024-01-01"},
+            {"min_total": 5, "max_total": 1},
+            {"embed": "customer"},
+        ],
+    )
+    def test_invalid_queries(self, client, params):
+        """Test that inverted ranges and unknown embeds are rejected."""
+        response = client.get("/sales/", params=params)
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_invalid_cursor(self, client):
+        """Test that a cursor issued for another sort is refused."""
+        response = client.get(
+            "/sales/", params={"cursor": "bm90LWEtY3Vyc29y", "sort": "created_at"}
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,90 @@
+import logging
+import pytest
+from unittest.mock import patch
+from fastapi import status
+from sqlalchemy import text
+from sqlmodel import create_engine
+from src.slow_queries import REDACTED, redact, slow_query_log
+
+
+@pytest.fixture
+def log_everything():
+    """Treat every statement as slow."""
+    slow_query_log.recent.clear()
+    with patch("src.slow_queries.get_slow_query_threshold_ms", return_value=1e-9):
+        yield slow_query_log
+    slow_query_log.flush()
+    slow_query_log.recent.clear()
+
+
+class TestSlowQueryLog:
+    """Test cases for the slow query log."""
+
+    def test_redact_keeps_ids_and_hides_text(self):
+        """Test that only numbers, booleans and NULLs survive redaction."""
+        assert redact((42, "secret@example.com", None, True, 9.5, b"hash")) == [
+            42,
+            REDACTED,
+            None,
+            True,
+            9.5,
+            REDACTED,
+        ]
+        assert redact({"name": "Alice", "id": 7}) == [REDACTED, 7]
+
+    def test_slow_statement_is_logged_with_plan(self, tmp_path, log_everything, caplog):
+        """Test that a slow statement is written off-thread with its EXPLAIN."""
+        engine = create_engine(f"sqlite:///{tmp_path / 'slow.db'}")
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE person (id INTEGER, email TEXT)"))
+        log_everything.recent.clear()
+
+        with caplog.at_level(logging.WARNING, logger="src.slow_queries"):
+            with engine.connect() as connection:
+                connection.execute(
+                    text("SELECT id FROM person WHERE email = :email"),
+                    {"email": "secret@example.com"},
+                )
+            log_everything.flush()
+
+        entry = log_everything.recent[-1]
+        assert entry["statement"] == "SELECT id FROM person WHERE email = ?"
+        assert entry["parameters"] == [REDACTED]
+        assert entry["route"] is None
+        assert entry["plan"] == ["SCAN person"]
+        assert "secret@example.com" not in caplog.text
+        assert "Slow query" in caplog.text
+        engine.dispose()
+
+    def test_fast_statements_are_not_logged(self, tmp_path):
+        """Test that statements under the threshold stay out of the log."""
+        slow_query_log.recent.clear()
+        engine = create_engine(f"sqlite:///{tmp_path / 'fast.db'}")
+        with patch.dict("os.environ", {"DB_SLOW_QUERY_MS": "60000"}):
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        slow_query_log.flush()
+
+        assert list(slow_query_log.recent) == []
+        engine.dispose()
+
+    def test_entry_records_route(self, client, sample_customer_data, log_everything):
+        """Test that the issuing route and the index used are captured."""
+        client.post("/customers", json=sample_customer_data)
+        log_everything.recent.clear()
+
+        response = client.get(f"/customers/{sample_customer_data['dni']}")
+        log_everything.flush()
+
+        assert response.status_code == status.HTTP_200_OK
+        entry = next(
+            entry
+            for entry in log_everything.recent
+            if entry["route"] == "GET /customers/{dni}"
+        )
+        assert entry["parameters"][0] == sample_customer_data["dni"]
+        assert any("ix_customer_dni" in line for line in entry["plan"])
+
+        metrics = client.get("/metrics/slow-queries").json()
+        assert metrics["dropped"] == 0
+        assert any(e["route"] == "GET /customers/{dni}" for e in metrics["recent"])
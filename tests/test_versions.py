@@ -0,0 +1,162 @@
+import pytest
+from fastapi import status
+from sqlmodel import select
+from src.versions import TableVersion, bump_version, etag_matches
+
+
+class TestConditionalGet:
+    """Test cases for ETags built from the table version counters."""
+
+    def test_etag_matching(self):
+        """Test the If-None-Match forms clients send."""
+        assert etag_matches('"1-2"', '"1-2"')
+        assert etag_matches('"0-0", W/"1-2"', '"1-2"')
+        assert etag_matches("*", '"1-2"')
+        assert not etag_matches('"1-3"', '"1-2"')
+        assert not etag_matches(None, '"1-2"')
+
+    def test_unchanged_list_is_not_modified(
+        self, client, catalog_product, query_budget
+    ):
+        """Test that a matching ETag answers 304 from the version read alone."""
+        etag = client.get("/products").headers["ETag"]
+
+        with query_budget(1):
+            response = client.get("/products", headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    def test_unchanged_detail_is_not_modified(self, client, catalog_product):
+        """Test that detail GETs honour If-None-Match too."""
+        path = f"/products/{catalog_product['id']}"
+        etag = client.get(path).headers["ETag"]
+
+        response = client.get(path, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_missing_resource_is_never_not_modified(self, client, catalog_product):
+        """Test that a 304 is only sent for a row that exists."""
+        etag = client.get(f"/products/{catalog_product['id']}").headers["ETag"]
+
+        for if_none_match in ("*", etag):
+            response = client.get(
+                "/products/999", headers={"If-None-Match": if_none_match}
+            )
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_etags_are_per_resource(self, client, catalog_product):
+        """Test that one product's ETag does not validate another's."""
+        second = client.post(
+            "/products", json={**catalog_product, "id": None, "name": "Saw"}
+        ).json()
+        etag = client.get(f"/products/{catalog_product['id']}").headers["ETag"]
+
+        response = client.get(
+            f"/products/{second['id']}", headers={"If-None-Match": etag}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["name"] == "Saw"
+
+    def test_etags_are_per_query(self, client, catalog_product):
+        """Test that a page's ETag does not validate a different page."""
+        etag = client.get("/products").headers["ETag"]
+
+        response = client.get(
+            "/products?category_name=Tools", headers={"If-None-Match": etag}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_star_matches_an_existing_resource(self, client, catalog_product):
+        """Test that If-None-Match: * is answered 304 when the row exists."""
+        response = client.get(
+            f"/products/{catalog_product['id']}", headers={"If-None-Match": "*"}
+        )
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_writes_change_the_etag(self, client, catalog_product):
+        """Test that a write to products invalidates lists that embed them."""
+        products_etag = client.get("/products").headers["ETag"]
+        brands_etag = client.get("/brands").headers["ETag"]
+        customers_etag = client.get("/customers").headers.get("ETag")
+
+        client.delete(f"/products/{catalog_product['id']}")
+
+        response = client.get("/products", headers={"If-None-Match": products_etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == []
+        assert response.headers["ETag"] != products_etag
+        assert client.get("/brands").headers["ETag"] != brands_etag
+        # Only the catalog is versioned
+        assert customers_etag is None
+
+    def test_sale_changes_the_product_etag(
+        self, client, catalog_product, sample_customer_data
+    ):
+        """Test that stock taken by a sale is not hidden behind a 304."""
+        etag = client.get("/products").headers["ETag"]
+
+        client.post(
+            "/sales/",
+            json={
+                "customer_dni": sample_customer_data["dni"],
+                "products": [{"product_id": catalog_product["id"], "quantity": 2}],
+            },
+        )
+
+        response = client.get("/products", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()[0]["stock"] == 8
+
+    def test_sale_keeps_the_catalog_etags(
+        self, client, catalog_product, sample_customer_data, query_budget
+    ):
+        """Test that a sale, which only changes stock, leaves the category,
+        brand and provider representations and their cache entries alone."""
+        category_id = client.get("/categories").json()[0]["id"]
+        paths = ["/categories", "/brands", "/providers", f"/categories/{category_id}"]
+        etags = {path: client.get(path).headers["ETag"] for path in paths}
+
+        client.post(
+            "/sales/",
+            json={
+                "customer_dni": sample_customer_data["dni"],
+                "products": [{"product_id": catalog_product["id"], "quantity": 2}],
+            },
+        )
+
+        for path, etag in etags.items():
+            response = client.get(path, headers={"If-None-Match": etag})
+            assert response.status_code == status.HTTP_304_NOT_MODIFIED, path
+        # The version read for the ETag, the list itself is still cached
+        with query_budget(1):
+            assert client.get("/categories").status_code == status.HTTP_200_OK
+
+    def test_failed_write_keeps_the_etag(self, client, catalog_product):
+        """Test that a rejected write does not bump the version."""
+        etag = client.get("/brands").headers["ETag"]
+
+        response = client.post("/brands", json={"name": "Acme"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert client.get("/brands").headers["ETag"] == etag
+
+    @pytest.mark.asyncio
+    async def test_bump_without_seeded_row(self, async_test_session):
+        """Test that a database built by create_all gets its row on first write."""
+        await bump_version(async_test_session, "brand")
+        await async_test_session.commit()
+        await bump_version(async_test_session, "brand")
+        await async_test_session.commit()
+
+        row = (
+            await async_test_session.exec(
+                select(TableVersion).where(TableVersion.name == "brand")
+            )
+        ).one()
+        assert row.version == 2